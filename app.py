@@ -9,6 +9,7 @@ from urllib.parse import urlparse, urljoin
 import xml.etree.ElementTree as ET
 import base64
 import binascii
+import hashlib
 import json
 import ssl
 import aiohttp
@@ -20,8 +21,19 @@ import zipfile
 import io
 import platform
 import stat
+import weakref
 from datetime import datetime, timezone, timedelta
 from utils.drm_decrypter import decrypt_segment
+from utils.connection_manager import UpstreamConnectionManager
+from utils.segment_cache import SegmentCache
+from utils.single_flight import SingleFlight
+from utils.prefetcher import SegmentPrefetcher
+from utils.mpd_cache import MPDCache
+from utils.segment_timeline import SegmentTimeline
+from utils.decrypt_pool import DecryptPool
+from utils.cenc_stream import CENCStreamDecrypter
+from utils.extraction_cache import ExtractionCache
+from utils.hls_aes import media_sequence_iv, parse_iv
 
 load_dotenv() # Carica le variabili dal file .env
 
@@ -53,6 +65,85 @@ if DLHD_PROXIES: logging.info(f"📺 Caricati {len(DLHD_PROXIES)} proxy DLHD.")
 
 API_PASSWORD = os.environ.get("API_PASSWORD")
 
+# --- Configurazione Pool Connessioni Upstream ---
+UPSTREAM_LIMIT = int(os.environ.get("UPSTREAM_LIMIT", "100"))
+UPSTREAM_LIMIT_PER_HOST = int(os.environ.get("UPSTREAM_LIMIT_PER_HOST", "20"))
+UPSTREAM_KEEPALIVE_TIMEOUT = int(os.environ.get("UPSTREAM_KEEPALIVE_TIMEOUT", "60"))
+
+# --- Configurazione Cache Segmenti ---
+SEGMENT_CACHE_MAX_MB = int(os.environ.get("SEGMENT_CACHE_MAX_MB", "64"))  # 0 = disabilitata
+SEGMENT_CACHE_TTL = int(os.environ.get("SEGMENT_CACHE_TTL", "60"))
+
+# --- Configurazione Cache Manifest HLS ---
+MANIFEST_CACHE_MAX_MB = int(os.environ.get("MANIFEST_CACHE_MAX_MB", "8"))  # 0 = disabilitata
+MANIFEST_CACHE_LIVE_FRACTION = float(os.environ.get("MANIFEST_CACHE_LIVE_FRACTION", "0.5"))  # frazione di #EXT-X-TARGETDURATION
+MANIFEST_CACHE_VOD_TTL = int(os.environ.get("MANIFEST_CACHE_VOD_TTL", "3600"))  # playlist con #EXT-X-ENDLIST
+MANIFEST_CACHE_MASTER_TTL = 10  # master playlist (senza TARGETDURATION)
+
+# --- Configurazione Cache MPD ---
+MPD_CACHE_MAX_ENTRIES = int(os.environ.get("MPD_CACHE_MAX_ENTRIES", "64"))  # 0 = disabilitata
+MPD_CACHE_LIVE_TTL = float(os.environ.get("MPD_CACHE_LIVE_TTL", "2"))  # se manca minimumUpdatePeriod
+
+# --- Configurazione Decrittazione CENC ---
+DECRYPT_POOL_MODE = os.environ.get("DECRYPT_POOL_MODE", "process").strip().lower()  # process, thread, inline
+DECRYPT_POOL_WORKERS = int(os.environ.get("DECRYPT_POOL_WORKERS", "2"))  # processi/thread per worker gunicorn
+DECRYPT_MAX_IN_FLIGHT = int(os.environ.get("DECRYPT_MAX_IN_FLIGHT", "0"))  # 0 = 2 x DECRYPT_POOL_WORKERS
+DECRYPT_STREAMING = os.environ.get("DECRYPT_STREAMING", "false").lower() in ("true", "1", "yes")  # CENC box per box
+
+# --- Configurazione Chiavi AES-128 ---
+KEY_CACHE_TTL = int(os.environ.get("KEY_CACHE_TTL", "300"))  # secondi, 0 = disabilitata
+AES_SERVER_DECRYPT = os.environ.get("AES_SERVER_DECRYPT", "false").lower() in ("true", "1", "yes")  # segmenti AES-128 decrittati dal proxy
+
+# --- Configurazione Cache ClearKey ---
+INIT_CACHE_MAX_MB = int(os.environ.get("INIT_CACHE_MAX_MB", "16"))  # segmenti di inizializzazione
+INIT_CACHE_TTL = int(os.environ.get("INIT_CACHE_TTL", "3600"))
+DECRYPTED_CACHE_MAX_MB = int(os.environ.get("DECRYPTED_CACHE_MAX_MB", "64"))  # segmenti decrittati, 0 = disabilitata
+
+# --- Configurazione Relay Segmenti ---
+RELAY_MIN_WRITE_BYTES = int(os.environ.get("RELAY_MIN_WRITE_KB", "64")) * 1024  # scrittura minima accorpata verso il client
+RELAY_MAX_WRITE_BYTES = int(os.environ.get("RELAY_MAX_WRITE_KB", "512")) * 1024  # scrittura massima accorpata verso il client
+
+# --- Configurazione Prefetch Segmenti Live ---
+PREFETCH_SEGMENTS = int(os.environ.get("PREFETCH_SEGMENTS", "0"))  # 0 = disabilitato
+PREFETCH_CONCURRENCY = int(os.environ.get("PREFETCH_CONCURRENCY", "2"))  # download paralleli per canale
+PREFETCH_IDLE_TIMEOUT = int(os.environ.get("PREFETCH_IDLE_TIMEOUT", "30"))  # secondi senza richieste playlist
+
+# --- Configurazione Cache Estrattori ---
+def parse_extractor_ttls(env_var: str, defaults: dict) -> dict:
+    """TTL per estrattore, con override da variabile d'ambiente nel formato 'vavoo=600,vixsrc=0'."""
+    ttls = dict(defaults)
+    for item in os.environ.get(env_var, "").split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip():
+            try:
+                ttls[name.strip().lower()] = float(value)
+            except ValueError:
+                logging.warning(f"⚠️ TTL non valido in {env_var}: {item}")
+    return ttls
+
+EXTRACTOR_CACHE_MAX_ENTRIES = int(os.environ.get("EXTRACTOR_CACHE_MAX_ENTRIES", "512"))  # 0 = disabilitata
+EXTRACTOR_CACHE_TTL = float(os.environ.get("EXTRACTOR_CACHE_TTL", "300"))  # estrattori senza TTL dedicato
+EXTRACTOR_CACHE_TTLS = parse_extractor_ttls("EXTRACTOR_CACHE_TTLS", {
+    "vavoo": 600,
+    "vixsrc": 1800,  # ridotto alla scadenza 'expires' dell'URL
+    "sportsonline": 300,
+    "mixdrop": 1800,
+    "voe": 1800,
+    "streamtape": 1800,
+    "orion": 1800,
+    "dlhd": 0,  # ha già la sua cache persistente con validazione
+    "hls_generic": 0,  # nessuna richiesta upstream da risparmiare
+})
+
+# --- Configurazione Domini DLHD ---
+DLHD_BASE_DOMAINS = [d.rstrip('/') + '/' for d in os.environ.get("DLHD_BASE_DOMAINS", "").split(',') if d.strip()]  # vuoto = domini predefiniti
+DLHD_IFRAME_HOSTS = [h.strip() for h in os.environ.get("DLHD_IFRAME_HOSTS", "").split(',') if h.strip()]  # host iframe da controllare subito
+DLHD_PROBE_INTERVAL = int(os.environ.get("DLHD_PROBE_INTERVAL", "300"))  # secondi tra i controlli, 0 = un solo controllo all'avvio
+
+# --- Configurazione Extractor Batch ---
+EXTRACTOR_BATCH_CONCURRENCY = int(os.environ.get("EXTRACTOR_BATCH_CONCURRENCY", "8"))  # estrazioni parallele per estrattore
+EXTRACTOR_BATCH_MAX_URLS = int(os.environ.get("EXTRACTOR_BATCH_MAX_URLS", "1000"))  # URL per richiesta
+
 # ✅ COSTANTE USER-AGENT: Forziamo Chrome per evitare blocchi 451/403 (da app ok.py)
 DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
 
@@ -76,61 +167,16 @@ def check_password(request):
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # --- Moduli Esterni ---
-VavooExtractor, DLHDExtractor, VixSrcExtractor, PlaylistBuilder, SportsonlineExtractor = None, None, None, None, None
-
-try:
-    from extractors.vavoo import VavooExtractor
-    logger.info("✅ Modulo VavooExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo VavooExtractor non trovato. Funzionalità Vavoo disabilitata.")
-
-try:
-    from extractors.dlhd import DLHDExtractor
-    logger.info("✅ Modulo DLHDExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo DLHDExtractor non trovato. Funzionalità DLHD disabilitata.")
+PlaylistBuilder = None
 
 try:
     from routes.playlist_builder import PlaylistBuilder
     logger.info("✅ Modulo PlaylistBuilder caricato.")
 except ImportError:
     logger.warning("⚠️ Modulo PlaylistBuilder non trovato. Funzionalità PlaylistBuilder disabilitata.")
-    
-try:
-    from extractors.vixsrc import VixSrcExtractor
-    logger.info("✅ Modulo VixSrcExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo VixSrcExtractor non trovato. Funzionalità VixSrc disabilitata.")
 
-try:
-    from extractors.sportsonline import SportsonlineExtractor
-    logger.info("✅ Modulo SportsonlineExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo SportsonlineExtractor non trovato. Funzionalità Sportsonline disabilitata.")
-
-try:
-    from extractors.mixdrop import MixdropExtractor
-    logger.info("✅ Modulo MixdropExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo MixdropExtractor non trovato.")
-
-try:
-    from extractors.voe import VoeExtractor
-    logger.info("✅ Modulo VoeExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo VoeExtractor non trovato.")
-
-try:
-    from extractors.streamtape import StreamtapeExtractor
-    logger.info("✅ Modulo StreamtapeExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo StreamtapeExtractor non trovato.")
-
-try:
-    from extractors.orion import OrionExtractor
-    logger.info("✅ Modulo OrionExtractor caricato.")
-except ImportError:
-    logger.warning("⚠️ Modulo OrionExtractor non trovato.")
+# Gli estrattori vengono importati solo al primo URL del loro dominio (extractors/registry.py)
+from extractors.registry import EXTRACTOR_REGISTRY
 
 # --- Classi Unite ---
 class ExtractorError(Exception):
@@ -213,6 +259,8 @@ class MPDToHLSConverter:
             'mpd': 'urn:mpeg:dash:schema:mpd:2011',
             'cenc': 'urn:mpeg:cenc:2013'
         }
+        # SegmentTimeline compatte, legate alla vita dell'elemento XML da cui derivano
+        self._timelines = weakref.WeakKeyDictionary()
 
     def _parse_date(self, date_str):
         """Parsing basilare di date ISO8601."""
@@ -223,13 +271,16 @@ class MPDToHLSConverter:
         except Exception:
             return datetime.now(timezone.utc)
 
-    def convert_master_playlist(self, manifest_content: str, proxy_base: str, original_url: str, params: str) -> str:
-        """Genera la Master Playlist HLS dagli AdaptationSet del MPD."""
+    def parse_manifest(self, manifest_content: str) -> ET.Element:
+        """Parsing del MPD (aggiunge il namespace DASH se assente)."""
+        if 'xmlns' not in manifest_content:
+            manifest_content = manifest_content.replace('<MPD', '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011"', 1)
+        return ET.fromstring(manifest_content)
+
+    def convert_master_playlist(self, manifest_content, proxy_base: str, original_url: str, params: str) -> str:
+        """Genera la Master Playlist HLS dagli AdaptationSet del MPD (testo o già parsato)."""
         try:
-            if 'xmlns' not in manifest_content:
-                manifest_content = manifest_content.replace('<MPD', '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011"', 1)
-            
-            root = ET.fromstring(manifest_content)
+            root = manifest_content if isinstance(manifest_content, ET.Element) else self.parse_manifest(manifest_content)
             lines = ['#EXTM3U', '#EXT-X-VERSION:3']
             
             # Trova AdaptationSet Video e Audio
@@ -305,13 +356,10 @@ class MPDToHLSConverter:
             logging.error(f"Errore conversione Master Playlist: {e}")
             return "#EXTM3U\n#EXT-X-ERROR: " + str(e)
 
-    def convert_media_playlist(self, manifest_content: str, rep_id: str, proxy_base: str, original_url: str, params: str, clearkey_param: str = None) -> str:
-        """Genera la Media Playlist HLS per una specifica Representation."""
+    def convert_media_playlist(self, manifest_content, rep_id: str, proxy_base: str, original_url: str, params: str, clearkey_param: str = None) -> str:
+        """Genera la Media Playlist HLS per una specifica Representation (MPD testo o già parsato)."""
         try:
-            if 'xmlns' not in manifest_content:
-                manifest_content = manifest_content.replace('<MPD', '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011"', 1)
-                
-            root = ET.fromstring(manifest_content)
+            root = manifest_content if isinstance(manifest_content, ET.Element) else self.parse_manifest(manifest_content)
             
             # --- RILEVAMENTO LIVE vs VOD ---
             mpd_type = root.get('type', 'static')
@@ -401,56 +449,35 @@ class MPDToHLSConverter:
                 segment_timeline = segment_template.find('mpd:SegmentTimeline', self.ns)
                 
                 if segment_timeline is not None:
-                    current_time = 0
-                    segment_number = start_number
-                    all_segments = []
+                    # Con l'MPD in cache anche la timeline compatta viene costruita una sola volta
+                    timeline = self._timelines.get(segment_timeline)
+                    if timeline is None:
+                        timeline = SegmentTimeline.from_element(segment_timeline, self.ns, timescale, start_number)
+                        self._timelines[segment_timeline] = timeline
                     
-                    for s in segment_timeline.findall('mpd:S', self.ns):
-                        t = s.get('t')
-                        if t: current_time = int(t)
-                        d = int(s.get('d'))
-                        r = int(s.get('r', '0'))
-                        
-                        duration_sec = d / timescale
-                        
-                        for _ in range(r + 1):
-                            all_segments.append({
-                                'time': current_time,
-                                'number': segment_number,
-                                'duration': duration_sec,
-                                'd': d
-                            })
-                            current_time += d
-                            segment_number += 1
-                    
-                    # Filtro Live (Ultimi N secondi)
+                    # Filtro Live (Ultimi N secondi): ricerca binaria sulla durata cumulativa
                     if is_live:
-                         total_duration = 0
-                         live_segments = []
                          # Prendi circa 60 secondi di buffer
-                         for seg in reversed(all_segments):
-                             live_segments.insert(0, seg)
-                             total_duration += seg['duration']
-                             if total_duration > 60: break
-                         all_segments = live_segments
-                         if all_segments:
-                             lines.append(f'#EXT-X-MEDIA-SEQUENCE:{all_segments[0]["number"]}')
+                         window_start = timeline.live_window_start(60)
+                         if len(timeline):
+                             lines.append(f'#EXT-X-MEDIA-SEQUENCE:{start_number + window_start}')
                     else:
+                        window_start = 0
                         lines.append(f'#EXT-X-MEDIA-SEQUENCE:0')
 
-                    if all_segments:
-                        max_dur = max([s['duration'] for s in all_segments])
+                    if len(timeline) > window_start:
+                        max_dur = timeline.max_duration(window_start) / timescale
                         lines.insert(2, f'#EXT-X-TARGETDURATION:{int(max_dur) + 1}')
 
-                    for seg in all_segments:
+                    for seg_number, seg_time, seg_d in timeline.iter_segments(window_start):
                         seg_name = media.replace('$RepresentationID$', str(rep_id))
-                        seg_name = seg_name.replace('$Number$', str(seg['number']))
-                        seg_name = seg_name.replace('$Time$', str(seg['time']))
+                        seg_name = seg_name.replace('$Number$', str(seg_number))
+                        seg_name = seg_name.replace('$Time$', str(seg_time))
                         
                         full_seg_url = urljoin(base_url, seg_name)
                         encoded_seg_url = urllib.parse.quote(full_seg_url, safe='')
                         
-                        lines.append(f'#EXTINF:{seg["duration"]:.3f},')
+                        lines.append(f'#EXTINF:{seg_d / timescale:.3f},')
                         
                         if server_side_decryption:
                             decrypt_url = f"{proxy_base}/decrypt/segment.mp4?url={encoded_seg_url}&init_url={encoded_init_url}{decryption_params}{params}"
@@ -518,6 +545,15 @@ class HLSProxy:
     
     def __init__(self):
         self.extractors = {}
+
+        # Risultati degli estrattori per URL normalizzato, con estrazioni concorrenti deduplicate
+        self.extraction_cache = ExtractionCache(
+            ttls=EXTRACTOR_CACHE_TTLS,
+            default_ttl=EXTRACTOR_CACHE_TTL,
+            max_entries=EXTRACTOR_CACHE_MAX_ENTRIES
+        )
+        # Limite di estrazioni parallele per estrattore in /extractor/batch (condiviso tra le richieste)
+        self._batch_semaphores = {}
         
         # Inizializza il playlist_builder se il modulo è disponibile
         if PlaylistBuilder:
@@ -529,12 +565,68 @@ class HLSProxy:
         # Inizializza il convertitore MPD -> HLS
         self.mpd_converter = MPDToHLSConverter()
         
-        # Cache per segmenti di inizializzazione (URL -> content)
-        self.init_cache = {}
+        # Cache delle chiavi AES-128 (URL chiave + header -> bytes), invalidata insieme allo stream del canale
+        self.key_cache = SegmentCache(
+            max_bytes=1024 * 1024 if KEY_CACHE_TTL > 0 else 0,
+            ttl=KEY_CACHE_TTL
+        )
+        self._channel_key_cache = {}
+
+        # Cache per segmenti di inizializzazione (URL + header -> content), con budget in byte
+        self.init_cache = SegmentCache(
+            max_bytes=INIT_CACHE_MAX_MB * 1024 * 1024,
+            ttl=INIT_CACHE_TTL
+        )
+
+        # Cache dei segmenti già decrittati (URL segmento, init, KID -> content)
+        self.decrypted_cache = SegmentCache(
+            max_bytes=DECRYPTED_CACHE_MAX_MB * 1024 * 1024,
+            ttl=SEGMENT_CACHE_TTL
+        )
         
         # Sessione condivisa per il proxy
         self.session = None
 
+        # Pool condiviso di connessioni keep-alive verso le sorgenti (per host + proxy)
+        self.connection_manager = UpstreamConnectionManager(
+            limit=UPSTREAM_LIMIT,
+            limit_per_host=UPSTREAM_LIMIT_PER_HOST,
+            keepalive_timeout=UPSTREAM_KEEPALIVE_TIMEOUT
+        )
+
+        # Cache segmenti live condivisa tra tutti i client del worker
+        self.segment_cache = SegmentCache(
+            max_bytes=SEGMENT_CACHE_MAX_MB * 1024 * 1024,
+            ttl=SEGMENT_CACHE_TTL
+        )
+
+        # Coalescenza delle richieste upstream identiche in corso
+        self.single_flight = SingleFlight()
+
+        # Cache dei manifest HLS già riscritti, con TTL derivato dalla playlist stessa
+        self.manifest_cache = SegmentCache(
+            max_bytes=MANIFEST_CACHE_MAX_MB * 1024 * 1024,
+            ttl=MANIFEST_CACHE_MASTER_TTL
+        )
+
+        # Decrittazione CENC di /decrypt/segment.mp4 fuori dall'event loop
+        self.decrypt_pool = DecryptPool(
+            decrypt_segment,
+            mode=DECRYPT_POOL_MODE,
+            workers=DECRYPT_POOL_WORKERS,
+            max_in_flight=DECRYPT_MAX_IN_FLIGHT or None
+        )
+
+        # MPD parsati, condivisi da master e media playlist HLS (format=hls)
+        self.mpd_cache = MPDCache(max_entries=MPD_CACHE_MAX_ENTRIES, default_live_ttl=MPD_CACHE_LIVE_TTL)
+
+        # Prefetch opzionale dei segmenti più recenti delle playlist live
+        self.prefetcher = SegmentPrefetcher(
+            segments=PREFETCH_SEGMENTS,
+            concurrency=PREFETCH_CONCURRENCY,
+            idle_timeout=PREFETCH_IDLE_TIMEOUT
+        )
+
     async def _get_session(self):
         if self.session is None or self.session.closed:
             import aiohttp
@@ -542,110 +634,71 @@ class HLSProxy:
             self.session = aiohttp.ClientSession(timeout=ClientTimeout(total=30))
         return self.session
 
+    @staticmethod
+    def _create_dlhd_extractor(request_headers: dict, proxies: list):
+        return EXTRACTOR_REGISTRY.load("dlhd")(
+            request_headers, proxies=proxies,
+            base_domains=DLHD_BASE_DOMAINS or None,
+            iframe_hosts=DLHD_IFRAME_HOSTS,
+            probe_interval=DLHD_PROBE_INTERVAL
+        )
+
     async def get_extractor(self, url: str, request_headers: dict, host: str = None):
         """Ottiene l'estrattore appropriato per l'URL"""
+        # 1. Selezione Manuale tramite parametro 'host', 2. Auto-detection basata sull'URL
+        key = (EXTRACTOR_REGISTRY.resolve_alias(host) if host else None) or EXTRACTOR_REGISTRY.resolve(url)
+        if key is None:
+            # Fallback al GenericHLSExtractor per qualsiasi altro URL.
+            key = "hls_generic"
+            if key not in self.extractors:
+                self.extractors[key] = GenericHLSExtractor(request_headers, proxies=GLOBAL_PROXIES)
+            return self.extractors[key]
+
+        if key not in self.extractors:
+            try:
+                if key == "dlhd":
+                    self.extractors[key] = self._create_dlhd_extractor(request_headers, DLHD_PROXIES or GLOBAL_PROXIES)
+                else:
+                    proxies = (VAVOO_PROXIES or GLOBAL_PROXIES) if key == "vavoo" else GLOBAL_PROXIES
+                    self.extractors[key] = EXTRACTOR_REGISTRY.load(key)(request_headers, proxies=proxies)
+            except ImportError as e:
+                raise ExtractorError(f"Estrattore non disponibile - modulo mancante: {e}")
+        return self.extractors[key]
+
+    def _extractor_name(self, extractor) -> str:
+        """Chiave con cui l'estrattore è registrato in self.extractors (es. 'vavoo', 'hls_generic')."""
+        for name, instance in self.extractors.items():
+            if instance is extractor:
+                return name
+        return type(extractor).__name__.lower()
+
+    async def extract(self, extractor, url: str, force_refresh: bool = False) -> dict:
+        """Esegue l'estrazione passando per la cache risultati (force_refresh la salta e la aggiorna)."""
+        return await self.extraction_cache.get_or_extract(
+            self._extractor_name(extractor), url,
+            lambda: extractor.extract(url, force_refresh=force_refresh),
+            force_refresh=force_refresh
+        )
+
+    async def invalidate_extraction(self, extractor, url: str):
+        """Scarta il risultato in cache (anche quello interno dell'estrattore, es. DLHD) dopo un errore a valle."""
+        self.extraction_cache.invalidate(self._extractor_name(extractor), url)
+        if hasattr(extractor, 'invalidate_cache_for_url'):
+            await extractor.invalidate_cache_for_url(url)
+
+    async def invalidate_channel(self, original_channel_url: str):
+        """Invalida l'estrazione del canale da cui proviene una chiave o un segmento rifiutato dalla sorgente."""
+        if not original_channel_url:
+            return
         try:
-            # 1. Selezione Manuale tramite parametro 'host'
-            if host:
-                host = host.lower()
-                key = host
-                
-                if host == "vavoo":
-                    proxies = VAVOO_PROXIES or GLOBAL_PROXIES
-                    if key not in self.extractors:
-                        self.extractors[key] = VavooExtractor(request_headers, proxies=proxies)
-                    return self.extractors[key]
-                
-                elif host in ["dlhd", "daddylive"]:
-                    key = "dlhd"
-                    proxies = DLHD_PROXIES or GLOBAL_PROXIES
-                    if key not in self.extractors:
-                        self.extractors[key] = DLHDExtractor(request_headers, proxies=proxies)
-                    return self.extractors[key]
-                
-                elif host == "vixsrc":
-                    if key not in self.extractors:
-                        self.extractors[key] = VixSrcExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                    return self.extractors[key]
-                
-                elif host in ["sportsonline", "sportzonline"]:
-                    key = "sportsonline"
-                    if key not in self.extractors:
-                        self.extractors[key] = SportsonlineExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                    return self.extractors[key]
-                
-                elif host == "mixdrop":
-                    if key not in self.extractors:
-                        self.extractors[key] = MixdropExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                    return self.extractors[key]
-                
-                elif host == "voe":
-                    if key not in self.extractors:
-                        self.extractors[key] = VoeExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                    return self.extractors[key]
-                
-                elif host == "streamtape":
-                    if key not in self.extractors:
-                        self.extractors[key] = StreamtapeExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                    return self.extractors[key]
-                
-                elif host == "orion":
-                    if key not in self.extractors:
-                        self.extractors[key] = OrionExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                    return self.extractors[key]
-
-            # 2. Auto-detection basata sull'URL
-            if "vavoo.to" in url:
-                key = "vavoo"
-                proxies = VAVOO_PROXIES or GLOBAL_PROXIES
-                if key not in self.extractors:
-                    self.extractors[key] = VavooExtractor(request_headers, proxies=proxies)
-                return self.extractors[key]
-            elif any(domain in url for domain in ["daddylive", "dlhd"]) or re.search(r'stream-\d+\.php', url):
-                key = "dlhd"
-                proxies = DLHD_PROXIES or GLOBAL_PROXIES
-                if key not in self.extractors:
-                    self.extractors[key] = DLHDExtractor(request_headers, proxies=proxies)
-                return self.extractors[key]
-            elif 'vixsrc.to/' in url.lower() and any(x in url for x in ['/movie/', '/tv/', '/iframe/']):
-                key = "vixsrc"
-                if key not in self.extractors:
-                    self.extractors[key] = VixSrcExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                return self.extractors[key]
-            elif any(domain in url for domain in ["sportzonline", "sportsonline"]):
-                key = "sportsonline"
-                proxies = GLOBAL_PROXIES
-                if key not in self.extractors:
-                    self.extractors[key] = SportsonlineExtractor(request_headers, proxies=proxies)
-                return self.extractors[key]
-            elif "mixdrop" in url:
-                key = "mixdrop"
-                if key not in self.extractors:
-                    self.extractors[key] = MixdropExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                return self.extractors[key]
-            elif any(d in url for d in ["voe.sx", "voe.to", "voe.st", "voe.eu", "voe.la", "voe-network.net"]):
-                key = "voe"
-                if key not in self.extractors:
-                    self.extractors[key] = VoeExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                return self.extractors[key]
-            elif "streamtape.com" in url or "streamtape.to" in url or "streamtape.net" in url:
-                key = "streamtape"
-                if key not in self.extractors:
-                    self.extractors[key] = StreamtapeExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                return self.extractors[key]
-            elif "orionoid.com" in url:
-                key = "orion"
-                if key not in self.extractors:
-                    self.extractors[key] = OrionExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                return self.extractors[key]
-            else:
-                # Fallback al GenericHLSExtractor per qualsiasi altro URL.
-                key = "hls_generic"
-                if key not in self.extractors:
-                    self.extractors[key] = GenericHLSExtractor(request_headers, proxies=GLOBAL_PROXIES)
-                return self.extractors[key]
-        except (NameError, TypeError) as e:
-            raise ExtractorError(f"Estrattore non disponibile - modulo mancante: {e}")
+            await self.invalidate_extraction(await self.get_extractor(original_channel_url, {}), original_channel_url)
+        except Exception as cache_e:
+            logger.error(f"⚠️ Errore durante l'invalidazione automatica della cache: {cache_e}")
+
+    @staticmethod
+    def _original_channel_url(request) -> str:
+        """URL del canale: 'url' nella richiesta iniziale, poi propagato come 'original_channel_url' negli URL riscritti."""
+        return request.query.get('url') or request.query.get('original_channel_url', '')
 
     async def handle_proxy_request(self, request):
         """Gestisce le richieste proxy principali"""
@@ -676,7 +729,7 @@ class HLSProxy:
             
             try:
                 # Passa il flag force_refresh all'estrattore
-                result = await extractor.extract(target_url, force_refresh=force_refresh)
+                result = await self.extract(extractor, target_url, force_refresh=force_refresh)
                 stream_url = result["destination_url"]
                 stream_headers = result.get("request_headers", {})
                 print(f"   Resolved Stream URL: {stream_url}")
@@ -709,22 +762,25 @@ class HLSProxy:
                     return web.json_response(response_data)
 
                 # Aggiungi headers personalizzati da query params
-                for param_name, param_value in request.query.items():
-                    if param_name.startswith('h_'):
-                        header_name = param_name[2:]
-                        
-                        # Rimuovi eventuali header duplicati
-                        for k in list(stream_headers.keys()):
-                            if k.lower() == header_name.lower():
-                                del stream_headers[k]
-                        
-                        stream_headers[header_name] = param_value
+                stream_headers = self._apply_header_overrides(stream_headers, {
+                    param_name[2:]: param_value
+                    for param_name, param_value in request.query.items() if param_name.startswith('h_')
+                })
                 
                 # Stream URL resolved
-                return await self._proxy_stream(request, stream_url, stream_headers)
+                response = await self._proxy_stream(request, stream_url, stream_headers)
+                if response.status in (401, 403, 404, 410) and not isinstance(extractor, GenericHLSExtractor):
+                    # Lo stream risolto non è più valido: la prossima richiesta ripete l'estrazione
+                    logger.warning(f"⚠️ Stream risolto rifiutato dalla sorgente ({response.status}), invalido la cache: {target_url}")
+                    await self.invalidate_extraction(extractor, target_url)
+                elif response.status in (401, 403, 410) and request.query.get('original_channel_url'):
+                    # Segmento (o playlist annidata) rifiutato: il token del canale non è più valido
+                    logger.warning(f"⚠️ Segmento rifiutato dalla sorgente ({response.status}), invalido il canale: {request.query['original_channel_url']}")
+                    await self.invalidate_channel(request.query['original_channel_url'])
+                return response
             except ExtractorError as e:
                 logger.warning(f"Estrazione fallita, tento di nuovo forzando l'aggiornamento: {e}")
-                result = await extractor.extract(target_url, force_refresh=True)
+                result = await self.extract(extractor, target_url, force_refresh=True)
                 stream_url = result["destination_url"]
                 stream_headers = result.get("request_headers", {})
                 return await self._proxy_stream(request, stream_url, stream_headers)
@@ -733,11 +789,7 @@ class HLSProxy:
             error_msg = str(e).lower()
             is_temporary_error = any(x in error_msg for x in ['403', 'forbidden', '502', 'bad gateway', 'timeout', 'connection', 'temporarily unavailable'])
             
-            extractor_name = "sconosciuto"
-            if DLHDExtractor and isinstance(extractor, DLHDExtractor):
-                extractor_name = "DLHDExtractor"
-            elif VavooExtractor and isinstance(extractor, VavooExtractor):
-                extractor_name = "VavooExtractor"
+            extractor_name = type(extractor).__name__ if extractor is not None else "sconosciuto"
 
             # Se è un errore temporaneo (sito offline), logga solo un WARNING
             if is_temporary_error:
@@ -771,6 +823,7 @@ class HLSProxy:
                             "url": "(Required) URL to extract. Supports plain text, URL encoded, or Base64.",
                             "host": "(Optional) Force specific extractor (bypass auto-detect).",
                             "redirect_stream": "(Optional) 'true' to redirect to stream, 'false' for JSON.",
+                            "force": "(Optional) 'true' to bypass the extraction cache.",
                             "api_password": "(Optional) API Password if configured."
                         }
                     },
@@ -786,71 +839,23 @@ class HLSProxy:
                 }
                 return web.json_response(help_response)
 
-            # 1. URL Decoding (Standard)
-            try:
-                url = urllib.parse.unquote(url)
-            except:
-                pass
-
-            # 2. Base64 Decoding (Try)
-            try:
-                # Tentativo di decodifica Base64 se non sembra un URL valido o se richiesto
-                # Aggiunge padding se necessario
-                padded_url = url + '=' * (-len(url) % 4)
-                decoded_bytes = base64.b64decode(padded_url, validate=True)
-                decoded_str = decoded_bytes.decode('utf-8').strip()
-                
-                # Verifica se il risultato sembra un URL valido
-                if decoded_str.startswith('http://') or decoded_str.startswith('https://'):
-                    url = decoded_str
-                    logger.info(f"🔓 URL Base64 decodificato: {url}")
-            except Exception:
-                # Non è Base64 o non è un URL valido, proseguiamo con l'originale
-                pass
+            url = self._decode_extractor_url(url)
 
             redirect_stream = request.query.get('redirect_stream', 'false').lower() == 'true'
             logger.info(f"🔍 Extracting: {url} (Host: {host_param}, Redirect: {redirect_stream})")
 
+            force_refresh = request.query.get('force', 'false').lower() == 'true'
             extractor = await self.get_extractor(url, dict(request.headers), host=host_param)
-            result = await extractor.extract(url)
-            
-            stream_url = result["destination_url"]
-            stream_headers = result.get("request_headers", {})
-            endpoint_type = result.get("endpoint_type", "hls_proxy")
-            
-            logger.info(f"✅ Extraction success: {stream_url[:50]}... Endpoint: {endpoint_type}")
-
-            scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
-            host = request.headers.get('X-Forwarded-Host', request.host)
-            proxy_base = f"{scheme}://{host}"
+            result = await self.extract(extractor, url, force_refresh=force_refresh)
             
-            endpoint = "/proxy/hls/manifest.m3u8"
-            if endpoint_type == "proxy_stream_endpoint" or ".mp4" in stream_url or ".mkv" in stream_url or ".avi" in stream_url:
-                 endpoint = "/proxy/stream"
-            elif ".mpd" in stream_url:
-                endpoint = "/proxy/mpd/manifest.m3u8"
-
-            encoded_url = urllib.parse.quote(stream_url, safe='')
-            header_params = "".join([f"&h_{urllib.parse.quote(key)}={urllib.parse.quote(value)}" for key, value in stream_headers.items()])
-            
-            api_password = request.query.get('api_password')
-            if api_password:
-                header_params += f"&api_password={api_password}"
-
-            proxy_url = f"{proxy_base}{endpoint}?d={encoded_url}{header_params}"
+            response_data = self._extractor_response_data(request, result)
+            stream_url = response_data["destination_url"]
+            logger.info(f"✅ Extraction success: {stream_url[:50]}... Endpoint: {response_data['endpoint_type']}")
 
             if redirect_stream:
-                logger.info(f"↪️ Redirecting to: {proxy_url}")
-                return web.HTTPFound(proxy_url)
-
-            response_data = {
-                "destination_url": stream_url,
-                "request_headers": stream_headers,
-                "endpoint_type": endpoint_type,
-                "proxy_url": proxy_url,
-                "query_params": {}
-            }
-            
+                logger.info(f"↪️ Redirecting to: {response_data['proxy_url']}")
+                return web.HTTPFound(response_data['proxy_url'])
+
             logger.info(f"✅ Extractor OK: {url} -> {stream_url[:50]}...")
             return web.json_response(response_data)
 
@@ -870,6 +875,143 @@ class HLSProxy:
             
             return web.Response(text=str(e), status=500)
 
+    @staticmethod
+    def _decode_extractor_url(url: str) -> str:
+        """Decodifica l'URL passato all'Extractor API (URL encoded oppure Base64)."""
+        # 1. URL Decoding (Standard)
+        try:
+            url = urllib.parse.unquote(url)
+        except:
+            pass
+
+        # 2. Base64 Decoding (Try)
+        try:
+            # Tentativo di decodifica Base64 se non sembra un URL valido o se richiesto
+            # Aggiunge padding se necessario
+            padded_url = url + '=' * (-len(url) % 4)
+            decoded_bytes = base64.b64decode(padded_url, validate=True)
+            decoded_str = decoded_bytes.decode('utf-8').strip()
+            
+            # Verifica se il risultato sembra un URL valido
+            if decoded_str.startswith('http://') or decoded_str.startswith('https://'):
+                url = decoded_str
+                logger.info(f"🔓 URL Base64 decodificato: {url}")
+        except Exception:
+            # Non è Base64 o non è un URL valido, proseguiamo con l'originale
+            pass
+        return url
+
+    def _extractor_response_data(self, request, result: dict) -> dict:
+        """Risposta JSON dell'Extractor API: risultato dell'estrattore + URL del proxy pronto per la riproduzione."""
+        stream_url = result["destination_url"]
+        stream_headers = result.get("request_headers", {})
+        endpoint_type = result.get("endpoint_type", "hls_proxy")
+
+        scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
+        host = request.headers.get('X-Forwarded-Host', request.host)
+        proxy_base = f"{scheme}://{host}"
+        
+        endpoint = "/proxy/hls/manifest.m3u8"
+        if endpoint_type == "proxy_stream_endpoint" or ".mp4" in stream_url or ".mkv" in stream_url or ".avi" in stream_url:
+             endpoint = "/proxy/stream"
+        elif ".mpd" in stream_url:
+            endpoint = "/proxy/mpd/manifest.m3u8"
+
+        encoded_url = urllib.parse.quote(stream_url, safe='')
+        header_params = "".join([f"&h_{urllib.parse.quote(key)}={urllib.parse.quote(value)}" for key, value in stream_headers.items()])
+        
+        api_password = request.query.get('api_password')
+        if api_password:
+            header_params += f"&api_password={api_password}"
+
+        return {
+            "destination_url": stream_url,
+            "request_headers": stream_headers,
+            "endpoint_type": endpoint_type,
+            "proxy_url": f"{proxy_base}{endpoint}?d={encoded_url}{header_params}",
+            "query_params": {}
+        }
+
+    async def handle_extractor_batch(self, request):
+        """
+        Risolve più URL in una sola richiesta (POST JSON) e restituisce un risultato NDJSON per riga,
+        nell'ordine in cui le estrazioni terminano. Gli estrattori (sessione, signature, cache)
+        sono gli stessi di /extractor/video; la concorrenza è limitata per estrattore.
+        """
+        if not check_password(request):
+            logger.warning("⛔ Unauthorized extractor batch request")
+            return web.Response(status=401, text="Unauthorized: Invalid API Password")
+
+        try:
+            data = await request.json()
+        except Exception:
+            return web.Response(text="Body JSON non valido", status=400)
+
+        # Oggetto {"urls": [...], "host": ..., "force": ...} oppure direttamente la lista degli URL
+        if isinstance(data, list):
+            data = {"urls": data}
+        if not isinstance(data, dict) or not isinstance(data.get("urls"), list):
+            return web.Response(text="Il body deve contenere 'urls' come lista", status=400)
+        default_host = data.get("host")
+        force_refresh = str(data.get("force", "false")).lower() == "true"
+
+        # Ogni elemento può essere un URL o un oggetto {"url": ..., "host": ...}
+        items = []
+        for item in data["urls"]:
+            if isinstance(item, dict):
+                items.append((item.get("url") or item.get("d"), item.get("host") or default_host))
+            else:
+                items.append((item, default_host))
+
+        if not items:
+            return web.Response(text="Parametro 'urls' mancante", status=400)
+        if len(items) > EXTRACTOR_BATCH_MAX_URLS:
+            return web.Response(text=f"Troppi URL: massimo {EXTRACTOR_BATCH_MAX_URLS} per richiesta", status=413)
+
+        logger.info(f"📦 Extractor batch: {len(items)} URL da {request.remote}")
+        request_headers = dict(request.headers)
+
+        async def resolve(index: int, url: str, host):
+            line = {"index": index, "url": url}
+            try:
+                if not url or not isinstance(url, str):
+                    raise ExtractorError("URL mancante")
+                url = self._decode_extractor_url(url)
+                extractor = await self.get_extractor(url, request_headers, host=host)
+                name = self._extractor_name(extractor)
+                semaphore = self._batch_semaphores.get(name)
+                if semaphore is None:
+                    semaphore = self._batch_semaphores[name] = asyncio.Semaphore(max(1, EXTRACTOR_BATCH_CONCURRENCY))
+                async with semaphore:
+                    result = await self.extract(extractor, url, force_refresh=force_refresh)
+                line.update(self._extractor_response_data(request, result))
+                line["ok"] = True
+            except Exception as e:
+                line.update({"ok": False, "error": str(e)})
+            return line
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'application/x-ndjson',
+            'Access-Control-Allow-Origin': '*',
+        })
+        await response.prepare(request)
+
+        tasks = [asyncio.ensure_future(resolve(i, url, host)) for i, (url, host) in enumerate(items)]
+        resolved = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                resolved += line["ok"]
+                await response.write(json.dumps(line).encode() + b"\n")
+        finally:
+            # Client disconnesso: le estrazioni rimaste non servono più
+            for task in tasks:
+                task.cancel()
+
+        logger.info(f"✅ Extractor batch completato: {resolved}/{len(items)} risolti")
+        await response.write_eof()
+        return response
+
     async def handle_license_request(self, request):
         """Gestisce le richieste di licenza DRM (ClearKey e Proxy)"""
         try:
@@ -919,39 +1061,109 @@ class HLSProxy:
             logger.info(f"🔐 Proxying License Request to: {license_url}")
             
             proxy = random.choice(GLOBAL_PROXIES) if GLOBAL_PROXIES else None
-            connector_kwargs = {}
-            if proxy:
-                connector_kwargs['proxy'] = proxy
-            
-            async with ClientSession() as session:
-                async with session.request(
-                    request.method, 
-                    license_url, 
-                    headers=headers, 
-                    data=body, 
-                    **connector_kwargs
-                ) as resp:
-                    response_body = await resp.read()
-                    logger.info(f"✅ License response: {resp.status} ({len(response_body)} bytes)")
-                    
-                    response_headers = {
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Headers": "*",
-                        "Access-Control-Allow-Methods": "GET, POST, OPTIONS"
-                    }
-                    if 'Content-Type' in resp.headers:
-                        response_headers['Content-Type'] = resp.headers['Content-Type']
+            session = await self.connection_manager.get_session(license_url, proxy)
+            async with session.request(
+                request.method, 
+                license_url, 
+                headers=headers, 
+                data=body
+            ) as resp:
+                response_body = await resp.read()
+                logger.info(f"✅ License response: {resp.status} ({len(response_body)} bytes)")
+                
+                response_headers = {
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Headers": "*",
+                    "Access-Control-Allow-Methods": "GET, POST, OPTIONS"
+                }
+                if 'Content-Type' in resp.headers:
+                    response_headers['Content-Type'] = resp.headers['Content-Type']
 
-                    return web.Response(
-                        body=response_body,
-                        status=resp.status,
-                        headers=response_headers
-                    )
+                return web.Response(
+                    body=response_body,
+                    status=resp.status,
+                    headers=response_headers
+                )
 
         except Exception as e:
             logger.error(f"❌ License proxy error: {str(e)}")
             return web.Response(text=f"License error: {str(e)}", status=500)
 
+    async def _fetch_aes_key(self, key_url: str, headers: dict, original_channel_url: str = None):
+        """
+        Restituisce (status, bytes) della chiave AES-128: dalla cache se presente, altrimenti
+        con un solo download condiviso dai client che la chiedono nello stesso momento.
+        In caso di errore invalida le chiavi del canale e la cache dell'estrattore.
+        """
+        # Chiave già scaricata (da un altro client o dal prefetch della playlist)
+        cache_key = SegmentCache.make_key(key_url, headers)
+        cached_key = self.key_cache.get(cache_key)
+        if cached_key:
+            return 200, cached_key.body
+
+        logger.info(f"🔑 Fetching AES key from: {key_url}")
+        
+        proxy = self._select_key_proxy(key_url, original_channel_url)
+        if proxy:
+            logger.info(f"Utilizzo del proxy {proxy} per la richiesta della chiave.")
+
+        timeout = ClientTimeout(total=30)
+        session = await self.connection_manager.get_session(key_url, proxy)
+
+        async def fetch_key(flight):
+            async with session.get(key_url, headers=headers, timeout=timeout) as resp:
+                flight.set_response(resp.status, resp.headers.copy(), resp.charset)
+                await flight.feed(await resp.read())
+
+        # Più client che chiedono la stessa chiave nello stesso momento condividono un solo download
+        upstream = self.single_flight.join(cache_key, fetch_key)
+        try:
+            status, _ = await upstream.wait_response()
+            if status == 200 or status == 206:
+                key_data = await upstream.read()
+                logger.info(f"✅ AES key fetched successfully: {len(key_data)} bytes")
+                self._store_key(cache_key, key_data, original_channel_url)
+                return status, key_data
+        finally:
+            upstream.close()
+
+        logger.error(f"❌ Key fetch failed with status: {status}")
+        # Invalidation logic
+        self._invalidate_keys(original_channel_url, cache_key)
+        await self.invalidate_channel(original_channel_url)
+        return status, None
+
+    def _store_key(self, cache_key, key_data: bytes, original_channel_url: str = None):
+        """Memorizza una chiave AES e la associa al canale, per poterla invalidare insieme allo stream."""
+        if not self.key_cache.put(cache_key, key_data, {}) or not original_channel_url:
+            return
+        channel_keys = self._channel_key_cache.setdefault(original_channel_url, set())
+        channel_keys.add(cache_key)
+        # Dimentica le chiavi già scadute del canale
+        channel_keys.intersection_update({k for k in channel_keys if self.key_cache.contains(k)})
+        if len(self._channel_key_cache) > 1000:
+            for channel in [c for c, keys in self._channel_key_cache.items() if not any(self.key_cache.contains(k) for k in keys)]:
+                del self._channel_key_cache[channel]
+
+    def _invalidate_keys(self, original_channel_url: str = None, cache_key=None):
+        """Scarta la chiave fallita e tutte quelle in cache per lo stesso canale."""
+        if cache_key is not None:
+            self.key_cache.invalidate(cache_key)
+        for key in self._channel_key_cache.pop(original_channel_url, ()) if original_channel_url else ():
+            self.key_cache.invalidate(key)
+
+    @staticmethod
+    def _select_key_proxy(key_url: str, original_channel_url: str = None):
+        """Selezione Proxy Intelligente per le chiavi AES"""
+        proxy_list = GLOBAL_PROXIES
+
+        if "newkso.ru" in key_url or (original_channel_url and any(domain in original_channel_url for domain in ["daddylive", "dlhd"])):
+            proxy_list = DLHD_PROXIES or GLOBAL_PROXIES
+        elif original_channel_url and "vavoo.to" in original_channel_url:
+            proxy_list = VAVOO_PROXIES or GLOBAL_PROXIES
+
+        return random.choice(proxy_list) if proxy_list else None
+
     async def handle_key_request(self, request):
         """Gestisce richieste per chiavi AES-128"""
         if not check_password(request):
@@ -992,52 +1204,21 @@ class HLSProxy:
                         continue
                     headers[header_name] = param_value
 
-            logger.info(f"🔑 Fetching AES key from: {key_url}")
-            
-            # Selezione Proxy Intelligente
-            proxy_list = GLOBAL_PROXIES
-            original_channel_url = request.query.get('original_channel_url')
-
-            if "newkso.ru" in key_url or (original_channel_url and any(domain in original_channel_url for domain in ["daddylive", "dlhd"])):
-                proxy_list = DLHD_PROXIES or GLOBAL_PROXIES
-            elif original_channel_url and "vavoo.to" in original_channel_url:
-                proxy_list = VAVOO_PROXIES or GLOBAL_PROXIES
-            
-            proxy = random.choice(proxy_list) if proxy_list else None
-            connector_kwargs = {}
-            if proxy:
-                connector_kwargs['proxy'] = proxy
-                logger.info(f"Utilizzo del proxy {proxy} per la richiesta della chiave.")
-            
-            timeout = ClientTimeout(total=30)
-            async with ClientSession(timeout=timeout) as session:
-                async with session.get(key_url, headers=headers, **connector_kwargs) as resp:
-                    if resp.status == 200 or resp.status == 206:
-                        key_data = await resp.read()
-                        logger.info(f"✅ AES key fetched successfully: {len(key_data)} bytes")
-                        
-                        return web.Response(
-                            body=key_data,
-                            content_type="application/octet-stream",
-                            headers={
-                                "Access-Control-Allow-Origin": "*",
-                                "Access-Control-Allow-Headers": "*",
-                                "Cache-Control": "no-cache, no-store, must-revalidate"
-                            }
-                        )
-                    else:
-                        logger.error(f"❌ Key fetch failed with status: {resp.status}")
-                        # Invalidation logic
-                        try:
-                            url_param = request.query.get('original_channel_url')
-                            if url_param:
-                                extractor = await self.get_extractor(url_param, {})
-                                if hasattr(extractor, 'invalidate_cache_for_url'):
-                                    await extractor.invalidate_cache_for_url(url_param)
-                        except Exception as cache_e:
-                            logger.error(f"⚠️ Errore durante l'invalidazione automatica della cache: {cache_e}")
-                        return web.Response(text=f"Key fetch failed: {resp.status}", status=resp.status)
-                        
+            key_headers = {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "*",
+                "Cache-Control": "no-cache, no-store, must-revalidate"
+            }
+
+            status, key_data = await self._fetch_aes_key(key_url, headers, request.query.get('original_channel_url'))
+            if status == 200 or status == 206:
+                return web.Response(
+                    body=key_data,
+                    content_type="application/octet-stream",
+                    headers=key_headers
+                )
+            return web.Response(text=f"Key fetch failed: {status}", status=status)
+                    
         except Exception as e:
             logger.error(f"❌ Error fetching AES key: {str(e)}")
             return web.Response(text=f"Key error: {str(e)}", status=500)
@@ -1073,32 +1254,121 @@ class HLSProxy:
             logger.error(f"Errore nel proxy segmento .ts: {str(e)}")
             return web.Response(text=f"Errore segmento: {str(e)}", status=500)
 
+    @staticmethod
+    def _apply_header_overrides(stream_headers: dict, overrides: dict) -> dict:
+        """Applica gli header personalizzati (parametri h_) sostituendo quelli con lo stesso nome."""
+        for header_name, value in overrides.items():
+            # Rimuovi eventuali header duplicati
+            for k in list(stream_headers.keys()):
+                if k.lower() == header_name.lower():
+                    del stream_headers[k]
+            
+            stream_headers[header_name] = value
+        return stream_headers
+
+    @staticmethod
+    def _normalize_stream_headers(stream_headers: dict) -> dict:
+        """Normalizzazione Header e Forzatura User-Agent Chrome."""
+        normalized_headers = {}
+        for k, v in stream_headers.items():
+            if k.lower() == 'user-agent':
+                normalized_headers['User-Agent'] = DEFAULT_USER_AGENT
+            elif k.lower() == 'referer':
+                normalized_headers['Referer'] = v
+            elif k.lower() == 'origin':
+                normalized_headers['Origin'] = v
+            elif k.lower() == 'authorization':
+                normalized_headers['Authorization'] = v
+            elif k.lower() == 'range':
+                 normalized_headers['Range'] = v
+            else:
+                normalized_headers[k] = v
+        
+        # Assicurati che User-Agent sia impostato
+        if 'User-Agent' not in normalized_headers:
+            normalized_headers['User-Agent'] = DEFAULT_USER_AGENT
+        
+        return normalized_headers
+
+    @staticmethod
+    def _segment_extension(path: str) -> str:
+        """Determina l'estensione corretta (Cruciale per player audio/video specifici)"""
+        ext = ".ts" # Fallback
+        if path.endswith('.mp4') or path.endswith('.m4s') or path.endswith('.isml'):
+            ext = ".mp4"
+        elif path.endswith('.aac'):
+            ext = ".aac" # <--- Fondamentale per Mediaset Audio
+        elif path.endswith('.m4a'):
+            ext = ".m4a"
+        return ext
+
+    @staticmethod
+    def _is_segment_request(request) -> bool:
+        """True per le route dei segmenti media (/proxy/hls/segment.* e /segment/{segment})."""
+        return request.path.startswith('/proxy/hls/segment.') or request.path.startswith('/segment/')
+
+    @classmethod
+    def _can_coalesce(cls, request, headers: dict) -> bool:
+        """Solo manifest e segmenti richiesti per intero possono condividere il download upstream."""
+        if any(h.lower() in ('range', 'if-none-match', 'if-modified-since') for h in headers):
+            return False
+        return cls._is_segment_request(request) or request.path in (
+            '/proxy/manifest.m3u8', '/proxy/hls/manifest.m3u8', '/proxy/mpd/manifest.m3u8'
+        )
+
+    @classmethod
+    def _manifest_cache_key(cls, request, stream_url: str, headers: dict) -> tuple:
+        """Chiave della cache manifest: URL upstream + header inoltrati + base del proxy e api_password."""
+        scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
+        host = request.headers.get('X-Forwarded-Host', request.host)
+        return (
+            SegmentCache.make_key(stream_url, headers),
+            f"{scheme}://{host}",
+            request.query.get('api_password'),
+            cls._original_channel_url(request)
+        )
+
+    @staticmethod
+    def _manifest_cache_ttl(manifest_content: str) -> float:
+        """TTL del manifest riscritto: lungo per playlist chiuse, frazione di #EXT-X-TARGETDURATION per le live."""
+        if '#EXT-X-ENDLIST' in manifest_content:
+            return MANIFEST_CACHE_VOD_TTL
+        match = re.search(r'#EXT-X-TARGETDURATION:\s*(\d+(?:\.\d+)?)', manifest_content)
+        if match:
+            return max(float(match.group(1)) * MANIFEST_CACHE_LIVE_FRACTION, 1.0)
+        return MANIFEST_CACHE_MASTER_TTL
+
+    @staticmethod
+    def _manifest_kind(content_type: str, stream_url: str):
+        """Restituisce 'hls' o 'dash' se la risposta upstream è un manifest, altrimenti None."""
+        if 'mpegurl' in content_type or stream_url.endswith('.m3u8') or (stream_url.endswith('.css') and 'newkso.ru' in stream_url):
+            return 'hls'
+        if 'dash+xml' in content_type or stream_url.endswith('.mpd'):
+            return 'dash'
+        return None
+
+    @staticmethod
+    def _segment_response_headers(upstream_headers, stream_url: str, request_path: str) -> dict:
+        """Header della risposta al client per segmenti e file media."""
+        response_headers = {}
+        for header in ['content-type', 'content-length', 'content-range', 
+                     'accept-ranges', 'last-modified', 'etag']:
+            if header in upstream_headers:
+                response_headers[header] = upstream_headers[header]
+        
+        # Forza Content-Type per segmenti .ts se necessario
+        if (stream_url.endswith('.ts') or request_path.endswith('.ts')) and 'video/mp2t' not in response_headers.get('content-type', '').lower():
+            response_headers['Content-Type'] = 'video/MP2T'
+
+        response_headers['Access-Control-Allow-Origin'] = '*'
+        response_headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
+        response_headers['Access-Control-Allow-Headers'] = 'Range, Content-Type'
+        return response_headers
+
     async def _proxy_stream(self, request, stream_url, stream_headers):
         """Effettua il proxy dello stream con gestione manifest e AES-128"""
         try:
-            headers = dict(stream_headers)
-            
-            # Normalizzazione Header e Forzatura User-Agent Chrome
-            normalized_headers = {}
-            for k, v in headers.items():
-                if k.lower() == 'user-agent':
-                    normalized_headers['User-Agent'] = DEFAULT_USER_AGENT
-                elif k.lower() == 'referer':
-                    normalized_headers['Referer'] = v
-                elif k.lower() == 'origin':
-                    normalized_headers['Origin'] = v
-                elif k.lower() == 'authorization':
-                    normalized_headers['Authorization'] = v
-                elif k.lower() == 'range':
-                     normalized_headers['Range'] = v
-                else:
-                    normalized_headers[k] = v
-            
-            # Assicurati che User-Agent sia impostato
-            if 'User-Agent' not in normalized_headers:
-                normalized_headers['User-Agent'] = DEFAULT_USER_AGENT
-            
-            headers = normalized_headers
+            headers = self._normalize_stream_headers(stream_headers)
 
             # Rimuovi Range se è un manifest per evitare errori, altrimenti passalo
             if any(ext in stream_url.lower() for ext in ['.m3u8', '.mpd', '.isml/manifest', '.mpd/manifest', '.php']):
@@ -1108,137 +1378,146 @@ class HLSProxy:
                     if header in request.headers:
                         headers[header] = request.headers[header]
 
+            # Cache condivisa dei segmenti (solo richieste complete, senza Range)
+            segment_cache_key = None
+            if self.segment_cache.enabled and self._is_segment_request(request) and 'range' not in headers and 'Range' not in headers:
+                segment_cache_key = self.segment_cache.make_key(stream_url, headers)
+                cached_segment = self.segment_cache.get(segment_cache_key)
+                if cached_segment:
+                    return web.Response(
+                        body=cached_segment.body,
+                        status=cached_segment.status,
+                        headers=cached_segment.headers
+                    )
+
+            # Cache dei manifest HLS riscritti: i client che ricaricano la playlist non toccano la sorgente
+            manifest_cache_key = None
+            if self.manifest_cache.enabled and request.path in ('/proxy/manifest.m3u8', '/proxy/hls/manifest.m3u8') and self._can_coalesce(request, headers):
+                manifest_cache_key = self._manifest_cache_key(request, stream_url, headers)
+                cached_manifest = self.manifest_cache.get(manifest_cache_key)
+                if cached_manifest:
+                    self.prefetcher.touch(stream_url)
+                    return web.Response(body=cached_manifest.body, headers=cached_manifest.headers)
+
+            # MPD già scaricato e parsato (master e media playlist HLS dello stesso MPD)
+            mpd_cache_key = None
+            if self.mpd_cache.enabled and self._wants_mpd_as_hls(request) and self._can_coalesce(request, headers):
+                mpd_cache_key = SegmentCache.make_key(stream_url, headers)
+                mpd_root = self.mpd_cache.get(mpd_cache_key)
+                if mpd_root is not None:
+                    return self._mpd_to_hls_response(request, mpd_root, stream_url, stream_headers, self._clearkey_param(request))
+
             proxy = random.choice(GLOBAL_PROXIES) if GLOBAL_PROXIES else None
-            connector_kwargs = {}
             if proxy:
-                connector_kwargs['proxy'] = proxy
                 logger.info(f"📡 [Proxy Stream] Utilizzo del proxy {proxy} per la richiesta verso: {stream_url}")
 
             timeout = ClientTimeout(total=60, connect=30)
-            async with ClientSession(timeout=timeout) as session:
-                async with session.get(stream_url, headers=headers, **connector_kwargs, ssl=False) as resp:
-                    content_type = resp.headers.get('content-type', '')
-                    
-                    # Gestione manifest HLS
-                    if 'mpegurl' in content_type or stream_url.endswith('.m3u8') or (stream_url.endswith('.css') and 'newkso.ru' in stream_url):
-                        manifest_content = await resp.text()
-                        
-                        scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
-                        host = request.headers.get('X-Forwarded-Host', request.host)
-                        proxy_base = f"{scheme}://{host}"
-                        original_channel_url = request.query.get('url', '')
-                        
-                        api_password = request.query.get('api_password')
-                        rewritten_manifest = await self._rewrite_manifest_urls(
-                            manifest_content, stream_url, proxy_base, headers, original_channel_url, api_password
-                        )
-                        
-                        return web.Response(
-                            text=rewritten_manifest,
-                            headers={
-                                'Content-Type': 'application/vnd.apple.mpegurl',
-                                'Content-Disposition': 'attachment; filename="stream.m3u8"',
-                                'Access-Control-Allow-Origin': '*',
-                                'Cache-Control': 'no-cache'
-                            }
-                        )
-                    
-                    # Gestione manifest DASH
-                    elif 'dash+xml' in content_type or stream_url.endswith('.mpd'):
-                        manifest_content = await resp.text()
-                        
-                        scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
-                        host = request.headers.get('X-Forwarded-Host', request.host)
-                        proxy_base = f"{scheme}://{host}"
-                        
-                        clearkey_param = request.query.get('clearkey')
-                        if not clearkey_param:
-                            key_id = request.query.get('key_id')
-                            key = request.query.get('key')
-                            if key_id and key:
-                                clearkey_param = f"{key_id}:{key}"
-
-                        req_format = request.query.get('format')
-                        rep_id = request.query.get('rep_id')
-                        
-                        # Conversione a HLS se richiesto
-                        if req_format == 'hls' or (request.path.endswith('.m3u8') and req_format != 'mpd'):
-                            params = "".join([f"&h_{urllib.parse.quote(key)}={urllib.parse.quote(value)}" for key, value in stream_headers.items()])
-                            
-                            api_password = request.query.get('api_password')
-                            if api_password:
-                                params += f"&api_password={api_password}"
-                            if clearkey_param:
-                                params += f"&clearkey={clearkey_param}"
-                            
-                            if rep_id:
-                                hls_content = self.mpd_converter.convert_media_playlist(
-                                    manifest_content, rep_id, proxy_base, stream_url, params, clearkey_param
-                                )
-                                return web.Response(
-                                    text=hls_content,
-                                    headers={
-                                        'Content-Type': 'application/vnd.apple.mpegurl',
-                                        'Content-Disposition': 'attachment; filename="playlist.m3u8"',
-                                        'Access-Control-Allow-Origin': '*',
-                                        'Cache-Control': 'no-cache'
-                                    }
-                                )
-                            else:
-                                hls_content = self.mpd_converter.convert_master_playlist(
-                                    manifest_content, proxy_base, stream_url, params
-                                )
-                                return web.Response(
-                                    text=hls_content,
-                                    headers={
-                                        'Content-Type': 'application/vnd.apple.mpegurl',
-                                        'Content-Disposition': 'attachment; filename="master.m3u8"',
-                                        'Access-Control-Allow-Origin': '*',
-                                        'Cache-Control': 'no-cache'
-                                    }
-                                )
-
-                        # Altrimenti, proxy MPD nativo
-                        api_password = request.query.get('api_password')
-                        rewritten_manifest = self._rewrite_mpd_manifest(manifest_content, stream_url, proxy_base, headers, clearkey_param, api_password)
-                        
-                        return web.Response(
-                            text=rewritten_manifest,
-                            headers={
-                                'Content-Type': 'application/dash+xml',
-                                'Content-Disposition': 'attachment; filename="stream.mpd"',
-                                'Access-Control-Allow-Origin': '*',
-                                'Cache-Control': 'no-cache'
-                            })
+            session = await self.connection_manager.get_session(stream_url, proxy)
+
+            # Richieste identiche in corso (manifest, segmenti, init) condividono lo stesso download
+            flight_key = None
+            if self._can_coalesce(request, headers):
+                flight_key = SegmentCache.make_key(stream_url, headers)
+
+            upstream = self.single_flight.join(
+                flight_key,
+                lambda flight: self._fetch_into_flight(flight, session, stream_url, headers, timeout, segment_cache_key, request.path)
+            )
+            try:
+                status, upstream_headers = await upstream.wait_response()
+                content_type = upstream_headers.get('content-type', '')
+                manifest_kind = self._manifest_kind(content_type, stream_url)
+                
+                # Gestione manifest HLS
+                if manifest_kind == 'hls':
+                    manifest_content = await upstream.text()
                     
-                    # Streaming normale per segmenti (ts, mp4, etc)
-                    response_headers = {}
-                    for header in ['content-type', 'content-length', 'content-range', 
-                                 'accept-ranges', 'last-modified', 'etag']:
-                        if header in resp.headers:
-                            response_headers[header] = resp.headers[header]
+                    scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
+                    host = request.headers.get('X-Forwarded-Host', request.host)
+                    proxy_base = f"{scheme}://{host}"
+                    original_channel_url = self._original_channel_url(request)
                     
-                    # Forza Content-Type per segmenti .ts se necessario
-                    if (stream_url.endswith('.ts') or request.path.endswith('.ts')) and 'video/mp2t' not in response_headers.get('content-type', '').lower():
-                        response_headers['Content-Type'] = 'video/MP2T'
+                    api_password = request.query.get('api_password')
+                    rewritten_manifest = await self._rewrite_manifest_urls(
+                        manifest_content, stream_url, proxy_base, headers, original_channel_url, api_password
+                    )
+                    manifest_headers = {
+                        'Content-Type': 'application/vnd.apple.mpegurl',
+                        'Content-Disposition': 'attachment; filename="stream.m3u8"',
+                        'Access-Control-Allow-Origin': '*',
+                        'Cache-Control': 'no-cache'
+                    }
 
-                    response_headers['Access-Control-Allow-Origin'] = '*'
-                    response_headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-                    response_headers['Access-Control-Allow-Headers'] = 'Range, Content-Type'
+                    if manifest_cache_key and status == 200 and manifest_content.lstrip().startswith('#EXTM3U'):
+                        self.manifest_cache.put(
+                            manifest_cache_key, rewritten_manifest.encode('utf-8'), manifest_headers,
+                            ttl=self._manifest_cache_ttl(manifest_content)
+                        )
+
+                    if self.prefetcher.enabled and status == 200:
+                        self._schedule_prefetch(manifest_content, stream_url, headers, original_channel_url)
                     
-                    response = web.StreamResponse(
-                        status=resp.status,
-                        headers=response_headers
+                    return web.Response(
+                        text=rewritten_manifest,
+                        headers=manifest_headers
                     )
+                
+                # Gestione manifest DASH
+                elif manifest_kind == 'dash':
+                    manifest_content = await upstream.text()
                     
-                    await response.prepare(request)
-                    
-                    async for chunk in resp.content.iter_chunked(8192):
-                        await response.write(chunk)
+                    scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
+                    host = request.headers.get('X-Forwarded-Host', request.host)
+                    proxy_base = f"{scheme}://{host}"
                     
-                    await response.write_eof()
-                    return response
+                    clearkey_param = self._clearkey_param(request)
+
+                    # Conversione a HLS se richiesto
+                    if self._wants_mpd_as_hls(request):
+                        # Un solo parse per aggiornamento del MPD, condiviso da master e media playlist
+                        mpd_root = self.mpd_cache.get(mpd_cache_key) if mpd_cache_key else None
+                        if mpd_root is None:
+                            try:
+                                mpd_root = self.mpd_converter.parse_manifest(manifest_content)
+                                if mpd_cache_key and status == 200:
+                                    self.mpd_cache.put(mpd_cache_key, mpd_root)
+                            except ET.ParseError:
+                                # Il convertitore riporta l'errore nella playlist generata
+                                mpd_root = manifest_content
+                        return self._mpd_to_hls_response(request, mpd_root, stream_url, stream_headers, clearkey_param)
+
+                    # Altrimenti, proxy MPD nativo
+                    api_password = request.query.get('api_password')
+                    rewritten_manifest = self._rewrite_mpd_manifest(manifest_content, stream_url, proxy_base, headers, clearkey_param, api_password)
                     
+                    return web.Response(
+                        text=rewritten_manifest,
+                        headers={
+                            'Content-Type': 'application/dash+xml',
+                            'Content-Disposition': 'attachment; filename="stream.mpd"',
+                            'Access-Control-Allow-Origin': '*',
+                            'Cache-Control': 'no-cache'
+                        })
+                
+                # Streaming normale per segmenti (ts, mp4, etc)
+                response_headers = self._segment_response_headers(upstream_headers, stream_url, request.path)
+                
+                response = web.StreamResponse(
+                    status=status,
+                    headers=response_headers
+                )
+                
+                await response.prepare(request)
+                
+                # Scritture accorpate e adattive; response.write attende il drain del client (backpressure)
+                async for chunk in upstream.iter_batches(RELAY_MIN_WRITE_BYTES, RELAY_MAX_WRITE_BYTES):
+                    await response.write(chunk)
+                
+                await response.write_eof()
+                return response
+            finally:
+                upstream.close()
+                
         except (ClientPayloadError, ConnectionResetError, OSError) as e:
             logger.info(f"ℹ️ Client disconnesso dallo stream: {stream_url} ({str(e)})")
             return web.Response(text="Client disconnected", status=499)
@@ -1251,6 +1530,160 @@ class HLSProxy:
             logger.error(f"❌ Errore generico nel proxy dello stream: {str(e)}")
             return web.Response(text=f"Errore stream: {str(e)}", status=500)
 
+    @staticmethod
+    def _clearkey_param(request):
+        clearkey_param = request.query.get('clearkey')
+        if not clearkey_param:
+            key_id = request.query.get('key_id')
+            key = request.query.get('key')
+            if key_id and key:
+                clearkey_param = f"{key_id}:{key}"
+        return clearkey_param
+
+    @staticmethod
+    def _wants_mpd_as_hls(request) -> bool:
+        req_format = request.query.get('format')
+        return req_format == 'hls' or (request.path.endswith('.m3u8') and req_format != 'mpd')
+
+    def _mpd_to_hls_response(self, request, mpd_root, stream_url: str, stream_headers: dict, clearkey_param: str = None):
+        """Genera la master playlist HLS o la media playlist di `rep_id` da un MPD già parsato."""
+        scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
+        host = request.headers.get('X-Forwarded-Host', request.host)
+        proxy_base = f"{scheme}://{host}"
+        rep_id = request.query.get('rep_id')
+
+        params = "".join([f"&h_{urllib.parse.quote(key)}={urllib.parse.quote(value)}" for key, value in stream_headers.items()])
+        
+        api_password = request.query.get('api_password')
+        if api_password:
+            params += f"&api_password={api_password}"
+        if clearkey_param:
+            params += f"&clearkey={clearkey_param}"
+        
+        if rep_id:
+            hls_content = self.mpd_converter.convert_media_playlist(
+                mpd_root, rep_id, proxy_base, stream_url, params, clearkey_param
+            )
+            filename = 'playlist.m3u8'
+        else:
+            hls_content = self.mpd_converter.convert_master_playlist(
+                mpd_root, proxy_base, stream_url, params
+            )
+            filename = 'master.m3u8'
+
+        return web.Response(
+            text=hls_content,
+            headers={
+                'Content-Type': 'application/vnd.apple.mpegurl',
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': 'no-cache'
+            }
+        )
+
+    async def _fetch_into_flight(self, flight, session, stream_url: str, headers: dict, timeout, segment_cache_key=None, request_path: str = ''):
+        """Scarica `stream_url` alimentando il flight condiviso; a fine download popola la cache segmenti."""
+        async with session.get(stream_url, headers=headers, timeout=timeout, ssl=False) as resp:
+            flight.set_response(resp.status, resp.headers.copy(), resp.charset)
+            # Inoltra i buffer così come arrivano dal socket, senza ri-affettarli
+            async for chunk in resp.content.iter_any():
+                await flight.feed(chunk)
+
+        # Popola la cache una sola volta per download condiviso
+        if segment_cache_key and flight.status == 200 and not self._manifest_kind(flight.headers.get('content-type', ''), stream_url):
+            body = flight.body()
+            if body is not None:
+                cached_headers = self._segment_response_headers(flight.headers, stream_url, request_path)
+                for h in ('content-length', 'content-range'):
+                    cached_headers.pop(h, None)
+                self.segment_cache.put(segment_cache_key, body, cached_headers)
+
+    def _schedule_prefetch(self, manifest_content: str, base_url: str, stream_headers: dict, original_channel_url: str = ''):
+        """
+        Avvia il prefetch degli ultimi N segmenti di una playlist live (più #EXT-X-KEY e #EXT-X-MAP)
+        così, quando il player li richiede, vengono serviti direttamente dalla cache.
+        """
+        if not self.segment_cache.enabled or '#EXTINF' not in manifest_content or '#EXT-X-ENDLIST' in manifest_content:
+            return
+
+        segment_urls = []
+        jobs = []
+        for line in manifest_content.split('\n'):
+            line = line.strip()
+            if (line.startswith('#EXT-X-MAP:') or line.startswith('#EXT-X-KEY:')) and 'URI="' in line:
+                if 'METHOD=NONE' in line:
+                    continue
+                uri_start = line.find('URI="') + 5
+                uri_end = line.find('"', uri_start)
+                if uri_end > uri_start:
+                    absolute_url = urljoin(base_url, line[uri_start:uri_end])
+                    if line.startswith('#EXT-X-MAP:'):
+                        jobs.append((absolute_url, lambda u=absolute_url: self._prefetch_segment(u, stream_headers, "/proxy/hls/segment.mp4")))
+                    elif self.key_cache.enabled:
+                        jobs.append((absolute_url, lambda u=absolute_url: self._prefetch_key(u, stream_headers, original_channel_url)))
+            elif line and not line.startswith('#'):
+                absolute_url = urljoin(base_url, line) if not line.startswith('http') else line
+                path = urlparse(absolute_url).path.lower()
+                if not any(x in path for x in ['.m3u8', '.php', '.mpd', '.isml/manifest', 'playlist']):
+                    segment_urls.append((absolute_url, path))
+
+        for absolute_url, path in segment_urls[-self.prefetcher.segments:]:
+            request_path = f"/proxy/hls/segment{self._segment_extension(path)}"
+            jobs.append((absolute_url, lambda u=absolute_url, p=request_path: self._prefetch_segment(u, stream_headers, p)))
+
+        self.prefetcher.schedule(base_url, jobs)
+
+    async def _segment_headers(self, url: str, manifest_headers: dict):
+        """Header con cui handle_proxy_request scaricherebbe il segmento (estrattore generico + header h_ della playlist)."""
+        extractor = await self.get_extractor(url, {})
+        if not isinstance(extractor, GenericHLSExtractor):
+            return None
+        result = await extractor.extract(url)
+        return self._normalize_stream_headers(
+            self._apply_header_overrides(dict(result.get("request_headers", {})), manifest_headers)
+        )
+
+    async def _fetch_segment(self, url: str, headers: dict, request_path: str):
+        """Restituisce (status, bytes) di un segmento passando per cache segmenti e single-flight."""
+        cache_key = SegmentCache.make_key(url, headers)
+        cached_segment = self.segment_cache.get(cache_key)
+        if cached_segment:
+            return cached_segment.status, cached_segment.body
+
+        proxy = random.choice(GLOBAL_PROXIES) if GLOBAL_PROXIES else None
+        session = await self.connection_manager.get_session(url, proxy)
+        timeout = ClientTimeout(total=60, connect=30)
+        upstream = self.single_flight.join(
+            cache_key,
+            lambda flight: self._fetch_into_flight(flight, session, url, headers, timeout, cache_key, request_path)
+        )
+        try:
+            status, _ = await upstream.wait_response()
+            return status, await upstream.read()
+        finally:
+            upstream.close()
+
+    async def _prefetch_segment(self, url: str, manifest_headers: dict, request_path: str):
+        """Scarica un segmento nella cache con gli stessi header che userà la richiesta del player."""
+        # Il player passerà per handle_proxy_request: stesso estrattore + header h_ della playlist
+        headers = await self._segment_headers(url, manifest_headers)
+        if headers is None or self.segment_cache.contains(SegmentCache.make_key(url, headers)):
+            return
+        await self._fetch_segment(url, headers, request_path)
+
+    async def _prefetch_key(self, key_url: str, manifest_headers: dict, original_channel_url: str = ''):
+        """Scarica una chiave AES nella cache con gli stessi header che userà /key."""
+        headers = {k.replace('_', '-'): v for k, v in manifest_headers.items() if k.lower() != 'range'}
+        cache_key = SegmentCache.make_key(key_url, headers)
+        if self.key_cache.contains(cache_key):
+            return
+
+        proxy = self._select_key_proxy(key_url, original_channel_url)
+        session = await self.connection_manager.get_session(key_url, proxy)
+        async with session.get(key_url, headers=headers, timeout=ClientTimeout(total=30)) as resp:
+            if resp.status == 200:
+                self._store_key(cache_key, await resp.read(), original_channel_url)
+
     def _rewrite_mpd_manifest(self, manifest_content: str, base_url: str, proxy_base: str, stream_headers: dict, clearkey_param: str = None, api_password: str = None) -> str:
         """Riscrive i manifest MPD (DASH) per passare attraverso il proxy."""
         try:
@@ -1348,6 +1781,18 @@ class HLSProxy:
             logger.error(f"❌ Errore durante la riscrittura del manifest MPD: {e}")
             return manifest_content 
 
+    @staticmethod
+    def _has_encrypted_map_without_iv(lines) -> bool:
+        """True se un #EXT-X-MAP è coperto da una chiave AES-128 senza IV esplicito."""
+        key_has_iv = None  # None = nessuna chiave AES-128 attiva
+        for line in lines:
+            line = line.strip()
+            if line.startswith('#EXT-X-KEY:'):
+                key_has_iv = bool(re.search(r'IV=0[xX]', line)) if 'METHOD=AES-128' in line else None
+            elif line.startswith('#EXT-X-MAP:') and key_has_iv is False:
+                return True
+        return False
+
     async def _rewrite_manifest_urls(self, manifest_content: str, base_url: str, proxy_base: str, stream_headers: dict, original_channel_url: str = '', api_password: str = None) -> str:
         """
         Riscrive gli URL nei manifest HLS.
@@ -1358,15 +1803,11 @@ class HLSProxy:
         
         # --- 1. Logica Speciale VixSrc (da app.py) ---
         # Se lo stream è VixSrc, filtriamo per la qualità massima
-        is_vixsrc_stream = False
-        try:
-            original_request_url = stream_headers.get('referer', base_url)
-            extractor = await self.get_extractor(original_request_url, {})
-            if hasattr(extractor, 'is_vixsrc') and extractor.is_vixsrc:
-                is_vixsrc_stream = True
-                logger.info("Rilevato stream VixSrc. Applicherò la logica di filtraggio qualità.")
-        except Exception:
-            pass
+        original_request_url = stream_headers.get('referer', base_url)
+        # Solo la ricerca nel registro: nessun estrattore da istanziare per riscrivere la playlist
+        is_vixsrc_stream = EXTRACTOR_REGISTRY.resolve(original_request_url) == "vixsrc"
+        if is_vixsrc_stream:
+            logger.info("Rilevato stream VixSrc. Applicherò la logica di filtraggio qualità.")
 
         if is_vixsrc_stream:
             streams = []
@@ -1397,12 +1838,35 @@ class HLSProxy:
         header_params = "".join([f"&h_{urllib.parse.quote(key)}={urllib.parse.quote(value)}" for key, value in stream_headers.items()])
         if api_password:
             header_params += f"&api_password={api_password}"
+        # Canale di origine su playlist annidate e segmenti: un rifiuto della sorgente invalida l'estrazione
+        channel_param = f"&original_channel_url={urllib.parse.quote(original_channel_url, safe='')}" if original_channel_url else ""
+
+        # Decrittazione AES-128 lato server: chiave corrente (URL assoluto, IV esplicito) e numero di sequenza.
+        # Un init (#EXT-X-MAP) cifrato senza IV esplicito non può passare da /decrypt: la playlist resta al player
+        server_decrypt = AES_SERVER_DECRYPT and not self._has_encrypted_map_without_iv(lines)
+        server_key = None
+        media_sequence = 0
 
         for line in lines:
             line = line.strip()
             
+            if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                try:
+                    media_sequence = int(line.split(':', 1)[1])
+                except ValueError:
+                    pass
+                rewritten_lines.append(line)
+
+            elif line.startswith('#EXT-X-KEY:') and server_decrypt and 'METHOD=AES-128' in line and 'URI="' in line:
+                # Il proxy scarica la chiave e decritta i segmenti: il player non vede #EXT-X-KEY
+                uri_start = line.find('URI="') + 5
+                uri_end = line.find('"', uri_start)
+                iv_match = re.search(r'IV=(0[xX][0-9a-fA-F]+)', line)
+                server_key = (urljoin(base_url, line[uri_start:uri_end]), iv_match.group(1) if iv_match else None)
+
             # --- Gestione Chiavi DRM (#EXT-X-KEY) ---
-            if line.startswith('#EXT-X-KEY:') and 'URI=' in line:
+            elif line.startswith('#EXT-X-KEY:') and 'URI=' in line:
+                server_key = None
                 uri_start = line.find('URI="') + 5
                 uri_end = line.find('"', uri_start)
                 if uri_start > 4 and uri_end > uri_start:
@@ -1424,7 +1888,14 @@ class HLSProxy:
                     original_map_url = line[uri_start:uri_end]
                     absolute_map_url = urljoin(base_url, original_map_url)
                     encoded_map_url = urllib.parse.quote(absolute_map_url, safe='')
-                    proxy_map_url = f"{proxy_base}/proxy/hls/segment.mp4?d={encoded_map_url}{header_params}"
+                    if server_key:
+                        # Init cifrato con la chiave corrente: decrittato dal proxy come i segmenti (IV esplicito, RFC 8216)
+                        key_url, explicit_iv = server_key
+                        encoded_key_url = urllib.parse.quote(key_url, safe='')
+                        encoded_original_channel_url = urllib.parse.quote(original_channel_url, safe='')
+                        proxy_map_url = f"{proxy_base}/decrypt/hls/segment.mp4?d={encoded_map_url}&key_url={encoded_key_url}&iv={parse_iv(explicit_iv).hex()}&original_channel_url={encoded_original_channel_url}{header_params}"
+                    else:
+                        proxy_map_url = f"{proxy_base}/proxy/hls/segment.mp4?d={encoded_map_url}{channel_param}{header_params}"
                     new_line = line[:uri_start] + proxy_map_url + line[uri_end:]
                     rewritten_lines.append(new_line)
                 else:
@@ -1438,7 +1909,7 @@ class HLSProxy:
                     original_media_url = line[uri_start:uri_end]
                     absolute_media_url = urljoin(base_url, original_media_url)
                     encoded_media_url = urllib.parse.quote(absolute_media_url, safe='')
-                    proxy_media_url = f"{proxy_base}/proxy/hls/manifest.m3u8?d={encoded_media_url}{header_params}"
+                    proxy_media_url = f"{proxy_base}/proxy/hls/manifest.m3u8?d={encoded_media_url}{channel_param}{header_params}"
                     new_line = line[:uri_start] + proxy_media_url + line[uri_end:]
                     rewritten_lines.append(new_line)
                 else:
@@ -1452,22 +1923,25 @@ class HLSProxy:
                 
                 # Se è una playlist nidificata
                 if any(x in path for x in ['.m3u8', '.php', '.mpd', '.isml/manifest', 'playlist']):
-                    proxy_url = f"{proxy_base}/proxy/hls/manifest.m3u8?d={encoded_url}{header_params}"
+                    proxy_url = f"{proxy_base}/proxy/hls/manifest.m3u8?d={encoded_url}{channel_param}{header_params}"
+                elif server_key:
+                    ext = self._segment_extension(path)
+                    key_url, explicit_iv = server_key
+                    iv_hex = parse_iv(explicit_iv).hex() if explicit_iv else media_sequence_iv(media_sequence).hex()
+                    encoded_key_url = urllib.parse.quote(key_url, safe='')
+                    encoded_original_channel_url = urllib.parse.quote(original_channel_url, safe='')
+                    proxy_url = f"{proxy_base}/decrypt/hls/segment{ext}?d={encoded_url}&key_url={encoded_key_url}&iv={iv_hex}&original_channel_url={encoded_original_channel_url}{header_params}"
+                    media_sequence += 1
                 else:
-                    # Determina l'estensione corretta (Cruciale per player audio/video specifici)
-                    ext = ".ts" # Fallback
-                    if path.endswith('.mp4') or path.endswith('.m4s') or path.endswith('.isml'):
-                        ext = ".mp4"
-                    elif path.endswith('.aac'):
-                        ext = ".aac" # <--- Fondamentale per Mediaset Audio
-                    elif path.endswith('.m4a'):
-                        ext = ".m4a"
-                    
-                    proxy_url = f"{proxy_base}/proxy/hls/segment{ext}?d={encoded_url}{header_params}"
+                    ext = self._segment_extension(path)
+                    proxy_url = f"{proxy_base}/proxy/hls/segment{ext}?d={encoded_url}{channel_param}{header_params}"
+                    media_sequence += 1
                 
                 rewritten_lines.append(proxy_url)
 
             else:
+                if line.startswith('#EXT-X-KEY:'):
+                    server_key = None  # METHOD=NONE
                 rewritten_lines.append(line)
         
         return '\n'.join(rewritten_lines)
@@ -1592,23 +2066,31 @@ class HLSProxy:
             "extractors_loaded": list(self.extractors.keys()),
             "modules": {
                 "playlist_builder": PlaylistBuilder is not None,
-                "vavoo_extractor": VavooExtractor is not None,
-                "dlhd_extractor": DLHDExtractor is not None,
-                "vixsrc_extractor": VixSrcExtractor is not None,
-                "sportsonline_extractor": SportsonlineExtractor is not None,
-                "mixdrop_extractor": MixdropExtractor is not None,
-                "voe_extractor": VoeExtractor is not None,
-                "streamtape_extractor": StreamtapeExtractor is not None,
+                # True = caricato, False = modulo mancante, None = non ancora richiesto
+                **{f"{name}_extractor": loaded for name, loaded in EXTRACTOR_REGISTRY.status().items()},
             },
             "proxy_config": {
                 "global": f"{len(GLOBAL_PROXIES)} proxies caricati",
                 "vavoo": f"{len(VAVOO_PROXIES)} proxies caricati",
                 "dlhd": f"{len(DLHD_PROXIES)} proxies caricati",
             },
+            "connection_pool": self.connection_manager.get_stats(),
+            "segment_cache": self.segment_cache.get_stats(),
+            "single_flight": self.single_flight.get_stats(),
+            "manifest_cache": self.manifest_cache.get_stats(),
+            "mpd_cache": self.mpd_cache.get_stats(),
+            "decrypt_pool": self.decrypt_pool.get_stats(),
+            "init_cache": self.init_cache.get_stats(),
+            "key_cache": self.key_cache.get_stats(),
+            "extraction_cache": self.extraction_cache.get_stats(),
+            "dlhd_domains": self.extractors["dlhd"].get_domain_stats() if "dlhd" in self.extractors else None,
+            "decrypted_cache": self.decrypted_cache.get_stats(),
+            "prefetch": self.prefetcher.get_stats(),
             "endpoints": {
                 "/proxy/hls/manifest.m3u8": "Proxy HLS - ?d=<URL>",
                 "/proxy/mpd/manifest.m3u8": "Proxy MPD - ?d=<URL>",
                 "/proxy/stream": "Stream Proxy Genrico",
+                "/extractor/batch": "Risoluzione multipla (POST JSON -> NDJSON)",
                 "/key": "Proxy chiavi AES-128",
                 "/playlist": "Playlist builder",
                 "/segment/{segment}": "Proxy segmenti .ts",
@@ -1638,39 +2120,113 @@ class HLSProxy:
                     header_name = param_name[2:].replace('_', '-')
                     headers[header_name] = param_value
 
-            session = await self._get_session()
+            # --- 1. Segmento già decrittato per un altro spettatore ---
+            # La chiave arriva dal client: con una chiave errata AES-CTR produce dati senza errori,
+            # quindi entra nella chiave di cache/single-flight (solo come digest)
+            key_digest = hashlib.sha1(key.encode()).hexdigest()
+            cache_key = ('decrypt', url, init_url or '', key_id, key_digest)
+            cached_segment = self.decrypted_cache.get(cache_key)
+            if cached_segment:
+                return web.Response(
+                    body=cached_segment.body,
+                    status=200,
+                    headers={'Content-Type': 'video/mp4', 'Access-Control-Allow-Origin': '*'}
+                )
 
-            # --- 1. Scarica Initialization Segment (con cache) ---
-            init_content = b""
-            if init_url:
-                if init_url in self.init_cache:
-                    init_content = self.init_cache[init_url]
-                else:
-                    async with session.get(init_url, headers=headers, ssl=False) as resp:
-                        if resp.status == 200:
-                            init_content = await resp.read()
-                            self.init_cache[init_url] = init_content
-                        else:
-                            logger.error(f"❌ Failed to fetch init segment: {resp.status}")
-                            return web.Response(status=502)
+            session = await self._get_session()
 
-            # --- 2. Scarica Media Segment ---
-            async with session.get(url, headers=headers, ssl=False) as resp:
-                if resp.status != 200:
-                    logger.error(f"❌ Failed to fetch segment: {resp.status}")
+            async def fetch_init():
+                if not init_url:
+                    return 200, b""
+                init_cache_key = SegmentCache.make_key(init_url, headers)
+                cached_init = self.init_cache.get(init_cache_key)
+                if cached_init:
+                    return 200, cached_init.body
+                async with session.get(init_url, headers=headers, ssl=False) as resp:
+                    if resp.status != 200:
+                        return resp.status, b""
+                    init_content = await resp.read()
+                self.init_cache.put(init_cache_key, init_content, {})
+                return 200, init_content
+
+            async def fetch_and_decrypt(flight):
+                # --- 2. Scarica Initialization Segment (con cache) e Media Segment in parallelo ---
+                init_task = asyncio.create_task(fetch_init())
+                try:
+                    async with session.get(url, headers=headers, ssl=False) as resp:
+                        init_status, init_content = await init_task
+                        if init_status != 200:
+                            logger.error(f"❌ Failed to fetch init segment: {init_status}")
+                            flight.set_response(502, {})
+                            return
+                        if resp.status != 200:
+                            logger.error(f"❌ Failed to fetch segment: {resp.status}")
+                            flight.set_response(502, {})
+                            return
+
+                        # --- 3a. Decrittazione in streaming (CENC AES-CTR): frammenti inviati appena pronti ---
+                        decrypter = CENCStreamDecrypter(key_id, key) if DECRYPT_STREAMING and init_content else None
+                        init_output = decrypter.feed(init_content) if decrypter else []
+                        if decrypter and decrypter.supported:
+                            flight.set_response(200, {})
+                            try:
+                                for piece in init_output:
+                                    await flight.feed(piece)
+                                async for chunk in resp.content.iter_any():
+                                    for piece in decrypter.feed(chunk):
+                                        await flight.feed(piece)
+                                for piece in decrypter.close():
+                                    await flight.feed(piece)
+                            except ValueError as e:
+                                # Lo status 200 è già partito: il segmento parziale non va mai servito dalla cache
+                                logger.error(f"❌ Streaming decryption failed for {url}: {e}")
+                                self.decrypted_cache.invalidate(cache_key)
+                                raise
+
+                            decrypted = flight.body()
+                            if decrypted is not None:
+                                self.decrypted_cache.put(cache_key, decrypted, {})
+                            return
+
+                        segment_content = await resp.read()
+                finally:
+                    if not init_task.done():
+                        init_task.cancel()
+
+                # --- 3b. Decritta con Python (PyCryptodome) ---
+                # Fuori dall'event loop: gli altri stream del worker non si fermano durante la decrittazione
+                decrypted = await self.decrypt_pool.decrypt(init_content, segment_content, key_id, key)
+                flight.set_response(200, {})
+                await flight.feed(decrypted)
+                self.decrypted_cache.put(cache_key, decrypted, {})
+
+            # Più spettatori dello stesso segmento: un solo download e una sola decrittazione
+            upstream = self.single_flight.join(cache_key, fetch_and_decrypt)
+            try:
+                status, _ = await upstream.wait_response()
+                if status != 200:
                     return web.Response(status=502)
-                
-                segment_content = await resp.read()
-
-            # --- 3. Decritta con Python (PyCryptodome) ---
-            decrypted_content = decrypt_segment(init_content, segment_content, key_id, key)
 
-            # --- 4. Invia Risposta ---
-            return web.Response(
-                body=decrypted_content,
-                status=200,
-                headers={'Content-Type': 'video/mp4', 'Access-Control-Allow-Origin': '*'}
-            )
+                # --- 4. Invia Risposta ---
+                response = web.StreamResponse(
+                    status=200,
+                    headers={'Content-Type': 'video/mp4', 'Access-Control-Allow-Origin': '*'}
+                )
+                await response.prepare(request)
+                try:
+                    async for chunk in upstream.iter_batches(RELAY_MIN_WRITE_BYTES, RELAY_MAX_WRITE_BYTES):
+                        await response.write(chunk)
+                except Exception as e:
+                    # Header già inviati: niente 500, la connessione viene chiusa così il client
+                    # vede un segmento troncato invece di uno che sembra completo
+                    logger.error(f"❌ Decryption error after response start: {e}")
+                    if request.transport:
+                        request.transport.abort()
+                    return response
+                await response.write_eof()
+                return response
+            finally:
+                upstream.close()
 
         except Exception as e:
             logger.error(f"❌ Decryption error: {e}")
@@ -1678,6 +2234,74 @@ class HLSProxy:
             traceback.print_exc()
             return web.Response(status=500, text=f"Decryption failed: {str(e)}")
 
+    async def handle_decrypt_hls_segment(self, request):
+        """Decritta lato server un segmento HLS AES-128 (modalità AES_SERVER_DECRYPT)."""
+        if not check_password(request):
+            return web.Response(status=401, text="Unauthorized: Invalid API Password")
+
+        url = request.query.get('d')
+        key_url = request.query.get('key_url')
+        iv_hex = request.query.get('iv')
+        original_channel_url = request.query.get('original_channel_url')
+
+        if not url or not key_url or not iv_hex:
+            return web.Response(text="Missing d, key_url or iv", status=400)
+
+        try:
+            manifest_headers = {
+                param_name[2:]: param_value
+                for param_name, param_value in request.query.items() if param_name.startswith('h_')
+            }
+            # Stessi header (e quindi stesse voci di cache) di /key e /proxy/hls/segment
+            key_headers = {k.replace('_', '-'): v for k, v in manifest_headers.items() if k.lower() != 'range'}
+            segment_headers = await self._segment_headers(url, manifest_headers)
+            if segment_headers is None:
+                segment_headers = self._normalize_stream_headers(self._apply_header_overrides({}, manifest_headers))
+
+            ext = os.path.splitext(request.path)[1]
+            response_headers = {
+                'Content-Type': {'.ts': 'video/MP2T', '.aac': 'audio/aac', '.m4a': 'audio/mp4'}.get(ext, 'video/mp4'),
+                'Access-Control-Allow-Origin': '*'
+            }
+
+            # Segmento già decrittato per un altro spettatore
+            cache_key = ('aes128', url, key_url, iv_hex)
+            cached_segment = self.decrypted_cache.get(cache_key)
+            if cached_segment:
+                return web.Response(body=cached_segment.body, headers=response_headers)
+
+            async def fetch_and_decrypt(flight):
+                # Chiave (cache + single-flight) e segmento cifrato scaricati in parallelo
+                (key_status, key_data), (segment_status, segment_content) = await asyncio.gather(
+                    self._fetch_aes_key(key_url, key_headers, original_channel_url),
+                    self._fetch_segment(url, segment_headers, f"/proxy/hls/segment{ext}")
+                )
+                if segment_status in (401, 403, 410):
+                    await self.invalidate_channel(original_channel_url)
+                if key_data is None or segment_status != 200:
+                    logger.error(f"❌ AES-128 lato server: chiave {key_status}, segmento {segment_status} ({url})")
+                    flight.set_response(502, {})
+                    return
+
+                decrypted = await self.decrypt_pool.decrypt_aes128(segment_content, key_data, bytes.fromhex(iv_hex))
+                flight.set_response(200, {})
+                await flight.feed(decrypted)
+                self.decrypted_cache.put(cache_key, decrypted, {})
+
+            # Più spettatori dello stesso segmento: un solo download e una sola decrittazione
+            upstream = self.single_flight.join(cache_key, fetch_and_decrypt)
+            try:
+                status, _ = await upstream.wait_response()
+                if status != 200:
+                    return web.Response(status=502)
+                return web.Response(body=await upstream.read(), headers=response_headers)
+            finally:
+                upstream.close()
+
+        except Exception as e:
+            logger.error(f"❌ AES-128 decryption error: {e}")
+            return web.Response(status=500, text=f"Decryption failed: {str(e)}")
+
     async def handle_generate_urls(self, request):
         """Endpoint per generare URL proxy."""
         try:
@@ -1765,6 +2389,10 @@ class HLSProxy:
         try:
             if self.session and not self.session.closed:
                 await self.session.close()
+
+            await self.prefetcher.close()
+            await self.decrypt_pool.close()
+            await self.connection_manager.close()
                 
             for extractor in self.extractors.values():
                 if hasattr(extractor, 'close'):
@@ -1801,6 +2429,7 @@ def create_app():
     app.router.add_get('/proxy/stream', proxy.handle_proxy_request)
     app.router.add_get('/extractor', proxy.handle_extractor_request)
     app.router.add_get('/extractor/video', proxy.handle_extractor_request)
+    app.router.add_post('/extractor/batch', proxy.handle_extractor_batch)
     
     # Route Segmenti specifici (ts, mp4, aac)
     app.router.add_get('/proxy/hls/segment.ts', proxy.handle_proxy_request)
@@ -1811,6 +2440,10 @@ def create_app():
     app.router.add_get('/playlist', proxy.handle_playlist_request)
     app.router.add_get('/segment/{segment}', proxy.handle_ts_segment)
     app.router.add_get('/decrypt/segment.mp4', proxy.handle_decrypt_segment)
+    app.router.add_get('/decrypt/hls/segment.ts', proxy.handle_decrypt_hls_segment)
+    app.router.add_get('/decrypt/hls/segment.mp4', proxy.handle_decrypt_hls_segment)
+    app.router.add_get('/decrypt/hls/segment.aac', proxy.handle_decrypt_hls_segment)
+    app.router.add_get('/decrypt/hls/segment.m4a', proxy.handle_decrypt_hls_segment)
     
     # Licenze
     app.router.add_get('/license', proxy.handle_license_request)
@@ -0,0 +1,170 @@
+"""
+Verifica di CENCStreamDecrypter: l'output in streaming deve coincidere byte per byte con il
+riferimento, qualunque sia la dimensione dei chunk in ingresso.
+
+Senza argomenti usa un fMP4 sintetico cifrato (due tracce per frammento, la seconda senza
+data_offset, e un box `free` tra moof e mdat) e lo confronta con lo stesso file costruito in
+chiaro. Con --init/--segment confronta un segmento reale con il percorso bufferizzato
+`decrypt_segment` (utils/drm_decrypter.py), che fa da riferimento anche per il file sintetico
+quando è disponibile.
+
+Uso:
+    python benchmarks/cenc_stream_check.py
+    python benchmarks/cenc_stream_check.py --init init.mp4 --segment seg.m4s --key-id <hex> --key <hex>
+"""
+import argparse
+import os
+import struct
+import sys
+
+from Crypto.Cipher import AES
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cenc_stream import CENCStreamDecrypter  # noqa: E402
+
+try:
+    from utils.drm_decrypter import decrypt_segment  # noqa: E402
+except ImportError:
+    decrypt_segment = None
+
+KEY_ID = '0123456789abcdef0123456789abcdef'
+KEY = 'fedcba9876543210fedcba9876543210'
+CHUNK_SIZES = (1, 7, 188, 4096, 1 << 20)
+
+
+def box(box_type: bytes, *parts: bytes) -> bytes:
+    body = b''.join(parts)
+    return struct.pack('>I4s', 8 + len(body), box_type) + body
+
+
+def full_box(box_type: bytes, version: int, flags: int, *parts: bytes) -> bytes:
+    return box(box_type, struct.pack('>I', (version << 24) | flags), *parts)
+
+
+def build_init(encrypted: bool, track_ids=(1, 2)) -> bytes:
+    traks = []
+    for track_id in track_ids:
+        tkhd = full_box(b'tkhd', 0, 3, struct.pack('>III', 0, 0, track_id), bytes(72))
+        fields = bytes(6) + struct.pack('>H', 1) + bytes(70)
+        if encrypted:
+            tenc = full_box(b'tenc', 0, 0, bytes(2), bytes([1, 8]), bytes.fromhex(KEY_ID))
+            sinf = box(b'sinf', box(b'frma', b'avc1'),
+                       full_box(b'schm', 0, 0, b'cenc', struct.pack('>I', 0x10000)),
+                       box(b'schi', tenc))
+            entry = box(b'encv', fields, box(b'avcC', b'\x01\x64\x00\x1f'), sinf)
+        else:
+            entry = box(b'avc1', fields, box(b'avcC', b'\x01\x64\x00\x1f'))
+        stsd = full_box(b'stsd', 0, 0, struct.pack('>I', 1), entry)
+        traks.append(box(b'trak', tkhd, box(b'mdia', box(b'minf', box(b'stbl', stsd)))))
+    trexs = [full_box(b'trex', 0, 0, struct.pack('>IIIII', t, 1, 0, 0, 0)) for t in track_ids]
+    pssh = [full_box(b'pssh', 0, 0, bytes(16), struct.pack('>I', 0))] if encrypted else []
+    moov = box(b'moov', full_box(b'mvhd', 0, 0, bytes(96)), *traks, box(b'mvex', *trexs), *pssh)
+    return box(b'ftyp', b'iso6', struct.pack('>I', 0), b'iso6dash') + moov
+
+
+def build_fragment(encrypted: bool, sequence: int, tracks, between: bytes = b'', explicit_offset: bool = True) -> bytes:
+    """
+    `tracks`: [(track_id, [campioni in chiaro])]. Solo la prima traf ha un data_offset
+    (se `explicit_offset`): le successive proseguono dalla fine dei dati della precedente.
+    """
+    key = bytes.fromhex(KEY)
+
+    def fragment(data_offset: int):
+        trafs, payload = [], b''
+        for index, (track_id, samples) in enumerate(tracks):
+            has_offset = explicit_offset and index == 0
+            trun_flags = 0x200 | (0x01 if has_offset else 0)
+            trun = full_box(b'trun', 0, trun_flags, struct.pack('>I', len(samples)),
+                            struct.pack('>i', data_offset) if has_offset else b'',
+                            b''.join(struct.pack('>I', len(s)) for s in samples))
+            tfhd = full_box(b'tfhd', 0, 0x20000 if index == 0 else 0, struct.pack('>I', track_id))
+            children = [tfhd, trun]
+            senc_entries = []
+            for sample_index, sample in enumerate(samples):
+                iv = struct.pack('>II', sequence, track_id * 1000 + sample_index)
+                clear = min(5, len(sample))
+                if encrypted:
+                    cipher = AES.new(key, AES.MODE_CTR, nonce=b'', initial_value=iv.ljust(16, b'\0'))
+                    sample = sample[:clear] + cipher.encrypt(sample[clear:])
+                senc_entries.append(iv + struct.pack('>HHI', 1, clear, len(sample) - clear))
+                payload += sample
+            if encrypted:
+                children.append(full_box(b'senc', 0, 0x02, struct.pack('>I', len(samples)), *senc_entries))
+            trafs.append(box(b'traf', *children))
+        moof = box(b'moof', full_box(b'mfhd', 0, 0, struct.pack('>I', sequence)), *trafs)
+        return moof, payload
+
+    moof, _ = fragment(0)
+    moof, payload = fragment(len(moof) + len(between) + 8)
+    return moof + between + box(b'mdat', payload)
+
+
+def synthetic_fixture(encrypted: bool) -> bytes:
+    samples = [bytes((i * 37 + j) % 256 for j in range(40 + i * 13)) for i in range(6)]
+    free = box(b'free', b'prima del mdat')
+    return (
+        build_init(encrypted)
+        + build_fragment(encrypted, 1, [(1, samples[:4]), (2, samples[4:])], between=free)
+        + build_fragment(encrypted, 2, [(1, samples[2:]), (2, samples[:2])], explicit_offset=False)
+    )
+
+
+def stream_decrypt(data: bytes, chunk_size: int, key_id: str = KEY_ID, key: str = KEY) -> bytes:
+    decrypter = CENCStreamDecrypter(key_id, key)
+    out = []
+    for pos in range(0, len(data), chunk_size):
+        out.extend(decrypter.feed(data[pos:pos + chunk_size]))
+    out.extend(decrypter.close())
+    return b''.join(out)
+
+
+def check(label: str, data: bytes, expected: bytes, key_id: str = KEY_ID, key: str = KEY) -> bool:
+    ok = True
+    for chunk_size in CHUNK_SIZES:
+        output = stream_decrypt(data, chunk_size, key_id, key)
+        if output != expected:
+            first_diff = next((i for i, (a, b) in enumerate(zip(output, expected)) if a != b),
+                              min(len(output), len(expected)))
+            print(f"❌ {label} (chunk {chunk_size}): differenza al byte {first_diff} "
+                  f"({len(output)} vs {len(expected)} byte)")
+            ok = False
+    if ok:
+        print(f"✅ {label}: {len(expected)} byte identici con chunk {', '.join(map(str, CHUNK_SIZES))}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--init', help="Init segment fMP4 cifrato")
+    parser.add_argument('--segment', help="Media segment fMP4 cifrato")
+    parser.add_argument('--key-id', default=KEY_ID)
+    parser.add_argument('--key', default=KEY)
+    args = parser.parse_args()
+
+    ok = True
+    if args.segment:
+        if decrypt_segment is None:
+            sys.exit("utils.drm_decrypter non disponibile: serve come riferimento per i segmenti reali")
+        init_content = b''
+        if args.init:
+            with open(args.init, 'rb') as f:
+                init_content = f.read()
+        with open(args.segment, 'rb') as f:
+            segment_content = f.read()
+        expected = decrypt_segment(init_content, segment_content, args.key_id, args.key)
+        ok &= check("segmento reale vs decrypt_segment", init_content + segment_content, expected,
+                    args.key_id, args.key)
+    else:
+        encrypted = synthetic_fixture(encrypted=True)
+        ok &= check("fixture sintetica vs file in chiaro", encrypted, synthetic_fixture(encrypted=False))
+        if decrypt_segment is not None:
+            init_content = build_init(encrypted=True)
+            segment_content = encrypted[len(init_content):]
+            expected = decrypt_segment(init_content, segment_content, KEY_ID, KEY)
+            ok &= check("fixture sintetica vs decrypt_segment", encrypted, expected)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
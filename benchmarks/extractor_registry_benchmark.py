@@ -0,0 +1,111 @@
+"""
+Benchmark della scelta dell'estrattore (extractors/registry.py).
+
+1. Ricerca: confronta la vecchia catena if/elif di HLSProxy.get_extractor (controlli di
+   sottostringa + regex, riportata qui) con EXTRACTOR_REGISTRY.resolve su un mix di URL
+   tipico (per lo più segmenti/playlist generici, che prima percorrevano tutta la catena),
+   e verifica che i due metodi scelgano lo stesso estrattore.
+2. Avvio a freddo: in processi Python nuovi misura l'import di tutti gli otto moduli
+   estrattori (comportamento precedente all'avvio di app.py) contro l'import del solo registro.
+
+Uso:
+    python benchmarks/extractor_registry_benchmark.py [--lookups 200000] [--cold-runs 5]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from extractors.registry import EXTRACTOR_REGISTRY, EXTRACTOR_SPECS  # noqa: E402
+
+URLS = [
+    "https://vavoo.to/vavoo-iptv/play/123456abcdef",
+    "https://daddylive.sx/stream/stream-123.php",
+    "https://dlhd.dad/watch.php?id=51",
+    "https://example.com/embed/stream-77.php",
+    "https://vixsrc.to/movie/12345",
+    "https://vixsrc.to/tv/1399/1/1",
+    "https://vixsrc.to/playlist/98765?token=abc&expires=1700000000",
+    "https://sportzonline.si/channels/hd/hd1.php",
+    "https://mixdrop.co/e/abcdef",
+    "https://voe.sx/e/abcdef",
+    "https://streamtape.com/e/abcdef",
+    "https://orionoid.com/stream/abc",
+] + [
+    f"https://cdn{i}.example-cdn.net/live/channel{i}/segment_{i * 7}.ts?token=abcdef{i}" for i in range(24)
+] + [
+    f"https://edge{i}.other-provider.com/hls/master_{i}.m3u8" for i in range(12)
+]
+
+
+def legacy_resolve(url: str):
+    """Vecchia auto-detection di HLSProxy.get_extractor (solo la scelta, senza istanziare)."""
+    if "vavoo.to" in url:
+        return "vavoo"
+    elif any(domain in url for domain in ["daddylive", "dlhd"]) or re.search(r'stream-\d+\.php', url):
+        return "dlhd"
+    elif 'vixsrc.to/' in url.lower() and any(x in url for x in ['/movie/', '/tv/', '/iframe/']):
+        return "vixsrc"
+    elif any(domain in url for domain in ["sportzonline", "sportsonline"]):
+        return "sportsonline"
+    elif "mixdrop" in url:
+        return "mixdrop"
+    elif any(d in url for d in ["voe.sx", "voe.to", "voe.st", "voe.eu", "voe.la", "voe-network.net"]):
+        return "voe"
+    elif "streamtape.com" in url or "streamtape.to" in url or "streamtape.net" in url:
+        return "streamtape"
+    elif "orionoid.com" in url:
+        return "orion"
+    return None
+
+
+def bench_lookup(func, lookups: int) -> float:
+    urls = (URLS * (lookups // len(URLS) + 1))[:lookups]
+    started_at = time.perf_counter()
+    for url in urls:
+        func(url)
+    return (time.perf_counter() - started_at) / lookups * 1e9
+
+
+def bench_import(statement: str, runs: int) -> float:
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+        if output.returncode != 0:
+            raise RuntimeError(output.stderr.strip().splitlines()[-1])
+        samples.append(float(output.stdout.strip()))
+    return min(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lookups', type=int, default=200000, help="ricerche per metodo")
+    parser.add_argument('--cold-runs', type=int, default=5, help="processi per misura di import (si tiene il minimo)")
+    args = parser.parse_args()
+
+    mismatches = [(url, legacy_resolve(url), EXTRACTOR_REGISTRY.resolve(url))
+                  for url in URLS if legacy_resolve(url) != EXTRACTOR_REGISTRY.resolve(url)]
+    for url, old, new in mismatches:
+        print(f"  diverso: {url} -> vecchio {old}, registro {new}")
+
+    print(f"{'ricerca':<12} {'ns/URL':>10}")
+    print(f"{'if/elif':<12} {bench_lookup(legacy_resolve, args.lookups):>10.0f}")
+    print(f"{'registro':<12} {bench_lookup(EXTRACTOR_REGISTRY.resolve, args.lookups):>10.0f}")
+
+    all_modules = '; '.join(f"import {spec.module}" for spec in EXTRACTOR_SPECS)
+    print(f"\n{'avvio a freddo':<22} {'ms':>8}")
+    for label, statement in (("tutti gli estrattori", all_modules), ("solo registro", "import extractors.registry")):
+        try:
+            print(f"{label:<22} {bench_import(statement, args.cold_runs):>8.1f}")
+        except RuntimeError as e:
+            print(f"{label:<22} {'errore':>8}  ({e})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark dell'unpacker P.A.C.K.E.R. (utils/packed.py).
+
+Confronta il vecchio unpacker di sportsonline (`eval` degli argomenti + un `re.sub` per ogni
+simbolo, dal più alto al più basso) con quello attuale (parser dei letterali + una sola
+sostituzione regex con tabella), senza cache e con cache per hash del payload.
+
+Le fixture sono script di player (sportsonline, mixdrop, jwplayer generico) impacchettati
+come fanno i siti, in base 36 e 62; con `--fixtures DIR` si usano invece le pagine/script
+catturati in DIR (*.html, *.js). Per ogni fixture verifica che l'output coincida con lo
+script originale (o, per le catture, con quello del vecchio unpacker).
+
+Uso:
+    python benchmarks/packer_benchmark.py [--rounds 20] [--fixtures DIR]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import packed  # noqa: E402
+
+PLAYER_TEMPLATES = {
+    'sportsonline': (
+        "var player=null;var src=\"https://cdn{n}.example-sports.net/hls/{slug}/index.m3u8?token={token}\";"
+        "function initPlayer(){{player=new Clappr.Player({{source:src,parentId:'#player',autoPlay:true,"
+        "mimeType:'application/x-mpegURL',height:'100%',width:'100%',events:{{onReady:function(){{"
+        "console.log('ready {slug}')}}}}}})}}"
+    ),
+    'mixdrop': (
+        "MDCore.ref=\"{slug}\";MDCore.wurl=\"//s-delivery{n}.mxdcontent.net/v/{token}.mp4?s=abc&e=1700000000\";"
+        "MDCore.poster=\"//s-delivery{n}.mxdcontent.net/thumbs/{slug}.jpg\";MDCore.remotesub=\"\";"
+        "MDCore.chromeInline=false;MDCore.vsr=[];"
+    ),
+    'jwplayer': (
+        "jwplayer(\"vplayer\").setup({{sources:[{{file:\"https://edge{n}.example-cdn.com/{slug}/master.m3u8?t={token}\","
+        "type:\"hls\"}}],image:\"https://edge{n}.example-cdn.com/{slug}/poster.jpg\",width:\"100%\",height:\"100%\","
+        "stretching:\"uniform\",primary:\"html5\",autostart:false,preload:\"auto\",playbackRateControls:true,"
+        "tracks:[{{file:\"https://edge{n}.example-cdn.com/{slug}/sub_{n}.vtt\",label:\"Italiano\",kind:\"captions\"}}]}});"
+    ),
+}
+
+
+def legacy_unpack(packed_js: str) -> str:
+    """Vecchio unpacker di extractors/sportsonline.py (riportato qui solo per il confronto)."""
+    def int2base(x, base):
+        digits = []
+        while x:
+            digits.append('0123456789abcdefghijklmnopqrstuvwxyz'[x % base])
+            x = int(x / base)
+        return ''.join(reversed(digits)) or '0'
+
+    match = re.search(r"}\((.*)\)\)", packed_js)
+    p, a, c, k, e, d = eval(f"({match.group(1)})", {"__builtins__": {}}, {})
+    while c > 0:
+        c -= 1
+        if k[c]:
+            p = re.sub('\\b' + int2base(c, a) + '\\b', k[c], p)
+    return p
+
+
+def pack(source: str, base: int) -> str:
+    """Impacchetta `source` come P.A.C.K.E.R.: parole ordinate per frequenza, simboli in `base`."""
+    words = [w for w, _ in Counter(re.findall(r'\b\w+\b', source, re.ASCII)).most_common()]
+    symbols = {w: packed.encode_base(i, base) for i, w in enumerate(words)}
+    payload = re.sub(r'\b\w+\b', lambda m: symbols[m.group(0)], source, flags=re.ASCII)
+    payload = payload.replace('\\', '\\\\').replace("'", "\\'").replace('\n', '\\n')
+    return (
+        "eval(function(p,a,c,k,e,d){e=function(c){return(c<a?'':e(parseInt(c/a)))+((c=c%a)>35?"
+        "String.fromCharCode(c+29):c.toString(36))};if(!''.replace(/^/,String)){while(c--){d[e(c)]=k[c]||e(c)}"
+        "k=[function(e){return d[e]}];e=function(){return'\\\\w+'};c=1};while(c--){if(k[c]){p=p.replace("
+        "new RegExp('\\\\b'+e(c)+'\\\\b','g'),k[c])}}return p}"
+        f"('{payload}',{base},{len(words)},'{'|'.join(words)}'.split('|'),0,{{}}))"
+    )
+
+
+def build_fixtures(seed: int = 7):
+    rng = random.Random(seed)
+    fixtures = []
+    for name, template in PLAYER_TEMPLATES.items():
+        for scale in (1, 40):
+            parts = []
+            for n in range(scale):
+                token = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(24))
+                parts.append(template.format(n=n, slug=f"{name}{rng.randrange(10 ** 6)}", token=token))
+            source = '\n'.join(parts)
+            for base in (36, 62):
+                fixtures.append((f"{name} x{scale} b{base}", pack(source, base), source))
+    return fixtures
+
+
+def load_fixtures(directory: str):
+    fixtures = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(('.html', '.js')):
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8', errors='replace') as f:
+            content = f.read()
+        blocks = packed.find_packed_blocks(content) or [content]
+        for i, block in enumerate(blocks):
+            fixtures.append((f"{filename}#{i}", block, None))
+    return fixtures
+
+
+def timed(func, source: str, rounds: int):
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        result = func(source)
+    return (time.perf_counter() - started_at) / rounds * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20, help="ripetizioni per fixture")
+    parser.add_argument('--fixtures', help="cartella con pagine/script catturati (*.html, *.js)")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else build_fixtures()
+
+    def uncached(source):
+        packed._unpack_cache.clear()
+        return packed.unpack(source)
+
+    print(f"{'fixture':<26} {'KB':>7} {'simboli':>8} {'vecchio ms':>11} {'nuovo ms':>9} {'cache ms':>9} {'ok':>4}")
+    for name, source, expected in fixtures:
+        try:
+            _, _, count, _ = packed.parse_packed_args(source)
+        except packed.UnpackingError as e:
+            print(f"{name:<26} saltata: {e}")
+            continue
+
+        try:
+            legacy_ms, legacy_result = timed(legacy_unpack, source, args.rounds)
+            legacy_col = f"{legacy_ms:>11.2f}"
+        except Exception as e:
+            legacy_result = None
+            legacy_col = f"{'errore':>11}"
+            if expected is None:
+                print(f"  vecchio unpacker su {name}: {type(e).__name__}: {e}")
+
+        new_ms, result = timed(uncached, source, args.rounds)
+        packed.unpack(source)
+        cached_ms, _ = timed(packed.unpack, source, args.rounds)
+
+        reference = expected if expected is not None else legacy_result
+        ok = 'sì' if reference is None or result == reference else 'NO'
+        print(f"{name:<26} {len(source) / 1024:>7.1f} {count:>8} {legacy_col} {new_ms:>9.2f} {cached_ms:>9.3f} {ok:>4}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark del relay dei segmenti: confronta il vecchio loop `iter_chunked(8192)` + una
+`write` per chunk con il relay attuale (`iter_any` + scritture accorpate di SingleFlight).
+
+Upstream, proxy e client girano nello stesso processo su loopback, quindi il tempo CPU
+misurato include tutti e tre: conta la differenza tra le due modalità, non il valore assoluto.
+
+Uso:
+    python benchmarks/relay_benchmark.py [--size-mb 256] [--rounds 3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.single_flight import SingleFlight  # noqa: E402
+
+BLOCK = os.urandom(1024 * 1024)
+
+
+def upstream_app(size_mb: int) -> web.Application:
+    async def segment(request):
+        response = web.StreamResponse(headers={'Content-Type': 'video/mp2t'})
+        response.content_length = size_mb * len(BLOCK)
+        await response.prepare(request)
+        for _ in range(size_mb):
+            await response.write(BLOCK)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get('/segment.ts', segment)
+    return app
+
+
+def proxy_app(upstream_url: str) -> web.Application:
+    single_flight = SingleFlight()
+
+    async def legacy(request):
+        session = request.app['session']
+        async with session.get(upstream_url) as resp:
+            response = web.StreamResponse(status=resp.status)
+            await response.prepare(request)
+            async for chunk in resp.content.iter_chunked(8192):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+
+    async def relay(request):
+        session = request.app['session']
+
+        async def fetch(flight):
+            async with session.get(upstream_url) as resp:
+                flight.set_response(resp.status, resp.headers.copy(), resp.charset)
+                async for chunk in resp.content.iter_any():
+                    await flight.feed(chunk)
+
+        upstream = single_flight.join(None, fetch)
+        try:
+            status, _ = await upstream.wait_response()
+            response = web.StreamResponse(status=status)
+            await response.prepare(request)
+            async for chunk in upstream.iter_batches():
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+        finally:
+            upstream.close()
+
+    async def on_startup(app):
+        app['session'] = ClientSession()
+
+    async def on_cleanup(app):
+        await app['session'].close()
+
+    app = web.Application()
+    app.router.add_get('/legacy', legacy)
+    app.router.add_get('/relay', relay)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def start(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def download(session: ClientSession, url: str) -> int:
+    total = 0
+    async with session.get(url) as resp:
+        async for chunk in resp.content.iter_any():
+            total += len(chunk)
+    return total
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=256, help="dimensione del segmento scaricato (MB)")
+    parser.add_argument('--rounds', type=int, default=3, help="ripetizioni per modalità")
+    parser.add_argument('--port', type=int, default=18970)
+    args = parser.parse_args()
+
+    upstream = await start(upstream_app(args.size_mb), args.port)
+    proxy = await start(proxy_app(f"http://127.0.0.1:{args.port}/segment.ts"), args.port + 1)
+
+    print(f"{'modalità':<10} {'MB/s':>10} {'CPU s/GB':>10}")
+    try:
+        async with ClientSession() as session:
+            for mode in ('legacy', 'relay'):
+                url = f"http://127.0.0.1:{args.port + 1}/{mode}"
+                await download(session, url)  # warm-up
+
+                wall = cpu = 0.0
+                total = 0
+                for _ in range(args.rounds):
+                    wall_start, cpu_start = time.perf_counter(), time.process_time()
+                    total += await download(session, url)
+                    wall += time.perf_counter() - wall_start
+                    cpu += time.process_time() - cpu_start
+
+                gigabytes = total / (1024 ** 3)
+                print(f"{mode:<10} {total / (1024 ** 2) / wall:>10.1f} {cpu / gigabytes:>10.2f}")
+    finally:
+        await proxy.cleanup()
+        await upstream.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Benchmark del modello SegmentTimeline usato da MPDToHLSConverter.convert_media_playlist.
+
+Confronta l'espansione precedente (un dict per segmento + `insert(0, ...)` nel filtro live)
+con il modello a run compatte + ricerca binaria, su timeline da 10k, 100k e 1M segmenti.
+Per ogni dimensione misura sia una timeline con ripetizioni lunghe (r grande, tipico delle
+dirette a durata costante) sia una senza ripetizioni (un <S> per segmento, caso peggiore),
+e verifica che la finestra live prodotta sia identica.
+
+Uso:
+    python benchmarks/segment_timeline_benchmark.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.segment_timeline import SegmentTimeline  # noqa: E402
+
+NS = {'mpd': 'urn:mpeg:dash:schema:mpd:2011'}
+TIMESCALE = 90000
+LIVE_WINDOW = 60
+
+
+def build_timeline(segments: int, repeated: bool) -> ET.Element:
+    root = ET.Element('{urn:mpeg:dash:schema:mpd:2011}SegmentTimeline')
+    rng = random.Random(segments)
+    remaining = segments
+    first = True
+    while remaining:
+        count = min(remaining, rng.randint(50, 500)) if repeated else 1
+        attrs = {'d': str(rng.choice((172800, 180000, 187200)))}
+        if first:
+            attrs['t'] = '1000000'
+            first = False
+        if count > 1:
+            attrs['r'] = str(count - 1)
+        ET.SubElement(root, '{urn:mpeg:dash:schema:mpd:2011}S', attrs)
+        remaining -= count
+    return root
+
+
+def legacy_window(segment_timeline: ET.Element, start_number: int = 1):
+    """Algoritmo precedente di convert_media_playlist (espansione completa + filtro live)."""
+    current_time = 0
+    segment_number = start_number
+    all_segments = []
+
+    for s in segment_timeline.findall('mpd:S', NS):
+        t = s.get('t')
+        if t: current_time = int(t)
+        d = int(s.get('d'))
+        r = int(s.get('r', '0'))
+
+        duration_sec = d / TIMESCALE
+
+        for _ in range(r + 1):
+            all_segments.append({
+                'time': current_time,
+                'number': segment_number,
+                'duration': duration_sec,
+                'd': d
+            })
+            current_time += d
+            segment_number += 1
+
+    total_duration = 0
+    live_segments = []
+    for seg in reversed(all_segments):
+        live_segments.insert(0, seg)
+        total_duration += seg['duration']
+        if total_duration > LIVE_WINDOW: break
+    return [(seg['number'], seg['time'], seg['d']) for seg in live_segments]
+
+
+def compact_window(segment_timeline: ET.Element, start_number: int = 1):
+    timeline = SegmentTimeline.from_element(segment_timeline, NS, TIMESCALE, start_number)
+    return list(timeline.iter_segments(timeline.live_window_start(LIVE_WINDOW)))
+
+
+def measure(func, element, repeat: int):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(element)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'segmenti':>10} {'timeline':<10} {'<S>':>9} {'prima ms':>10} {'dopo ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        for repeated in (True, False):
+            element = build_timeline(size, repeated)
+            legacy_time, legacy_result = measure(legacy_window, element, args.repeat)
+            compact_time, compact_result = measure(compact_window, element, args.repeat)
+            if legacy_result != compact_result:
+                raise SystemExit(f"Finestra live diversa per {size} segmenti (repeated={repeated})")
+            print(f"{size:>10} {'r lunghi' if repeated else 'r=0':<10} {len(element):>9} "
+                  f"{legacy_time * 1000:>10.1f} {compact_time * 1000:>10.1f} {legacy_time / compact_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import asyncio
+import contextlib
 import logging
 import re
 import base64
@@ -8,12 +9,15 @@ import gzip
 import zlib
 import zstandard
 import random
+import time
 from urllib.parse import urlparse, quote_plus
 import aiohttp
 from aiohttp import ClientSession, ClientTimeout, TCPConnector, FormData
 from aiohttp_proxy import ProxyConnector
 from typing import Dict, Any, Optional
 from urllib.parse import urljoin
+from utils.shared_cache import SharedCache
+from utils.domain_prober import DomainHealthProber
 
 logger = logging.getLogger(__name__)
 
@@ -23,36 +27,250 @@ class ExtractorError(Exception):
 class DLHDExtractor:
     """DLHD Extractor con sessione persistente e gestione anti-bot avanzata"""
 
-    def __init__(self, request_headers: dict, proxies: list = None):
+    # Richieste parallele massime durante la ricerca di player e iframe
+    PROBE_CONCURRENCY = 4
+    # Iframe: un solo tentativo con timeout breve, la gara tra i candidati copre già i fallimenti
+    IFRAME_PROBE_RETRIES = 1
+    IFRAME_PROBE_TIMEOUT = 15
+    # Durata massima di uno stream in cache
+    STREAM_CACHE_TTL = 6 * 3600
+    # Durata delle voci importate dal vecchio file .dlhd_cache
+    LEGACY_CACHE_TTL = 300
+    # Validazione in background: controllo ogni VALIDATION_TICK secondi dei canali richiesti negli ultimi
+    # ACTIVE_WINDOW secondi; senza AUTH_EXPIRY lo stream viene ricontrollato ogni VALIDATION_INTERVAL secondi,
+    # altrimenti riestratto dopo AUTH_REFRESH_FRACTION della validità del token
+    VALIDATION_TICK = 30
+    VALIDATION_INTERVAL = 300
+    ACTIVE_WINDOW = 600
+    AUTH_REFRESH_FRACTION = 0.8
+    # Lock di estrazione condiviso tra i worker: durata massima e intervallo di attesa del risultato
+    EXTRACTION_LOCK_TTL = 60
+    EXTRACTION_LOCK_POLL = 0.25
+    # Domini base noti (sovrascrivibili da DLHD_BASE_DOMAINS) e attesa massima del primo controllo
+    BASE_DOMAINS = ['https://daddylive.sx/', 'https://dlhd.dad/']
+    PROBE_TIMEOUT = 10
+
+    def __init__(self, request_headers: dict, proxies: list = None, base_domains: list = None,
+                 iframe_hosts: list = None, probe_interval: float = 300):
         self.request_headers = request_headers
         self.base_headers = {
             # ✅ User-Agent più recente per bypassare protezioni anti-bot
             "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
         }
         self.session = None
+        # Sessione dei controlli in background dei domini: indipendente da quella delle estrazioni,
+        # così la sua chiusura dopo un'estrazione fallita non produce falsi errori nei controlli
+        self._probe_session = None
         self.endpoint_type = "hls_manifest_proxy"
         self._cached_base_url = None
         self._iframe_context = None
         self._session_lock = asyncio.Lock()
+        # Estrazioni in corso sulla sessione condivisa: dopo un fallimento la sessione viene
+        # ricreata solo quando nessun'altra estrazione la sta usando
+        self._session_users = 0
+        self._session_reset_pending = False
         self.proxies = proxies or []
-        self._extraction_locks: Dict[str, asyncio.Lock] = {} # ✅ NUOVO: Lock per evitare estrazioni multiple
+        # Lock locali per canale ([lock, utilizzatori]), rimossi quando nessuno li usa più
+        self._extraction_locks: Dict[str, list] = {}
         self.cache_file = os.path.join(os.path.dirname(__file__), '.dlhd_cache')
-        self._stream_data_cache: Dict[str, Dict[str, Any]] = self._load_cache()
+        # Stream per canale condivisi tra i worker (una riga SQLite per canale)
+        self._stream_cache = SharedCache(self.cache_file + '.sqlite', namespace='dlhd_stream')
+        # Lock di estrazione tra processi, nello stesso database
+        self._lock_store = SharedCache(self.cache_file + '.sqlite', namespace='dlhd_lock')
+        self._lock_owner = f"{os.getpid()}:{id(self)}"
+        self._legacy_cache_checked = False
+        # Canali serviti da questo worker (channel_id -> (ultimo accesso, URL)) e task di validazione
+        self._active_channels: Dict[str, tuple] = {}
+        self._validation_task: Optional[asyncio.Task] = None
+        # Esito dei tentativi per dominio iframe: i domini più affidabili e veloci vengono provati per primi
+        self._iframe_domain_stats: Dict[str, Dict[str, float]] = {}
+        # Controllo periodico in background di domini base e host iframe (latenza e tasso di errore)
+        self._base_domains = base_domains or self.BASE_DOMAINS
+        self._domain_prober = DomainHealthProber(
+            self._probe_base_domain, self._base_domains, interval=probe_interval, name='domini base DLHD'
+        )
+        self._iframe_prober = DomainHealthProber(
+            self._probe_iframe_host, iframe_hosts or [], interval=probe_interval, name='host iframe DLHD'
+        )
 
-    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
-        """Carica la cache da un file codificato in Base64 all'avvio."""
+    async def _import_legacy_cache(self):
+        """Importa una sola volta il vecchio file .dlhd_cache (JSON in Base64) senza sovrascrivere dati più recenti."""
+        if self._legacy_cache_checked:
+            return
+        self._legacy_cache_checked = True
         try:
             if os.path.exists(self.cache_file):
                 with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    logger.info(f"💾 Caricamento cache dal file: {self.cache_file}")
                     encoded_data = f.read()
-                    if not encoded_data:
-                        return {}
-                    decoded_data = base64.b64decode(encoded_data).decode('utf-8')
-                    return json.loads(decoded_data)
-        except (IOError, json.JSONDecodeError) as e:
-            logger.error(f"❌ Errore durante il caricamento della cache: {e}. Inizio con una cache vuota.")
-        return {}
+                if encoded_data:
+                    legacy = json.loads(base64.b64decode(encoded_data).decode('utf-8'))
+                    for channel_id, data in legacy.items():
+                        # Dati di età sconosciuta: da validare al primo giro e comunque di breve durata
+                        entry = {'result': data, 'refresh_at': None, 'expires_at': None, 'checked_at': 0, 'stored_at': 0}
+                        await self._stream_cache.add(channel_id, entry, ttl=self.LEGACY_CACHE_TTL)
+                    logger.info(f"💾 Importati {len(legacy)} canali dal vecchio file di cache: {self.cache_file}")
+                # Il file non viene più aggiornato: rinominato per non reimportarlo a ogni avvio
+                os.replace(self.cache_file, self.cache_file + '.imported')
+        except FileNotFoundError:
+            pass  # già importato e rinominato da un altro worker
+        except (IOError, ValueError) as e:
+            logger.error(f"❌ Errore durante l'importazione della vecchia cache: {e}")
+
+    async def _get_cached_stream(self, channel_id: str) -> Optional[Dict[str, Any]]:
+        """Voce di cache del canale: {'result', 'refresh_at', 'expires_at', 'checked_at', 'stored_at'}."""
+        await self._import_legacy_cache()
+        try:
+            entry = await self._stream_cache.get(channel_id)
+        except Exception as e:
+            logger.error(f"❌ Errore durante la lettura della cache condivisa: {e}")
+            return None
+        if entry is not None and 'result' not in entry:
+            # Formato del vecchio file: solo il risultato, da validare al primo giro
+            entry = {'result': entry, 'refresh_at': None, 'expires_at': None, 'checked_at': 0, 'stored_at': 0}
+        return entry
+
+    @staticmethod
+    def _parse_timestamp(value) -> Optional[float]:
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return value / 1000 if value > 10 ** 12 else value
+
+    def _auth_window(self, auth_ts, auth_expiry) -> tuple:
+        """(momento del rinnovo, scadenza) del token AUTH_TS/AUTH_EXPIRY; (None, None) se non noti."""
+        expiry = self._parse_timestamp(auth_expiry)
+        if not expiry:
+            return None, None
+        issued = self._parse_timestamp(auth_ts) or time.time()
+        if expiry < 10 ** 9:
+            expiry = issued + expiry  # durata in secondi invece di un timestamp
+        if expiry <= issued:
+            return None, None
+        return issued + (expiry - issued) * self.AUTH_REFRESH_FRACTION, expiry
+
+    async def _store_stream(self, channel_id: str, result: Dict[str, Any], entry: Optional[Dict[str, Any]] = None):
+        """Salva il risultato (togliendo i metadati '_auth_*' del flusso di autenticazione) o aggiorna una voce esistente."""
+        if entry is None:
+            now = time.time()
+            refresh_at, expires_at = self._auth_window(result.pop('_auth_ts', None), result.pop('_auth_expiry', None))
+            entry = {
+                'result': result,
+                'refresh_at': refresh_at,
+                'expires_at': expires_at,
+                'checked_at': now,
+                'stored_at': now,
+            }
+        ttl = self.STREAM_CACHE_TTL
+        if entry.get('expires_at'):
+            # Oltre la scadenza del token la voce non serve più, anche se il rinnovo non è riuscito
+            ttl = min(ttl, max(1, entry['expires_at'] - time.time()))
+        try:
+            await self._stream_cache.set(channel_id, entry, ttl=ttl)
+            logger.info(f"💾 Stream del canale {channel_id} salvato nella cache condivisa")
+        except Exception as e:
+            logger.error(f"❌ Errore durante il salvataggio della cache: {e}")
+
+    @contextlib.asynccontextmanager
+    async def _channel_lock(self, channel_id: str, force_refresh: bool):
+        """
+        Un'estrazione per canale alla volta tra tutti i worker. Nel processo basta un asyncio.Lock;
+        tra processi il lock è una riga SQLite con scadenza. Chi attende controlla la cache condivisa
+        e, se un altro worker ha appena salvato il risultato, lo riceve (yield) senza estrarre.
+        """
+        started_at = time.time()
+
+        def fresh(entry):
+            # Con force_refresh vale solo un'estrazione conclusa dopo l'inizio di questa richiesta
+            return entry and (not force_refresh or entry['stored_at'] >= started_at)
+
+        holder = self._extraction_locks.setdefault(channel_id, [asyncio.Lock(), 0])
+        holder[1] += 1
+        try:
+            async with holder[0]:
+                acquired = False
+                try:
+                    while True:
+                        entry = await self._get_cached_stream(channel_id)
+                        if fresh(entry):
+                            logger.info(f"✅ Dati per il canale {channel_id} trovati in cache dopo aver atteso il lock.")
+                            yield entry['result']
+                            return
+                        if await self._lock_store.acquire(channel_id, self._lock_owner, self.EXTRACTION_LOCK_TTL):
+                            acquired = True
+                            break
+                        await asyncio.sleep(self.EXTRACTION_LOCK_POLL)
+                    yield None
+                finally:
+                    if acquired:
+                        await self._lock_store.release(channel_id, self._lock_owner)
+        finally:
+            holder[1] -= 1
+            if not holder[1]:
+                self._extraction_locks.pop(channel_id, None)
+
+    def _mark_active(self, channel_id: str, url: str):
+        """Registra l'accesso al canale e avvia la validazione in background se non è già attiva."""
+        self._active_channels[channel_id] = (time.monotonic(), url)
+        if self._validation_task is None or self._validation_task.done():
+            self._validation_task = asyncio.ensure_future(self._validation_loop())
+
+    async def _validation_loop(self):
+        while self._active_channels:
+            await asyncio.sleep(self.VALIDATION_TICK)
+            now = time.monotonic()
+            for channel_id, (last_access, url) in list(self._active_channels.items()):
+                if now - last_access > self.ACTIVE_WINDOW:
+                    del self._active_channels[channel_id]
+                    continue
+                try:
+                    await self._validate_channel(channel_id, url)
+                except Exception as e:
+                    logger.warning(f"⚠️ Validazione in background fallita per il canale {channel_id}: {e}")
+
+    async def _validate_channel(self, channel_id: str, url: str):
+        """Ricontrolla (HEAD) o riestrae lo stream di un canale attivo quando è il momento."""
+        entry = await self._get_cached_stream(channel_id)
+        now = time.time()
+        if entry is not None:
+            if entry['refresh_at'] and now < entry['refresh_at']:
+                return
+            # Controllo o rinnovo già avviato da poco (anche da un altro worker); per i token conta
+            # solo un tentativo di rinnovo, cioè un controllo successivo a refresh_at
+            last_check = entry['checked_at']
+            if entry['refresh_at'] and last_check < entry['refresh_at']:
+                last_check = 0
+            if now - last_check < self.VALIDATION_INTERVAL:
+                return
+            # Gli altri worker vedono il controllo in corso e saltano questo giro; la scadenza resta quella del token
+            await self._store_stream(channel_id, entry['result'], dict(entry, checked_at=now))
+            if not entry['refresh_at'] and await self._check_stream(entry['result']):
+                logger.info(f"✅ Cache per il canale ID {channel_id} ancora valida.")
+                return
+
+        logger.info(f"🔄 Riestrazione in background dello stream del canale {channel_id}")
+        await self.extract(url, force_refresh=True, _background=True)
+
+    async def _check_stream(self, result: Dict[str, Any]) -> bool:
+        stream_url = result.get("destination_url")
+        if not stream_url:
+            return False
+        try:
+            # Sessione separata per non interferire con la sessione principale e i suoi cookie
+            async with aiohttp.ClientSession(timeout=ClientTimeout(total=10)) as validation_session:
+                async with validation_session.head(stream_url, headers=result.get("request_headers", {}), ssl=False) as response:
+                    if response.status == 200:
+                        return True
+                    logger.warning(f"⚠️ Stream in cache non valido. Status: {response.status}")
+        except Exception as e:
+            logger.warning(f"⚠️ Errore durante la validazione dello stream in cache: {e}")
+        return False
+
+    async def _invalidate_stream(self, channel_id: str):
+        try:
+            await self._stream_cache.delete(channel_id)
+        except Exception as e:
+            logger.error(f"❌ Errore durante l'invalidazione della cache: {e}")
 
     def _get_random_proxy(self):
         """Restituisce un proxy casuale dalla lista."""
@@ -85,17 +303,6 @@ class DLHDExtractor:
             )
         return self.session
 
-    def _save_cache(self):
-        """Salva lo stato corrente della cache su un file, codificando il contenuto in Base64."""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json_data = json.dumps(self._stream_data_cache)
-                encoded_data = base64.b64encode(json_data.encode('utf-8')).decode('utf-8')
-                f.write(encoded_data)
-                logger.info(f"💾 Cache codificata e salvata con successo nel file: {self.cache_file}")
-        except IOError as e:
-            logger.error(f"❌ Errore durante il salvataggio della cache: {e}")
-
     def _get_headers_for_url(self, url: str, base_headers: dict) -> dict:
         """Applica headers specifici per newkso.ru automaticamente"""
         headers = base_headers.copy()
@@ -155,8 +362,43 @@ class DLHDExtractor:
             logger.error(f"Errore durante la decompressione/decodifica del contenuto da {response.url}: {e}")
             raise ExtractorError(f"Fallimento decompressione per {response.url}: {e}")
 
-    async def _make_robust_request(self, url: str, headers: dict = None, retries=3, initial_delay=2):
-        """✅ Richieste con sessione persistente per evitare anti-bot"""
+    async def _release_session(self, failed: bool):
+        """Fine di un'estrazione: chiude la sessione se un'estrazione è fallita e nessun'altra la usa più."""
+        self._session_users -= 1
+        if failed:
+            self._session_reset_pending = True
+        if self._session_reset_pending and self._session_users == 0:
+            self._session_reset_pending = False
+            if self.session and not self.session.closed:
+                try:
+                    await self.session.close()
+                except:
+                    pass
+            self.session = None
+
+    async def _get_probe_session(self):
+        """Sessione dedicata ai controlli dei domini (nessun cookie: non deve sembrare una navigazione)."""
+        if self._probe_session is None or self._probe_session.closed:
+            proxy = self._get_random_proxy()
+            if proxy:
+                connector = ProxyConnector.from_url(proxy, ssl=False)
+            else:
+                connector = TCPConnector(limit=10, keepalive_timeout=30, enable_cleanup_closed=True, use_dns_cache=True)
+            self._probe_session = ClientSession(
+                timeout=ClientTimeout(total=self.PROBE_TIMEOUT),
+                connector=connector,
+                headers=self.base_headers,
+                cookie_jar=aiohttp.DummyCookieJar()
+            )
+        return self._probe_session
+
+    async def _make_robust_request(self, url: str, headers: dict = None, retries=3, initial_delay=2,
+                                   close_session_on_failure: bool = True, timeout: Optional[ClientTimeout] = None):
+        """
+        ✅ Richieste con sessione persistente per evitare anti-bot.
+        Con `close_session_on_failure=False` (richieste parallele dell'estrazione) la sessione condivisa
+        non viene chiusa dopo l'ultimo tentativo fallito: la ricrea extract() a estrazione conclusa.
+        """
         final_headers = self._get_headers_for_url(url, headers or {})
         # Aggiungiamo zstd agli header accettati per segnalare al server che lo supportiamo
         # Rimosso 'br' perché non gestito in _handle_response_content
@@ -168,7 +410,9 @@ class DLHDExtractor:
                 session = await self._get_session()
                 
                 logger.info(f"Tentativo {attempt + 1}/{retries} per URL: {url}")
-                async with session.get(url, headers=final_headers, ssl=False, auto_decompress=False) as response:
+                # timeout=None in aiohttp disattiva ogni timeout: si passa solo se indicato
+                request_kwargs = {'timeout': timeout} if timeout is not None else {}
+                async with session.get(url, headers=final_headers, ssl=False, auto_decompress=False, **request_kwargs) as response:
                     response.raise_for_status()
                     content = await self._handle_response_content(response)
                     
@@ -207,7 +451,7 @@ class DLHDExtractor:
                 logger.warning(f"⚠️ Errore connessione tentativo {attempt + 1} per {url}: {str(e)}")
                 
                 # ✅ Solo in caso di errore critico, chiudi la sessione
-                if attempt == retries - 1:
+                if attempt == retries - 1 and close_session_on_failure:
                     if self.session and not self.session.closed:
                         try:
                             await self.session.close()
@@ -234,26 +478,21 @@ class DLHDExtractor:
 
     async def extract(self, url: str, force_refresh: bool = False, **kwargs) -> Dict[str, Any]:
         """Flusso di estrazione principale: risolve il dominio base, trova i player, estrae l'iframe, i parametri di autenticazione e l'URL m3u8 finale."""
-        async def resolve_base_url(preferred_host: Optional[str] = None) -> str:
-            """Risolve l'URL di base attivo provando una lista di domini noti."""
-            if self._cached_base_url and not force_refresh:
-                return self._cached_base_url
-            
-            DOMAINS = ['https://daddylive.sx/', 'https://dlhd.dad/']
-            for base in DOMAINS:
-                try:
-                    resp = await self._make_robust_request(base, retries=1)
-                    final_url = str(resp.url)
-                    if not final_url.endswith('/'): final_url += '/' # Assicura lo slash finale
-                    self._cached_base_url = final_url
-                    logger.info(f"✅ Dominio base risolto: {final_url}")
-                    return final_url
-                except Exception as e:
-                    logger.warning(f"⚠️ Tentativo fallito per il dominio base {base}: {e}")
-            
-            fallback = DOMAINS[0]
-            logger.warning(f"Tutti i tentativi di risoluzione del dominio sono falliti, uso il fallback: {fallback}")
-            self._cached_base_url = fallback
+        async def resolve_base_url() -> str:
+            """Dominio base attivo: il migliore secondo il controllo in background (attende solo il primo giro)."""
+            self._iframe_prober.start()
+            best = self._domain_prober.best()
+            if best is None:
+                await self._domain_prober.ready(self.PROBE_TIMEOUT)
+                best = self._domain_prober.best()
+            if best:
+                if best != self._cached_base_url:
+                    logger.info(f"✅ Dominio base risolto: {best}")
+                self._cached_base_url = best
+                return best
+
+            fallback = self._cached_base_url or self._base_domains[0]
+            logger.warning(f"Nessun dominio base raggiungibile, uso il fallback: {fallback}")
             return fallback
 
         def extract_channel_id(u: str) -> Optional[str]:
@@ -279,139 +518,103 @@ class DLHDExtractor:
             }
             
             # 1. Richiesta pagina iniziale per trovare i link dei player
-            resp1 = await self._make_robust_request(initial_url, headers=daddylive_headers)
+            resp1 = await self._make_robust_request(initial_url, headers=daddylive_headers, close_session_on_failure=False)
             content1 = await resp1.text()
             player_links = re.findall(r'<button[^>]*data-url="([^"]+)"[^>]*>Player\s*\d+</button>', content1)
             if not player_links:
                 raise ExtractorError("Nessun link player trovato nella pagina.")
             
-            last_player_error = None
-            iframe_candidates = []
-            
-            for player_url in player_links:
-                try:
-                    if not player_url.startswith('http'):
-                        player_url = urljoin(baseurl, player_url)
-            
-                    daddylive_headers['Referer'] = player_url
-                    resp2 = await self._make_robust_request(player_url, headers=daddylive_headers)
-                    content2 = await resp2.text()
-                    iframes2 = re.findall(r'<iframe.*?src="([^"]*)"', content2)
-            
-                    for iframe in iframes2:
-                        full_iframe_url = urljoin(player_url, iframe)
-                        if full_iframe_url not in iframe_candidates:
-                            iframe_candidates.append(full_iframe_url)
-                            logger.info(f"Found iframe candidate: {full_iframe_url}")
-            
-                except Exception as e:
-                    last_player_error = e
-                    logger.warning(f"Fallito il processamento del link player {player_url}: {e}")
-                    continue
-            
-            if not iframe_candidates:
-                if last_player_error:
-                    raise ExtractorError(f"Tutti i link dei player sono falliti. Ultimo errore: {last_player_error}")
-                raise ExtractorError("Nessun iframe valido trovato in nessuna pagina player")
-            
-            last_iframe_error = None
-            for iframe_candidate in iframe_candidates:
-                try:
-                    logger.info(f"Trying iframe: {iframe_candidate}")
-                    iframe_domain = urlparse(iframe_candidate).netloc
-                    if not iframe_domain:
-                        logger.warning(f"Invalid iframe URL format: {iframe_candidate}")
-                        continue
-            
-                    self._iframe_context = iframe_candidate
-                    resp3 = await self._make_robust_request(iframe_candidate, headers=daddylive_headers)
-                    iframe_content = await resp3.text()
-                    logger.info(f"Successfully loaded iframe from: {iframe_domain}")
-            
-                    if 'lovecdn.ru' in iframe_domain:
-                        logger.info("Detected lovecdn.ru iframe - using alternative extraction")
-                        result = await self._extract_lovecdn_stream(iframe_candidate, iframe_content, daddylive_headers)
-                        self._stream_data_cache[channel_id] = result
-                        self._save_cache()
-                        return result
-                    else:
-                        logger.info("Attempting new auth flow extraction.")
-                        result = await self._extract_new_auth_flow(iframe_candidate, iframe_content, daddylive_headers)
-                        self._stream_data_cache[channel_id] = result
-                        self._save_cache()
+            # 2. Pagine player e iframe in parallelo (max PROBE_CONCURRENCY richieste): ogni iframe trovato
+            #    viene provato subito, il primo flusso di autenticazione riuscito vince e gli altri vengono annullati
+            semaphore = asyncio.Semaphore(self.PROBE_CONCURRENCY)
+            seen_iframes = set()
+            errors = {'player': None, 'iframe': None}
+
+            async def fetch_player(player_url: str):
+                if not player_url.startswith('http'):
+                    player_url = urljoin(baseurl, player_url)
+                headers = dict(daddylive_headers, Referer=player_url)
+                async with semaphore:
+                    resp2 = await self._make_robust_request(player_url, headers=headers, close_session_on_failure=False)
+                content2 = await resp2.text()
+                candidates = []
+                for iframe in re.findall(r'<iframe.*?src="([^"]*)"', content2):
+                    full_iframe_url = urljoin(player_url, iframe)
+                    if full_iframe_url not in seen_iframes:
+                        seen_iframes.add(full_iframe_url)
+                        candidates.append(full_iframe_url)
+                        logger.info(f"Found iframe candidate: {full_iframe_url}")
+                return self._rank_iframe_candidates(candidates), headers
+
+            async def probe_iframe(iframe_candidate: str, headers: dict):
+                async with semaphore:
+                    return await self._probe_iframe(iframe_candidate, headers)
+
+            player_tasks = {asyncio.ensure_future(fetch_player(link)) for link in player_links}
+            pending = set(player_tasks)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task in player_tasks:
+                            try:
+                                candidates, headers = task.result()
+                            except Exception as e:
+                                errors['player'] = e
+                                logger.warning(f"Fallito il processamento del link player: {e}")
+                                continue
+                            pending.update(asyncio.ensure_future(probe_iframe(c, headers)) for c in candidates)
+                            continue
+                        try:
+                            iframe_candidate, result = task.result()
+                        except Exception as e:
+                            errors['iframe'] = e
+                            continue
+                        self._iframe_context = iframe_candidate
+                        await self._store_stream(channel_id, result)
                         return result
-            
-                except Exception as e:
-                    logger.warning(f"Failed to process iframe {iframe_candidate}: {e}")
-                    last_iframe_error = e
-                    continue
-            
-            raise ExtractorError(f"All iframe candidates failed. Last error: {last_iframe_error}")
+            finally:
+                for task in pending:
+                    task.cancel()
+
+            if not seen_iframes:
+                if errors['player']:
+                    raise ExtractorError(f"Tutti i link dei player sono falliti. Ultimo errore: {errors['player']}")
+                raise ExtractorError("Nessun iframe valido trovato in nessuna pagina player")
+            raise ExtractorError(f"All iframe candidates failed. Last error: {errors['iframe']}")
 
         try:
             channel_id = extract_channel_id(url)
             if not channel_id:
                 raise ExtractorError(f"Impossibile estrarre channel ID da {url}")
 
-            # Controlla la cache prima di procedere
-            if not force_refresh and channel_id in self._stream_data_cache:
-                logger.info(f"✅ Trovati dati in cache per il canale ID: {channel_id}. Verifico la validità...")
-                cached_data = self._stream_data_cache[channel_id]
-                stream_url = cached_data.get("destination_url")
-                stream_headers = cached_data.get("request_headers", {})
+            if not kwargs.get('_background'):
+                self._mark_active(channel_id, url)
 
-                is_valid = False
-                if stream_url:
-                    try:
-                        # Usa una sessione separata per la validazione per non interferire
-                        # con la sessione principale e i suoi cookie.
-                        async with aiohttp.ClientSession(timeout=ClientTimeout(total=10)) as validation_session:
-                            async with validation_session.head(stream_url, headers=stream_headers, ssl=False) as response:
-                                # Uso una richiesta HEAD per efficienza, con un timeout breve
-                                if response.status == 200:
-                                    is_valid = True
-                                    logger.info(f"✅ Cache per il canale ID {channel_id} è valida.")
-                                else:
-                                    logger.warning(f"⚠️ Cache per il canale ID {channel_id} non valida. Status: {response.status}. Procedo con estrazione.")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Errore durante la validazione della cache per {channel_id}: {e}. Procedo con estrazione.")
-                
-                if not is_valid:
-                    # Rimuovi i dati invalidi dalla cache
-                    if channel_id in self._stream_data_cache:
-                        del self._stream_data_cache[channel_id]
-                    self._save_cache()
-                    logger.info(f"🗑️ Cache invalidata per il canale ID {channel_id}.")
-                else:
-                    # ✅ NUOVO: Esegui una richiesta di "keep-alive" per mantenere la sessione attiva
-                    # Questo utilizza il proxy se configurato, come richiesto.
-                    try:
-                        logger.info(f"🔄 Eseguo una richiesta di keep-alive per il canale {channel_id} per mantenere la sessione attiva tramite proxy.")
-                        baseurl = await resolve_base_url()
-                        # Eseguiamo una richiesta leggera alla pagina del canale per aggiornare i cookie di sessione.
-                        # Questo assicura che il proxy venga utilizzato.
-                        await self._make_robust_request(url, retries=1)
-                        logger.info(f"✅ Sessione per il canale {channel_id} rinfrescata con successo.")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Fallita la richiesta di keep-alive per il canale {channel_id}: {e}. Lo stream potrebbe non funzionare.")
-                    
-                    return cached_data
+            # Cache condivisa: risposta immediata, la validità è controllata in background
+            # (o subito dopo un errore a valle, tramite invalidate_cache_for_url)
+            if not force_refresh:
+                entry = await self._get_cached_stream(channel_id)
+                if entry:
+                    logger.info(f"✅ Trovati dati in cache per il canale ID: {channel_id}.")
+                    return entry['result']
 
-            # ✅ NUOVO: Usa un lock per prevenire estrazioni simultanee per lo stesso canale
-            if channel_id not in self._extraction_locks:
-                self._extraction_locks[channel_id] = asyncio.Lock()
-            
-            lock = self._extraction_locks[channel_id]
-            async with lock:
-                # Ricontrolla la cache dopo aver acquisito il lock, un altro processo potrebbe averla già popolata
-                if channel_id in self._stream_data_cache:
-                    logger.info(f"✅ Dati per il canale {channel_id} trovati in cache dopo aver atteso il lock.")
-                    return self._stream_data_cache[channel_id]
+            # Una sola estrazione per canale tra tutti i worker: gli altri ricevono il risultato dalla cache condivisa
+            async with self._channel_lock(channel_id, force_refresh) as cached_result:
+                if cached_result is not None:
+                    return cached_result
 
                 # Procedi con l'estrazione
                 logger.info(f"⚙️ Nessuna cache valida per {channel_id}, avvio estrazione completa...")
                 baseurl = await resolve_base_url()
-                return await get_stream_data(baseurl, url, channel_id)
+                self._session_users += 1
+                failed = True
+                try:
+                    result = await get_stream_data(baseurl, url, channel_id)
+                    failed = False
+                    return result
+                finally:
+                    await self._release_session(failed)
             
         except Exception as e:
             # Per errori 403, non loggare il traceback perché sono errori attesi (servizio temporaneamente non disponibile)
@@ -422,6 +625,91 @@ class DLHDExtractor:
                 logger.exception(f"Estrazione DLHD completamente fallita per URL {url}")
             raise ExtractorError(f"Estrazione DLHD completamente fallita: {str(e)}")
 
+    def _rank_iframe_candidates(self, candidates: list) -> list:
+        """
+        Ordina gli iframe: prima i domini già riusciti (dal più veloce), poi quelli mai provati
+        (raggiungibili secondo il controllo in background per primi), infine quelli solo falliti.
+        """
+        health_order = {host: i for i, host in enumerate(self._iframe_prober.rank(
+            {urlparse(c).netloc for c in candidates}
+        ))}
+
+        def score(item):
+            index, candidate = item
+            domain = urlparse(candidate).netloc
+            stats = self._iframe_domain_stats.get(domain)
+            if not stats:
+                if self._iframe_prober.health(domain) is False:
+                    return (2, 0.0, index)
+                return (1, health_order.get(domain, 0), index)
+            if not stats['success']:
+                return (2, stats['failure'], index)
+            return (0, stats['total_ms'] / stats['success'], index)
+        return [candidate for _, candidate in sorted(enumerate(candidates), key=score)]
+
+    async def _probe_base_domain(self, base_url: str) -> str:
+        """Controllo di un dominio base: origine (schema e host) dell'URL finale dopo i redirect, con lo slash finale."""
+        session = await self._get_probe_session()
+        async with session.get(base_url, ssl=False, timeout=ClientTimeout(total=self.PROBE_TIMEOUT)) as resp:
+            resp.raise_for_status()
+            # Solo l'origine: un redirect verso una pagina (es. /index.php) non deve finire nel baseurl
+            return str(resp.url.origin()) + '/'
+
+    async def _probe_iframe_host(self, host: str) -> str:
+        session = await self._get_probe_session()
+        async with session.get(f"https://{host}/", ssl=False, timeout=ClientTimeout(total=self.PROBE_TIMEOUT)) as resp:
+            # Qualsiasi risposta HTTP < 500 indica un host raggiungibile (la home può non esistere)
+            if resp.status >= 500:
+                raise ExtractorError(f"HTTP {resp.status}")
+        return host
+
+    def get_domain_stats(self) -> Dict[str, Any]:
+        return {
+            "base_domains": self._domain_prober.get_stats(),
+            "iframe_hosts": self._iframe_prober.get_stats(),
+        }
+
+    def _record_iframe_result(self, iframe_domain: str, elapsed_ms: Optional[float]):
+        self._iframe_prober.add(iframe_domain)
+        stats = self._iframe_domain_stats.setdefault(iframe_domain, {'success': 0, 'failure': 0, 'total_ms': 0.0})
+        if elapsed_ms is None:
+            stats['failure'] += 1
+        else:
+            stats['success'] += 1
+            stats['total_ms'] += elapsed_ms
+
+    async def _probe_iframe(self, iframe_candidate: str, headers: dict):
+        """Carica l'iframe ed esegue il flusso di autenticazione adatto. Restituisce (iframe, risultato)."""
+        logger.info(f"Trying iframe: {iframe_candidate}")
+        iframe_domain = urlparse(iframe_candidate).netloc
+        if not iframe_domain:
+            raise ExtractorError(f"Invalid iframe URL format: {iframe_candidate}")
+
+        started_at = time.monotonic()
+        try:
+            resp3 = await self._make_robust_request(
+                iframe_candidate, headers=headers, retries=self.IFRAME_PROBE_RETRIES,
+                close_session_on_failure=False, timeout=ClientTimeout(total=self.IFRAME_PROBE_TIMEOUT)
+            )
+            iframe_content = await resp3.text()
+            logger.info(f"Successfully loaded iframe from: {iframe_domain}")
+
+            if 'lovecdn.ru' in iframe_domain:
+                logger.info("Detected lovecdn.ru iframe - using alternative extraction")
+                result = await self._extract_lovecdn_stream(iframe_candidate, iframe_content, headers)
+            else:
+                logger.info("Attempting new auth flow extraction.")
+                result = await self._extract_new_auth_flow(iframe_candidate, iframe_content, headers)
+        except asyncio.CancelledError:
+            # Annullato perché un altro iframe ha già risposto: non conta come fallimento
+            raise
+        except Exception as e:
+            logger.warning(f"Failed to process iframe {iframe_candidate}: {e}")
+            self._record_iframe_result(iframe_domain, None)
+            raise
+        self._record_iframe_result(iframe_domain, (time.monotonic() - started_at) * 1000)
+        return iframe_candidate, result
+
     async def _extract_lovecdn_stream(self, iframe_url: str, iframe_content: str, headers: dict) -> Dict[str, Any]:
         """
         Estrattore alternativo per iframe lovecdn.ru che usa un formato diverso.
@@ -553,7 +841,7 @@ class DLHDExtractor:
         # 2. Server Lookup
         server_lookup_url = f"https://{urlparse(iframe_url).netloc}/server_lookup.js?channel_id={params['channel_key']}"
         try:
-            lookup_resp = await self._make_robust_request(server_lookup_url, headers=headers)
+            lookup_resp = await self._make_robust_request(server_lookup_url, headers=headers, close_session_on_failure=False)
             server_data = await lookup_resp.json()
             server_key = server_data.get('server_key')
             if not server_key:
@@ -585,6 +873,9 @@ class DLHDExtractor:
             "destination_url": stream_url,
             "request_headers": stream_headers,
             "endpoint_type": self.endpoint_type,
+            # Validità del token, usata per programmare il rinnovo (rimossa prima del salvataggio)
+            "_auth_ts": params["auth_ts"],
+            "_auth_expiry": params["auth_expiry"],
         }
 
     async def invalidate_cache_for_url(self, url: str):
@@ -606,13 +897,21 @@ class DLHDExtractor:
             return None
 
         channel_id = extract_channel_id_internal(url)
-        if channel_id and channel_id in self._stream_data_cache:
-            del self._stream_data_cache[channel_id]
-            self._save_cache()
+        if channel_id:
+            await self._invalidate_stream(channel_id)
             logger.info(f"🗑️ Cache per il canale ID {channel_id} invalidata a causa di un errore esterno (es. chiave AES).")
 
     async def close(self):
         """Chiude definitivamente la sessione"""
+        if self._validation_task and not self._validation_task.done():
+            self._validation_task.cancel()
+        await self._stream_cache.close()
+        await self._lock_store.close()
+        await self._domain_prober.close()
+        await self._iframe_prober.close()
+        if self._probe_session and not self._probe_session.closed:
+            await self._probe_session.close()
+        self._probe_session = None
         if self.session and not self.session.closed:
             try:
                 await self.session.close()
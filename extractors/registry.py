@@ -0,0 +1,163 @@
+import importlib
+import logging
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Schema + netloc dell'URL (più veloce di urlsplit, che serve solo per l'host)
+_NETLOC_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]*://([^/?#]*)')
+
+
+class ExtractorSpec:
+    """
+    Dichiarazione di un estrattore: domini gestiti (il dominio e i suoi sottodomini), pattern
+    di ripiego sull'hostname e sull'URL intero, nomi accettati dal parametro `host` e classe da
+    importare. `path_pattern`, se presente, deve trovarsi nel resto dell'URL perché un URL del
+    dominio sia dell'estrattore.
+    """
+
+    __slots__ = ('name', 'module', 'class_name', 'domains', 'host_patterns', 'url_patterns', 'aliases', 'path_pattern')
+
+    def __init__(self, name: str, module: str, class_name: str, domains: Iterable[str] = (),
+                 host_patterns: Iterable[str] = (), url_patterns: Iterable[str] = (),
+                 aliases: Iterable[str] = (), path_pattern: Optional[str] = None):
+        self.name = name
+        self.module = module
+        self.class_name = class_name
+        self.domains = tuple(d.lower() for d in domains)
+        self.host_patterns = tuple(host_patterns)
+        self.url_patterns = tuple(url_patterns)
+        self.aliases = (name,) + tuple(aliases)
+        self.path_pattern = re.compile(path_pattern) if path_pattern else None
+
+
+class ExtractorRegistry:
+    """
+    Risolve l'URL (o il parametro `host`) nel nome dell'estrattore e importa il modulo relativo
+    solo al primo utilizzo. L'hostname viene cercato per suffissi in una mappa precalcolata e poi
+    in un'unica regex con i pattern degli host; il risultato per netloc resta in memoria, così per
+    i segmenti di un host già visto la ricerca è un accesso a dizionario. Gli URL senza estrattore
+    passano infine per un'unica regex con i pattern sull'URL intero (es. `stream-123.php`).
+    """
+
+    # Netloc diversi ricordati prima di svuotare la cache (URL generici con molti host)
+    HOST_CACHE_SIZE = 4096
+
+    def __init__(self, specs: Iterable[ExtractorSpec]):
+        self.specs: Dict[str, ExtractorSpec] = {}
+        self._by_domain: Dict[str, ExtractorSpec] = {}
+        self._by_alias: Dict[str, str] = {}
+        host_patterns, url_patterns = [], []
+        for spec in specs:
+            self.specs[spec.name] = spec
+            for domain in spec.domains:
+                self._by_domain.setdefault(domain, spec)
+            for alias in spec.aliases:
+                self._by_alias[alias] = spec.name
+            if spec.host_patterns:
+                host_patterns.append(f"(?P<{spec.name}>{'|'.join(spec.host_patterns)})")
+            if spec.url_patterns:
+                url_patterns.append(f"(?P<{spec.name}>{'|'.join(spec.url_patterns)})")
+        self._host_fallback = re.compile('|'.join(host_patterns)) if host_patterns else None
+        self._url_fallback = re.compile('|'.join(url_patterns)) if url_patterns else None
+        self._host_cache: Dict[str, Optional[ExtractorSpec]] = {}
+        self._classes: Dict[str, Any] = {}
+        self._failed: Dict[str, str] = {}
+
+    def _resolve_host(self, netloc: str) -> Optional[ExtractorSpec]:
+        hostname = netloc.rpartition('@')[2]
+        hostname = hostname[:hostname.find(']') + 1] if hostname.startswith('[') else hostname.partition(':')[0]
+        hostname = hostname.lower()
+
+        # "a.b.example.com" -> "a.b.example.com", "b.example.com", "example.com", "com"
+        suffix = hostname
+        while suffix:
+            spec = self._by_domain.get(suffix)
+            if spec is not None:
+                return spec
+            _, _, suffix = suffix.partition('.')
+
+        if self._host_fallback is not None:
+            match = self._host_fallback.search(hostname)
+            if match:
+                return self.specs[match.lastgroup]
+        return None
+
+    def resolve(self, url: str) -> Optional[str]:
+        """Nome dell'estrattore per l'URL, None se nessuno lo dichiara (estrattore generico)."""
+        match = _NETLOC_RE.match(url)
+        if match:
+            netloc = match.group(1)
+            try:
+                spec = self._host_cache[netloc]
+            except KeyError:
+                if len(self._host_cache) >= self.HOST_CACHE_SIZE:
+                    self._host_cache.clear()
+                spec = self._host_cache[netloc] = self._resolve_host(netloc)
+            if spec is not None and (spec.path_pattern is None or spec.path_pattern.search(url, match.end())):
+                return spec.name
+
+        if self._url_fallback is not None:
+            match = self._url_fallback.search(url)
+            if match:
+                return match.lastgroup
+        return None
+
+    def resolve_alias(self, host: str) -> Optional[str]:
+        """Nome dell'estrattore per il parametro `host` (es. 'daddylive' -> 'dlhd')."""
+        return self._by_alias.get(host.lower())
+
+    def load(self, name: str):
+        """Classe dell'estrattore, importata alla prima richiesta; ImportError se il modulo non è disponibile."""
+        cls = self._classes.get(name)
+        if cls is not None:
+            return cls
+        if name in self._failed:
+            raise ImportError(self._failed[name])
+
+        spec = self.specs[name]
+        try:
+            cls = getattr(importlib.import_module(spec.module), spec.class_name)
+        except (ImportError, AttributeError) as e:
+            self._failed[name] = f"{spec.class_name}: {e}"
+            logger.warning(f"⚠️ Modulo {spec.class_name} non disponibile: {e}")
+            raise ImportError(self._failed[name]) from e
+        self._classes[name] = cls
+        logger.info(f"✅ Modulo {spec.class_name} caricato.")
+        return cls
+
+    def status(self) -> Dict[str, Optional[bool]]:
+        """Per estrattore: True se importato, False se l'import è fallito, None se non ancora richiesto."""
+        return {
+            name: True if name in self._classes else (False if name in self._failed else None)
+            for name in self.specs
+        }
+
+
+EXTRACTOR_SPECS: Tuple[ExtractorSpec, ...] = (
+    ExtractorSpec('vavoo', 'extractors.vavoo', 'VavooExtractor', domains=['vavoo.to']),
+    ExtractorSpec(
+        'dlhd', 'extractors.dlhd', 'DLHDExtractor',
+        # I domini DaddyLive cambiano spesso: basta che l'host contenga "daddylive" o "dlhd"
+        host_patterns=[r'daddylive|dlhd'],
+        url_patterns=[r'stream-\d+\.php'],
+        aliases=['daddylive'],
+    ),
+    ExtractorSpec('vixsrc', 'extractors.vixsrc', 'VixSrcExtractor', domains=['vixsrc.to'],
+                  path_pattern=r'/(?:movie|tv|iframe)/'),
+    ExtractorSpec(
+        'sportsonline', 'extractors.sportsonline', 'SportsonlineExtractor',
+        host_patterns=[r'sportzonline|sportsonline'],
+        aliases=['sportzonline'],
+    ),
+    ExtractorSpec('mixdrop', 'extractors.mixdrop', 'MixdropExtractor',
+                  host_patterns=[r'mixdrop']),
+    ExtractorSpec('voe', 'extractors.voe', 'VoeExtractor',
+                  domains=['voe.sx', 'voe.to', 'voe.st', 'voe.eu', 'voe.la', 'voe-network.net']),
+    ExtractorSpec('streamtape', 'extractors.streamtape', 'StreamtapeExtractor',
+                  domains=['streamtape.com', 'streamtape.to', 'streamtape.net']),
+    ExtractorSpec('orion', 'extractors.orion', 'OrionExtractor', domains=['orionoid.com']),
+)
+
+EXTRACTOR_REGISTRY = ExtractorRegistry(EXTRACTOR_SPECS)
@@ -12,44 +12,13 @@ from aiohttp import ClientSession, ClientTimeout, TCPConnector
 import zstandard # Importa la libreria zstandard
 from aiohttp_proxy import ProxyConnector
 
+from utils.packed import find_packed_blocks, unpack
+
 logger = logging.getLogger(__name__)
 
 class ExtractorError(Exception):
     """Eccezione personalizzata per errori di estrazione."""
     pass
-
-def unpack(p, a, c, k, e=None, d=None):
-    """
-    Unpacker for P.A.C.K.E.R. packed javascript.
-    This is a Python port of the common Javascript unpacker.
-    """
-    while c > 0:
-        c -= 1
-        if k[c]:
-            p = re.sub('\\b' + _int2base(c, a) + '\\b', k[c], p)
-    return p
-
-def _int2base(x, base):
-    if x < 0:
-        sign = -1
-    elif x == 0:
-        return '0'
-    else:
-        sign = 1
-    
-    x *= sign
-    digits = []
-    
-    while x:
-        digits.append('0123456789abcdefghijklmnopqrstuvwxyz'[x % base])
-        x = int(x / base)
-        
-    if sign < 0:
-        digits.append('-')
-        
-    digits.reverse()
-    return ''.join(digits)
-
 class SportsonlineExtractor:
     """Sportsonline/Sportzonline URL extractor for M3U8 streams."""
 
@@ -138,16 +107,7 @@ class SportsonlineExtractor:
 
     def _detect_packed_blocks(self, html: str) -> list[str]:
         """Rileva e estrae i blocchi eval packed dall'HTML."""
-        # Pattern robusto che cattura l'intero blocco eval
-        pattern = re.compile(r"(eval\(function\(p,a,c,k,e,d\).*?)\s*<\/script>", re.DOTALL)
-        raw_matches = pattern.findall(html)
-        
-        # Fallback se il pattern precedente non funziona
-        if not raw_matches:
-            pattern = re.compile(r"(eval\(function\(p,a,c,k,e,.*?\)\))", re.DOTALL)
-            raw_matches = pattern.findall(html)
-        
-        return raw_matches
+        return find_packed_blocks(html)
 
     async def extract(self, url: str, **kwargs) -> Dict[str, Any]:
         try:
@@ -243,26 +203,3 @@ class SportsonlineExtractor:
         if self.session and not self.session.closed:
             await self.session.close()
             self.session = None
-
-def unpack(packed_js):
-    """
-    Unpacker for P.A.C.K.E.R. packed javascript.
-    This is a Python port of the common Javascript unpacker.
-    """
-    try:
-        # Estrae i parametri p,a,c,k,e,d dalla stringa packed_js
-        match = re.search(r"}\((.*)\)\)", packed_js)
-        if not match:
-            raise ValueError("Cannot find packed data.")
-        
-        p, a, c, k, e, d = eval(f"({match.group(1)})", {"__builtins__": {}}, {})
-        return _unpack_logic(p, a, c, k, e, d)
-    except Exception as e:
-        raise ValueError(f"Failed to unpack JS: {e}")
-
-def _unpack_logic(p, a, c, k, e, d):
-    while c > 0:
-        c -= 1
-        if k[c]:
-            p = re.sub('\\b' + _int2base(c, a) + '\\b', k[c], p)
-    return p
\ No newline at end of file
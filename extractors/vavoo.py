@@ -1,4 +1,6 @@
 import asyncio
+import base64
+import json
 import logging
 import time
 import aiohttp
@@ -14,6 +16,10 @@ class ExtractorError(Exception):
 
 class VavooExtractor:
     """Vavoo URL extractor per risolvere link vavoo.to"""
+
+    # Validità della addonSig se non ricavabile dalla signature stessa, e anticipo del rinnovo in background
+    SIGNATURE_TTL = 600
+    SIGNATURE_REFRESH_MARGIN = 60
     
     def __init__(self, request_headers: dict, proxies: list = None):
         self.request_headers = request_headers
@@ -24,6 +30,11 @@ class VavooExtractor:
         self.endpoint_type = "proxy_stream_endpoint"
         self.proxies = proxies or []
 
+        # addonSig condivisa da tutte le risoluzioni finché è valida
+        self._signature: Optional[str] = None
+        self._signature_expires_at = 0.0
+        self._signature_task: Optional[asyncio.Task] = None
+
     def _get_random_proxy(self):
         """Restituisce un proxy casuale dalla lista."""
         return random.choice(self.proxies) if self.proxies else None
@@ -153,6 +164,54 @@ class VavooExtractor:
         
         return None
 
+    def _signature_ttl(self, signature: str) -> float:
+        """Secondi di validità della addonSig: dal campo di scadenza nel payload, se presente, altrimenti SIGNATURE_TTL."""
+        try:
+            payload = json.loads(base64.b64decode(signature + '=' * (-len(signature) % 4)))
+            data = payload.get("data", payload)
+            if isinstance(data, str):
+                data = json.loads(data)
+            for field in ("validUntil", "expires", "exp"):
+                value = data.get(field)
+                if isinstance(value, (int, float)) and value > 0:
+                    expires = value / 1000 if value > 10 ** 12 else value
+                    return max(0.0, min(expires - time.time(), self.SIGNATURE_TTL * 6))
+        except Exception:
+            pass
+        return self.SIGNATURE_TTL
+
+    def _start_signature_fetch(self) -> asyncio.Task:
+        """Avvia (o riusa) l'unico rinnovo della addonSig in corso."""
+        if self._signature_task is None or self._signature_task.done():
+            self._signature_task = asyncio.ensure_future(self._fetch_signature())
+        return self._signature_task
+
+    async def _fetch_signature(self) -> Optional[str]:
+        signature = await self.get_auth_signature()
+        if signature:
+            self._signature = signature
+            self._signature_expires_at = time.monotonic() + self._signature_ttl(signature)
+        return signature
+
+    async def _get_signature(self) -> Optional[str]:
+        """addonSig in cache; se sta per scadere viene rinnovata in background senza bloccare la richiesta."""
+        remaining = self._signature_expires_at - time.monotonic()
+        if self._signature and remaining > 0:
+            if remaining < self.SIGNATURE_REFRESH_MARGIN:
+                self._start_signature_fetch()
+            return self._signature
+        return await asyncio.shield(self._start_signature_fetch())
+
+    async def _refresh_signature(self, stale_signature: str) -> Optional[str]:
+        """
+        Rinnovo forzato dopo una risoluzione fallita. Le risoluzioni concorrenti fallite con la
+        stessa signature condividono un solo ping: chi arriva dopo il rinnovo riceve quella nuova.
+        """
+        if self._signature == stale_signature:
+            self._signature = None
+            self._signature_expires_at = 0.0
+        return await self._get_signature()
+
     async def _resolve_vavoo_link(self, link: str, signature: str) -> Optional[str]:
         headers = {
             "user-agent": "MediaHubMX/2",
@@ -199,11 +258,17 @@ class VavooExtractor:
         if "vavoo.to" not in url:
             raise ExtractorError("Non è un URL Vavoo valido")
 
-        signature = await self.get_auth_signature()
+        signature = await self._get_signature()
         if not signature:
             raise ExtractorError("Fallito ottenere signature autenticazione Vavoo")
 
         resolved_url = await self._resolve_vavoo_link(url, signature)
+        if not resolved_url:
+            # La signature potrebbe essere stata revocata: un solo rinnovo e un nuovo tentativo
+            logger.info("Risoluzione Vavoo fallita, rinnovo della signature")
+            new_signature = await self._refresh_signature(signature)
+            if new_signature and new_signature != signature:
+                resolved_url = await self._resolve_vavoo_link(url, new_signature)
         if not resolved_url:
             raise ExtractorError("Fallito risolvere URL Vavoo")
 
@@ -219,5 +284,7 @@ class VavooExtractor:
         }
 
     async def close(self):
+        if self._signature_task and not self._signature_task.done():
+            self._signature_task.cancel()
         if self.session and not self.session.closed:
             await self.session.close()
@@ -2,12 +2,14 @@ import asyncio
 import logging
 import re
 import json
+import time
 from urllib.parse import urlparse
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 import random
 import aiohttp
 from aiohttp import ClientSession, ClientTimeout, TCPConnector
 from aiohttp_proxy import ProxyConnector
+from utils.extraction_cache import TOKEN_EXPIRY_MARGIN
 
 logger = logging.getLogger(__name__)
 
@@ -15,8 +17,15 @@ class ExtractorError(Exception):
     """Eccezione personalizzata per errori di estrazione."""
     pass
 
+class InertiaVersionError(ExtractorError):
+    """Il sito ha risposto 409: la versione Inertia usata non è più quella corrente."""
+    pass
+
 class VixSrcExtractor:
     """VixSrc URL extractor per risolvere link VixSrc."""
+
+    # Durata in cache della versione Inertia per sito (rinnovata subito se il sito risponde 409)
+    VERSION_TTL = 3600
     
     def __init__(self, request_headers: dict, proxies: list = None):
         self.request_headers = request_headers
@@ -32,6 +41,12 @@ class VixSrcExtractor:
         self._session_lock = asyncio.Lock()
         self.proxies = proxies or []
         self.is_vixsrc = True # Flag per identificare questo estrattore
+        # site_url -> (versione, scadenza monotonic)
+        self._version_cache: Dict[str, Tuple[str, float]] = {}
+        self._version_lock = asyncio.Lock()
+        # url -> (risultato, scadenza unix del token); riusato fino a TOKEN_EXPIRY_MARGIN secondi
+        # prima della scadenza, come la cache risultati dell'app
+        self._stream_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
 
     def _get_random_proxy(self):
         """Restituisce un proxy casuale dalla lista."""
@@ -72,6 +87,8 @@ class VixSrcExtractor:
                 logger.info(f"Tentativo {attempt + 1}/{retries} per URL: {url}")
                 
                 async with session.get(url, headers=final_headers) as response:
+                    if response.status == 409:
+                        raise InertiaVersionError(f"Versione Inertia non più valida per {url}")
                     response.raise_for_status()
                     content = await response.text()
                     
@@ -122,7 +139,11 @@ class VixSrcExtractor:
                     await asyncio.sleep(delay)
                 else:
                     raise ExtractorError(f"Tutti i {retries} tentativi falliti per {url}: {str(e)}")
-                    
+
+            except InertiaVersionError:
+                # Nessun retry con la stessa versione: il chiamante la rinnova
+                raise
+
             except Exception as e:
                 logger.error(f"❌ Errore non di rete tentativo {attempt + 1} per {url}: {str(e)}")
                 if attempt == retries - 1:
@@ -158,6 +179,55 @@ class VixSrcExtractor:
             
         return None
 
+    async def get_version(self, site_url: str, stale: Optional[str] = None) -> str:
+        """Versione Inertia del sito, dalla cache se ancora valida; `stale` è una versione rifiutata dal sito (409)."""
+        async with self._version_lock:
+            cached = self._version_cache.get(site_url)
+            if cached and cached[0] != stale and cached[1] > time.monotonic():
+                return cached[0]
+            version = await self.version(site_url)
+            self._version_cache[site_url] = (version, time.monotonic() + self.VERSION_TTL)
+            logger.info(f"Versione Inertia {site_url}: {version}")
+            return version
+
+    def _get_cached_stream(self, url: str) -> Optional[Dict[str, Any]]:
+        cached = self._stream_cache.get(url)
+        if not cached:
+            return None
+        result, expires = cached
+        if expires - TOKEN_EXPIRY_MARGIN <= time.time():
+            del self._stream_cache[url]
+            return None
+        return {**result, "request_headers": dict(result["request_headers"])}
+
+    def _store_stream(self, url: str, result: Dict[str, Any], expires: str):
+        now = time.time()
+        self._stream_cache = {k: v for k, v in self._stream_cache.items() if v[1] - TOKEN_EXPIRY_MARGIN > now}
+        if expires.isdigit() and int(expires) - TOKEN_EXPIRY_MARGIN > now:
+            self._stream_cache[url] = ({**result, "request_headers": dict(result["request_headers"])}, int(expires))
+
+    async def invalidate_cache_for_url(self, url: str):
+        """Scarta l'URL risolto in cache (es. token rifiutato dal server)."""
+        self._stream_cache.pop(url, None)
+
+    async def _fetch_iframe_page(self, url: str, version: str):
+        """Pagina Inertia del titolo e poi l'iframe del player, con la versione indicata."""
+        inertia_headers = {
+            "x-inertia": "true",
+            "x-inertia-version": version,
+            **self.base_headers
+        }
+        # Prima richiesta con headers Inertia
+        response = await self._make_robust_request(url, headers=inertia_headers)
+
+        # Cerca iframe src
+        iframe_data = await self._parse_html_simple(response.text, "iframe")
+        if not iframe_data or not iframe_data.get("src"):
+            raise ExtractorError("Nessun iframe trovato nella risposta")
+
+        # Seconda richiesta all'iframe
+        return await self._make_robust_request(iframe_data["src"], headers=inertia_headers)
+
     async def version(self, site_url: str) -> str:
         """Ottiene la versione del sito VixSrc parent."""
         base_url = f"{site_url}/request-a-title"
@@ -186,8 +256,14 @@ class VixSrcExtractor:
         else:
             raise ExtractorError("Impossibile trovare dati versione")
 
-    async def extract(self, url: str, **kwargs) -> Dict[str, Any]:
+    async def extract(self, url: str, force_refresh: bool = False, **kwargs) -> Dict[str, Any]:
         """Estrae URL VixSrc."""
+        if not force_refresh:
+            cached = self._get_cached_stream(url)
+            if cached:
+                logger.info(f"URL VixSrc dalla cache (token valido): {url}")
+                return cached
+
         try:
             version = None
             response = None
@@ -205,34 +281,13 @@ class VixSrcExtractor:
             if "iframe" in url:
                 # Gestione URL iframe
                 site_url = url.split("/iframe")[0]
-                version = await self.version(site_url)
-                
-                # Prima richiesta con headers Inertia
-                response = await self._make_robust_request(
-                    url, 
-                    headers={
-                        "x-inertia": "true", 
-                        "x-inertia-version": version,
-                        **self.base_headers
-                    }
-                )
-                
-                # Cerca iframe src
-                iframe_data = await self._parse_html_simple(response.text, "iframe")
-                if iframe_data and iframe_data.get("src"):
-                    iframe_url = iframe_data["src"]
-                    
-                    # Seconda richiesta all'iframe
-                    response = await self._make_robust_request(
-                        iframe_url, 
-                        headers={
-                            "x-inertia": "true", 
-                            "x-inertia-version": version,
-                            **self.base_headers
-                        }
-                    )
-                else:
-                    raise ExtractorError("Nessun iframe trovato nella risposta")
+                version = await self.get_version(site_url)
+                try:
+                    response = await self._fetch_iframe_page(url, version)
+                except InertiaVersionError:
+                    # Il sito ha cambiato versione: la rinnova e riprova una volta
+                    version = await self.get_version(site_url, stale=version)
+                    response = await self._fetch_iframe_page(url, version)
                     
             elif "movie" in url or "tv" in url:
                 # Gestione URL diretti movie/tv
@@ -277,11 +332,13 @@ class VixSrcExtractor:
                 
                 logger.info(f"✅ URL VixSrc estratto con successo: {final_url}")
                 
-                return {
+                result = {
                     "destination_url": final_url,
                     "request_headers": stream_headers,
                     "endpoint_type": self.endpoint_type,
                 }
+                self._store_stream(url, result, expires)
+                return result
                 
             except Exception as e:
                 raise ExtractorError(f"Errore parsing script JavaScript: {e}")
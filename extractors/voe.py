@@ -3,6 +3,8 @@ import random
 import re
 import base64
 import json
+import time
+from typing import Dict, Tuple
 from urllib.parse import urljoin
 from aiohttp import ClientSession, ClientTimeout, TCPConnector
 from aiohttp_proxy import ProxyConnector
@@ -12,7 +14,17 @@ logger = logging.getLogger(__name__)
 class ExtractorError(Exception):
     pass
 
+# Tabelle precalcolate per voe_decode: ROT13 sulle lettere e spostamento di -3 sui caratteri ASCII
+_ROT13 = str.maketrans(
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz',
+    'NOPQRSTUVWXYZABCDEFGHIJKLMnopqrstuvwxyzabcdefghijklm'
+)
+_SHIFT_BACK_3 = {code: code - 3 for code in range(3, 128)}
+
 class VoeExtractor:
+    # Durata in cache delle LUT estratte dallo script esterno (per URL dello script)
+    LUT_CACHE_TTL = 3600
+
     def __init__(self, request_headers: dict, proxies: list = None):
         self.request_headers = request_headers
         self.base_headers = {
@@ -21,6 +33,8 @@ class VoeExtractor:
         self.session = None
         self.endpoint_type = "hls_proxy"
         self.proxies = proxies or []
+        # script_url -> (scadenza, pattern compilato delle LUT)
+        self._lut_cache: Dict[str, Tuple[float, re.Pattern]] = {}
 
     def _get_random_proxy(self):
         return random.choice(self.proxies) if self.proxies else None
@@ -56,15 +70,16 @@ class VoeExtractor:
             raise ExtractorError("VOE: unable to locate obfuscated payload or external script URL")
 
         script_url = urljoin(url, code_and_script_match.group(2))
-        async with session.get(script_url) as script_response:
-            script_text = await script_response.text()
-
-        luts_pattern = r"(\[(?:'\W{2}'[,\]]){1,9})"
-        luts_match = re.search(luts_pattern, script_text, re.DOTALL)
-        if not luts_match:
-            raise ExtractorError("VOE: unable to locate LUTs in external script")
-
-        data = self.voe_decode(code_and_script_match.group(1), luts_match.group(1))
+        luts = await self._get_luts(session, script_url)
+        try:
+            data = self.voe_decode(code_and_script_match.group(1), luts)
+        except ValueError:
+            # Script ruotato con LUT diverse sotto lo stesso URL: le riscarica una volta
+            luts = await self._get_luts(session, script_url, force_refresh=True)
+            try:
+                data = self.voe_decode(code_and_script_match.group(1), luts)
+            except ValueError as e:
+                raise ExtractorError(f"VOE: failed to decode payload: {e}")
 
         final_url = data.get('source')
         if not final_url:
@@ -77,21 +92,37 @@ class VoeExtractor:
             "endpoint_type": "hls_proxy",
         }
 
+    async def _get_luts(self, session, script_url: str, force_refresh: bool = False) -> re.Pattern:
+        """LUT dello script esterno, già compilate; lo script viene scaricato solo se non in cache o scaduto."""
+        cached = self._lut_cache.get(script_url)
+        if cached and not force_refresh and cached[0] > time.monotonic():
+            return cached[1]
+
+        async with session.get(script_url) as script_response:
+            script_text = await script_response.text()
+
+        luts_pattern = r"(\[(?:'\W{2}'[,\]]){1,9})"
+        luts_match = re.search(luts_pattern, script_text, re.DOTALL)
+        if not luts_match:
+            raise ExtractorError("VOE: unable to locate LUTs in external script")
+
+        luts = self.compile_luts(luts_match.group(1))
+        now = time.monotonic()
+        self._lut_cache = {k: v for k, v in self._lut_cache.items() if v[0] > now}
+        self._lut_cache[script_url] = (now + self.LUT_CACHE_TTL, luts)
+        return luts
+
+    @staticmethod
+    def compile_luts(luts: str) -> re.Pattern:
+        """Unica alternanza regex con tutte le sequenze da rimuovere (es. "['@$','^^']")."""
+        return re.compile('|'.join(re.escape(lut) for lut in luts[2:-2].split("','")))
+
     @staticmethod
-    def voe_decode(ct: str, luts: str) -> dict:
-        lut = [''.join([('\\' + x) if x in '.*+?^${}()|[]\\' else x for x in i]) for i in luts[2:-2].split("','")]
-        txt = ''
-        for i in ct:
-            x = ord(i)
-            if 64 < x < 91:
-                x = (x - 52) % 26 + 65
-            elif 96 < x < 123:
-                x = (x - 84) % 26 + 97
-            txt += chr(x)
-        for i in lut:
-            txt = re.sub(i, '', txt)
-        ct = base64.b64decode(txt).decode('utf-8')
-        txt = ''.join([chr(ord(i) - 3) for i in ct])
+    def voe_decode(ct: str, luts) -> dict:
+        if isinstance(luts, str):
+            luts = VoeExtractor.compile_luts(luts)
+        txt = luts.sub('', ct.translate(_ROT13))
+        txt = base64.b64decode(txt).decode('utf-8').translate(_SHIFT_BACK_3)
         txt = base64.b64decode(txt[::-1]).decode('utf-8')
         return json.loads(txt)
 
@@ -0,0 +1,442 @@
+import logging
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from Crypto.Cipher import AES
+
+logger = logging.getLogger(__name__)
+
+# Box rimossi dall'output: informazioni di cifratura non più valide dopo la decrittazione
+_DROPPED_BOXES = {b'senc', b'saiz', b'saio', b'pssh', b'sidx', b'sbgp', b'sgpd'}
+# uuid PIFF Sample Encryption (equivalente a senc nei contenuti Smooth/PlayReady)
+_PIFF_SENC_UUID = bytes.fromhex('a2394f525a9b4f14a2446c427c648df4')
+_INIT_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'mvex'}
+_SUPPORTED_SCHEMES = {b'cenc', b'piff'}
+
+
+def _box_header(buf, offset: int = 0) -> Optional[Tuple[int, bytes, int]]:
+    """(dimensione totale, tipo, lunghezza header) del box in `offset`, None se l'header non è completo."""
+    if len(buf) - offset < 8:
+        return None
+    size, box_type = struct.unpack_from('>I4s', buf, offset)
+    header_len = 8
+    if size == 1:
+        if len(buf) - offset < 16:
+            return None
+        size = struct.unpack_from('>Q', buf, offset + 8)[0]
+        header_len = 16
+    elif size == 0:
+        size = -1  # fino alla fine del file
+    if box_type == b'uuid':
+        if len(buf) - offset < header_len + 16:
+            return None
+        header_len += 16
+    return size, box_type, header_len
+
+
+def _iter_boxes(data: bytes):
+    """Itera (tipo, header, corpo) dei box contenuti in `data`."""
+    offset = 0
+    while offset + 8 <= len(data):
+        size, box_type, header_len = _box_header(data, offset)
+        if size < 0:
+            size = len(data) - offset
+        if size < header_len:
+            raise ValueError(f"Box {box_type!r} con dimensione non valida")
+        yield box_type, data[offset:offset + header_len], data[offset + header_len:offset + size]
+        offset += size
+
+
+def _box_size(box_type: bytes, body: bytes) -> int:
+    return (24 if box_type == b'uuid' else 8) + len(body)
+
+
+def _make_box(box_type: bytes, body: bytes, header: bytes = b'') -> bytes:
+    extra = header[8:] if box_type == b'uuid' else b''
+    return struct.pack('>I4s', 8 + len(extra) + len(body), box_type) + extra + body
+
+
+class _TrackInfo:
+    __slots__ = ('iv_size', 'constant_iv', 'default_size', 'scheme')
+
+    def __init__(self):
+        self.iv_size = 8
+        self.constant_iv = b''
+        self.default_size = 0
+        self.scheme = None
+
+
+class CENCStreamDecrypter:
+    """
+    Decrittazione CENC (AES-CTR, schema 'cenc') di un flusso fMP4, box per box.
+    I dati arrivano a pezzi con `feed()`; ogni moof viene riscritto senza i box di cifratura
+    appena è completo e i campioni di mdat vengono decrittati (con le info di senc)
+    man mano che arrivano, così l'output può essere inviato al client senza attendere
+    la fine del download. L'init (moov) viene ripulito da sinf/pssh e i sample entry
+    encv/enca tornano al formato originale indicato in frma.
+    """
+
+    def __init__(self, key_id: str, key: str):
+        self.key_id = bytes.fromhex(key_id.replace('-', ''))
+        self.key = bytes.fromhex(key)
+
+        self._tracks: Dict[int, _TrackInfo] = {}
+        self._buffer = bytearray()
+        self._position = 0  # posizione assoluta nel flusso in ingresso del primo byte di _buffer
+        # Campioni dell'ultimo moof: (relativo al payload mdat?, offset, dimensione, iv, subsample).
+        # Senza data_offset la posizione è nota solo quando arriva l'header del mdat.
+        self._moof_samples: List[Tuple[bool, int, int, bytes, List[Tuple[int, int]]]] = []
+        # Campioni in attesa nel mdat corrente: (posizione assoluta, dimensione, iv, subsample)
+        self._pending_samples: List[Tuple[int, int, bytes, List[Tuple[int, int]]]] = []
+        self._mdat_remaining = 0  # byte di payload mdat ancora da ricevere (-1 = fino a EOF)
+        self._mdat_position = 0  # posizione assoluta del prossimo byte di payload mdat
+        self._in_mdat = False
+        self._after_moof = False  # tra un moof e il suo mdat
+
+    # --- Init / moov ---
+
+    @property
+    def scheme(self) -> Optional[bytes]:
+        schemes = {t.scheme for t in self._tracks.values() if t.scheme}
+        return schemes.pop() if len(schemes) == 1 else (b'mixed' if schemes else None)
+
+    @property
+    def supported(self) -> bool:
+        """True se le tracce cifrate usano uno schema decrittabile in streaming (AES-CTR)."""
+        scheme = self.scheme
+        return scheme is None or scheme in _SUPPORTED_SCHEMES
+
+    def _rewrite_init_box(self, box_type: bytes, header: bytes, body: bytes, track_id: Optional[int] = None) -> bytes:
+        if box_type == b'pssh':
+            return b''
+        if box_type == b'trak':
+            for child_type, _, child_body in _iter_boxes(body):
+                if child_type == b'tkhd':
+                    version = child_body[0]
+                    track_id = struct.unpack_from('>I', child_body, 20 if version == 1 else 12)[0]
+                    break
+        if box_type == b'trex':
+            track_id, _, _, default_size = struct.unpack_from('>IIII', body, 4)
+            self._tracks.setdefault(track_id, _TrackInfo()).default_size = default_size
+            return _make_box(box_type, body, header)
+        if box_type in _INIT_CONTAINERS:
+            return _make_box(box_type, b''.join(
+                self._rewrite_init_box(t, h, b, track_id) for t, h, b in _iter_boxes(body)
+            ), header)
+        if box_type == b'stsd':
+            entries = b''.join(self._rewrite_sample_entry(t, h, b, track_id) for t, h, b in _iter_boxes(body[8:]))
+            return _make_box(box_type, body[:8] + entries, header)
+        return _make_box(box_type, body, header)
+
+    def _rewrite_sample_entry(self, box_type: bytes, header: bytes, body: bytes, track_id: Optional[int]) -> bytes:
+        if box_type not in (b'encv', b'enca'):
+            return _make_box(box_type, body, header)
+
+        if box_type == b'encv':
+            fields_len = 78
+        else:
+            sound_version = struct.unpack_from('>H', body, 8)[0]
+            fields_len = 28 + {1: 16, 2: 36}.get(sound_version, 0)
+
+        original_format = box_type
+        info = self._tracks.setdefault(track_id or 0, _TrackInfo())
+        children = []
+        for child_type, child_header, child_body in _iter_boxes(body[fields_len:]):
+            if child_type != b'sinf':
+                children.append(_make_box(child_type, child_body, child_header))
+                continue
+            for sinf_type, _, sinf_body in _iter_boxes(child_body):
+                if sinf_type == b'frma':
+                    original_format = sinf_body[:4]
+                elif sinf_type == b'schm':
+                    info.scheme = sinf_body[4:8]
+                elif sinf_type == b'schi':
+                    for schi_type, _, schi_body in _iter_boxes(sinf_body):
+                        if schi_type == b'tenc':
+                            self._parse_tenc(schi_body, info)
+        return _make_box(original_format, body[:fields_len] + b''.join(children))
+
+    @staticmethod
+    def _parse_tenc(body: bytes, info: _TrackInfo):
+        is_protected, iv_size = body[6], body[7]
+        info.iv_size = iv_size
+        if is_protected and iv_size == 0:
+            constant_iv_size = body[24]
+            info.constant_iv = body[25:25 + constant_iv_size]
+
+    # --- Frammenti ---
+
+    def _process_moof(self, header: bytes, body: bytes, moof_start: int) -> bytes:
+        """Riscrive il moof senza box di cifratura e prepara la lista dei campioni da decrittare."""
+        moof_size = len(header) + len(body)
+        children = []  # (tipo, header, corpo) oppure ('traf', base nel moof?, [figli])
+        samples = []
+        # Fine dei dati della traf precedente: (relativo al payload mdat?, offset); None prima della prima traf
+        running = None
+
+        for box_type, child_header, child_body in _iter_boxes(body):
+            if box_type != b'traf':
+                if box_type not in _DROPPED_BOXES:
+                    children.append((box_type, child_header, child_body))
+                continue
+
+            traf_children = list(_iter_boxes(child_body))
+            tfhd = next((b for t, _, b in traf_children if t == b'tfhd'), None)
+            if tfhd is None:
+                raise ValueError("traf senza tfhd")
+            tfhd_flags = int.from_bytes(tfhd[1:4], 'big')
+            if tfhd_flags & 0x01:
+                raise ValueError("base-data-offset assoluto non supportato in streaming")
+            track_id = struct.unpack_from('>I', tfhd, 4)[0]
+            info = self._tracks.get(track_id) or self._tracks.get(0) or _TrackInfo()
+
+            default_size = info.default_size
+            if tfhd_flags & 0x10:
+                pos = 8 + (4 if tfhd_flags & 0x02 else 0) + (4 if tfhd_flags & 0x08 else 0)
+                default_size = struct.unpack_from('>I', tfhd, pos)[0]
+
+            sample_ivs = None
+            for box_type, box_header, box_body in traf_children:
+                if box_type == b'senc' or self._is_piff_senc(box_type, box_header):
+                    sample_ivs = self._parse_senc(box_body, info)
+
+            # Base dei data_offset: l'inizio del moof per la prima traf (o con default-base-is-moof),
+            # altrimenti la fine dei dati della traf precedente
+            base_is_moof = running is None or bool(tfhd_flags & 0x20000)
+            base = (False, moof_start) if base_is_moof else running
+
+            sample_index = 0
+            for box_type, _, box_body in traf_children:
+                if box_type != b'trun':
+                    continue
+                data_offset, sizes = self._parse_trun(box_body, default_size)
+                if data_offset is not None:
+                    running = (base[0], base[1] + data_offset)
+                elif running is None:
+                    # Nessun data_offset: i campioni partono dall'inizio del payload del mdat
+                    running = (True, 0)
+                for size in sizes:
+                    if sample_ivs is not None and sample_index < len(sample_ivs):
+                        iv, subsamples = sample_ivs[sample_index]
+                        samples.append((running[0], running[1], size, iv, subsamples))
+                    sample_index += 1
+                    running = (running[0], running[1] + size)
+
+            children.append((b'traf', base_is_moof, [
+                (t, h, b) for t, h, b in traf_children
+                if t not in _DROPPED_BOXES and not self._is_piff_senc(t, h)
+            ]))
+
+        # Il moof si accorcia: i data_offset dei trun (relativi all'inizio del moof) vanno corretti
+        new_size = 8
+        for box_type, child_header, child_body in children:
+            if box_type == b'traf':
+                new_size += 8 + sum(_box_size(t, b) for t, _, b in child_body)
+            else:
+                new_size += _box_size(box_type, child_body)
+        delta = moof_size - new_size
+
+        out = []
+        for box_type, child_header, child_body in children:
+            if box_type == b'traf':
+                # Solo gli offset relativi al moof cambiano; quelli relativi alla traf precedente no
+                traf_delta = delta if child_header else 0
+                out.append(_make_box(b'traf', b''.join(
+                    _make_box(t, self._shift_trun(b, traf_delta) if t == b'trun' else b, h) for t, h, b in child_body
+                )))
+            else:
+                out.append(_make_box(box_type, child_body, child_header))
+
+        self._moof_samples = samples
+        return _make_box(b'moof', b''.join(out))
+
+    @staticmethod
+    def _is_piff_senc(box_type: bytes, header: bytes) -> bool:
+        return box_type == b'uuid' and header[-16:] == _PIFF_SENC_UUID
+
+    @staticmethod
+    def _parse_trun(body: bytes, default_size: int) -> Tuple[Optional[int], List[int]]:
+        flags = int.from_bytes(body[1:4], 'big')
+        sample_count = struct.unpack_from('>I', body, 4)[0]
+        pos = 8
+        data_offset = None
+        if flags & 0x01:
+            data_offset = struct.unpack_from('>i', body, pos)[0]
+            pos += 4
+        if flags & 0x04:
+            pos += 4
+        sizes = []
+        for _ in range(sample_count):
+            if flags & 0x100:
+                pos += 4
+            if flags & 0x200:
+                sizes.append(struct.unpack_from('>I', body, pos)[0])
+                pos += 4
+            else:
+                sizes.append(default_size)
+            if flags & 0x400:
+                pos += 4
+            if flags & 0x800:
+                pos += 4
+        return data_offset, sizes
+
+    @staticmethod
+    def _shift_trun(body: bytes, delta: int) -> bytes:
+        flags = int.from_bytes(body[1:4], 'big')
+        if not delta or not flags & 0x01:
+            return body
+        data_offset = struct.unpack_from('>i', body, 8)[0]
+        return body[:8] + struct.pack('>i', data_offset - delta) + body[12:]
+
+    @staticmethod
+    def _parse_senc(body: bytes, info: _TrackInfo) -> List[Tuple[bytes, List[Tuple[int, int]]]]:
+        flags = int.from_bytes(body[1:4], 'big')
+        pos = 4
+        iv_size = info.iv_size
+        if flags & 0x01:
+            # PIFF: AlgorithmID(3) + IV_size(1) + KID(16) sovrascrivono i valori di tenc
+            iv_size = body[pos + 3]
+            pos += 20
+        sample_count = struct.unpack_from('>I', body, pos)[0]
+        pos += 4
+        samples = []
+        for _ in range(sample_count):
+            if iv_size:
+                iv = body[pos:pos + iv_size]
+                pos += iv_size
+            else:
+                iv = info.constant_iv
+            subsamples = []
+            if flags & 0x02:
+                count = struct.unpack_from('>H', body, pos)[0]
+                pos += 2
+                for _ in range(count):
+                    subsamples.append(struct.unpack_from('>HI', body, pos))
+                    pos += 6
+            samples.append((iv, subsamples))
+        return samples
+
+    def _decrypt_sample(self, data: bytes, iv: bytes, subsamples: List[Tuple[int, int]]) -> bytes:
+        cipher = AES.new(self.key, AES.MODE_CTR, nonce=b'', initial_value=iv.ljust(16, b'\0'))
+        if not subsamples:
+            return cipher.decrypt(data)
+        out = bytearray()
+        pos = 0
+        for clear, protected in subsamples:
+            out += data[pos:pos + clear]
+            pos += clear
+            out += cipher.decrypt(data[pos:pos + protected])
+            pos += protected
+        out += data[pos:]
+        return bytes(out)
+
+    # --- Flusso ---
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Aggiunge byte in ingresso e restituisce i pezzi di output già pronti."""
+        self._buffer += data
+        output = []
+        while True:
+            if self._in_mdat:
+                if not self._drain_mdat(output):
+                    break
+                continue
+
+            parsed = _box_header(self._buffer)
+            if parsed is None:
+                break
+            size, box_type, header_len = parsed
+
+            if box_type == b'mdat':
+                # L'header resta invariato: la decrittazione non cambia la dimensione dei campioni
+                output.append(bytes(self._buffer[:header_len]))
+                self._mdat_remaining = size - header_len if size >= 0 else -1
+                self._consume(header_len)
+                self._mdat_position = self._position
+                self._pending_samples = sorted(
+                    (self._position + offset if in_mdat else offset, sample_size, iv, subsamples)
+                    for in_mdat, offset, sample_size, iv, subsamples in self._moof_samples
+                )
+                self._moof_samples = []
+                self._after_moof = False
+                self._in_mdat = True
+                continue
+
+            if size < 0 or len(self._buffer) < size:
+                break
+            box_start = self._position
+            header = bytes(self._buffer[:header_len])
+            body = bytes(self._buffer[header_len:size])
+            self._consume(size)
+
+            if box_type == b'moov':
+                output.append(self._rewrite_init_box(box_type, header, body))
+            elif box_type == b'moof':
+                output.append(self._process_moof(header, body, box_start))
+                self._after_moof = True
+            elif box_type not in _DROPPED_BOXES or self._after_moof:
+                # Tra moof e mdat nessun box viene tolto: sposterebbe i dati rispetto ai data_offset
+                output.append(header + body)
+        return output
+
+    def _drain_mdat(self, output: List[bytes]) -> bool:
+        """Emette i campioni completi del mdat corrente. False se servono altri byte."""
+        available = len(self._buffer)
+        if self._mdat_remaining >= 0:
+            available = min(available, self._mdat_remaining)
+
+        progressed = False
+        while self._pending_samples and available:
+            offset, size, iv, subsamples = self._pending_samples[0]
+            if self._mdat_position > offset:
+                raise ValueError(
+                    f"Campione a {offset} fuori dal mdat corrente (posizione {self._mdat_position})"
+                )
+            if self._mdat_position < offset:
+                # Byte prima del campione (non cifrati): inoltrati così come sono
+                gap = min(offset - self._mdat_position, available)
+                self._emit_mdat(output, bytes(self._buffer[:gap]), gap)
+                available -= gap
+                progressed = True
+                continue
+            if available < size:
+                break
+            sample = bytes(self._buffer[:size])
+            self._emit_mdat(output, self._decrypt_sample(sample, iv, subsamples), size)
+            self._pending_samples.pop(0)
+            available -= size
+            progressed = True
+
+        if not self._pending_samples and available:
+            # Resto del mdat senza campioni cifrati
+            self._emit_mdat(output, bytes(self._buffer[:available]), available)
+            available = 0
+            progressed = True
+
+        if self._mdat_remaining == 0:
+            if self._pending_samples:
+                raise ValueError(f"{len(self._pending_samples)} campioni cifrati oltre la fine del mdat")
+            self._in_mdat = False
+            return True
+        return progressed and bool(self._buffer)
+
+    def _emit_mdat(self, output: List[bytes], data: bytes, consumed: int):
+        output.append(data)
+        self._consume(consumed)
+        self._mdat_position += consumed
+        if self._mdat_remaining > 0:
+            self._mdat_remaining -= consumed
+
+    def _consume(self, count: int):
+        del self._buffer[:count]
+        self._position += count
+
+    def close(self) -> List[bytes]:
+        """Fine del flusso: un mdat 'fino a EOF' si chiude qui, altri byte residui sono un errore."""
+        output = []
+        if self._in_mdat and self._mdat_remaining < 0:
+            self._mdat_remaining = len(self._buffer)
+            self._drain_mdat(output)
+        if self._buffer or (self._in_mdat and self._mdat_remaining):
+            raise ValueError("Segmento fMP4 troncato")
+        return output
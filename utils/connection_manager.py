@@ -0,0 +1,147 @@
+import logging
+import ssl
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from aiohttp_proxy import ProxyConnector
+
+logger = logging.getLogger(__name__)
+
+
+def mask_proxy(proxy: Optional[str]) -> Optional[str]:
+    """Nasconde le credenziali di un URL proxy (user:pass@host -> ***@host)."""
+    if not proxy:
+        return proxy
+    parsed = urlparse(proxy)
+    if parsed.username or parsed.password:
+        host = parsed.hostname or ''
+        if parsed.port:
+            host += f":{parsed.port}"
+        return f"{parsed.scheme}://***@{host}"
+    return proxy
+
+
+class UpstreamConnectionManager:
+    """
+    Pool condiviso di sessioni HTTP verso le sorgenti upstream.
+    Mantiene una ClientSession keep-alive per ogni coppia (host upstream, proxy in uscita),
+    così manifest, segmenti, chiavi e licenze riutilizzano le connessioni TCP/TLS già aperte
+    invece di rifare l'handshake ad ogni richiesta.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, keepalive_timeout: int = 60, idle_timeout: int = 300):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.idle_timeout = idle_timeout
+
+        # Un solo contesto TLS per tutti i connector (la creazione è costosa)
+        self._ssl_context = ssl.create_default_context()
+
+        self._pools: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+        self._last_sweep = time.monotonic()
+        self.sessions_created = 0
+        self.sessions_closed = 0
+
+    @staticmethod
+    def _pool_key(url: str, proxy: Optional[str]) -> Tuple[str, Optional[str]]:
+        parsed = urlparse(url)
+        return (f"{parsed.scheme}://{parsed.netloc.lower()}", proxy)
+
+    def _create_session(self, proxy: Optional[str]) -> ClientSession:
+        connector_kwargs = {
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'keepalive_timeout': self.keepalive_timeout,
+            'enable_cleanup_closed': True,
+            'force_close': False,
+            'use_dns_cache': True,
+            'ttl_dns_cache': 300,
+            'ssl': self._ssl_context,
+        }
+        if proxy:
+            connector = ProxyConnector.from_url(proxy, **connector_kwargs)
+        else:
+            connector = TCPConnector(**connector_kwargs)
+
+        return ClientSession(
+            connector=connector,
+            timeout=ClientTimeout(total=60, connect=30)
+        )
+
+    async def get_session(self, url: str, proxy: Optional[str] = None) -> ClientSession:
+        """Restituisce la sessione pooled per l'host di `url` tramite `proxy` (creandola se serve)."""
+        key = self._pool_key(url, proxy)
+        pool = self._pools.get(key)
+
+        if pool is None or pool['session'].closed:
+            pool = {
+                'session': self._create_session(proxy),
+                'created_at': time.monotonic(),
+                'last_used': time.monotonic(),
+                'requests': 0,
+            }
+            self._pools[key] = pool
+            self.sessions_created += 1
+            logger.info(f"🔌 Nuovo pool upstream per {key[0]} (proxy: {mask_proxy(proxy) or 'diretto'})")
+
+        pool['requests'] += 1
+        pool['last_used'] = time.monotonic()
+
+        await self._sweep_idle(exclude=key)
+        return pool['session']
+
+    async def _sweep_idle(self, exclude=None):
+        """Chiude le sessioni inutilizzate da più di `idle_timeout` secondi (al massimo una volta al minuto)."""
+        now = time.monotonic()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+
+        for key in list(self._pools.keys()):
+            if key == exclude:
+                continue
+            pool = self._pools[key]
+            if now - pool['last_used'] > self.idle_timeout:
+                del self._pools[key]
+                await self._close_session(pool['session'])
+                logger.info(f"🧹 Pool upstream inattivo chiuso: {key[0]}")
+
+    async def _close_session(self, session: ClientSession):
+        try:
+            if not session.closed:
+                await session.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Errore chiusura sessione upstream: {e}")
+        self.sessions_closed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiche dei pool (esposte su /api/info)."""
+        now = time.monotonic()
+        upstreams = []
+        for (host, proxy), pool in self._pools.items():
+            upstreams.append({
+                "host": host,
+                "proxy": mask_proxy(proxy),
+                "requests": pool['requests'],
+                "age_seconds": int(now - pool['created_at']),
+                "idle_seconds": int(now - pool['last_used']),
+            })
+        return {
+            "pools": len(self._pools),
+            "sessions_created": self.sessions_created,
+            "sessions_closed": self.sessions_closed,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "upstreams": upstreams,
+        }
+
+    async def close(self):
+        """Chiude tutte le sessioni del pool."""
+        pools = list(self._pools.values())
+        self._pools.clear()
+        for pool in pools:
+            await self._close_session(pool['session'])
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from utils.hls_aes import decrypt_aes128_segment
+
+logger = logging.getLogger(__name__)
+
+
+def _write_shared(data: bytes) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    shm.buf[:len(data)] = data
+    return shm
+
+
+def _read_shared(name: str, size: int, unlink: bool = False) -> bytes:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def _unlink_abandoned_result(future):
+    """Done-callback per un risultato che nessuno leggerà più (chiamante annullato): libera il blocco condiviso."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    out_name, _ = future.result()
+    try:
+        shm = shared_memory.SharedMemory(name=out_name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _decrypt_in_worker(func: Callable, shm_name: str, sizes: Sequence[int], args: tuple):
+    """
+    Eseguita nel processo worker: legge i blocchi di byte (lunghezze `sizes`, uno dopo l'altro)
+    dalla memoria condivisa del processo principale, chiama `func(*blocchi, *args)` e scrive il
+    risultato in un nuovo blocco condiviso (nome, lunghezza).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buf = shm.buf
+        blobs, offset = [], 0
+        for size in sizes:
+            blobs.append(bytes(buf[offset:offset + size]))
+            offset += size
+        del buf
+    finally:
+        shm.close()
+
+    decrypted = func(*blobs, *args)
+    out = _write_shared(decrypted)
+    try:
+        return out.name, len(decrypted)
+    finally:
+        out.close()
+
+
+class DecryptPool:
+    """
+    Esegue la decrittazione (CENC con la funzione del pool, HLS AES-128) fuori dall'event loop.
+    - `process`: ProcessPoolExecutor; i byte passano tramite memoria condivisa invece che via pickle.
+    - `thread`: ThreadPoolExecutor (utile solo se la decrittazione rilascia il GIL).
+    - `inline`: comportamento originale, sul loop.
+    Il numero di decrittazioni in corso è limitato da `max_in_flight`: le altre restano in coda.
+    """
+
+    def __init__(self, func: Callable, mode: str = 'process', workers: int = 2, max_in_flight: Optional[int] = None):
+        self.func = func
+        self.mode = mode if mode in ('process', 'thread', 'inline') else 'process'
+        self.workers = max(1, workers)
+        self.max_in_flight = max_in_flight or self.workers * 2
+
+        # Executor creato alla prima richiesta: ogni worker gunicorn ha il suo
+        self._executor = None
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.total_wait_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.mode == 'process':
+                # Niente fork: il processo del proxy ha thread e loop asyncio attivi, che un figlio
+                # creato con fork erediterebbe in uno stato incoerente (lock presi, socket aperti)
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(start_method)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='decrypt')
+            logger.info(f"🔓 Pool decrittazione avviato ({self.mode}, {self.workers} worker, max {self.max_in_flight} in corso)")
+        return self._executor
+
+    async def decrypt(self, init_content: bytes, segment_content: bytes, key_id: str, key: str) -> bytes:
+        """Decritta un segmento CENC con la funzione del pool."""
+        return await self._submit(self.func, (init_content, segment_content), (key_id, key))
+
+    async def decrypt_aes128(self, segment_content: bytes, key: bytes, iv: bytes) -> bytes:
+        """Decritta un segmento HLS AES-128 (vedi utils.hls_aes.decrypt_aes128_segment)."""
+        return await self._submit(decrypt_aes128_segment, (segment_content,), (key, iv))
+
+    async def _submit(self, func: Callable, blobs: Sequence[bytes], args: tuple) -> bytes:
+        """
+        Chiama `func(*blobs, *args)` rispettando il limite di decrittazioni in corso. I `blobs`
+        (segmenti) arrivano ai processi worker tramite memoria condivisa, gli `args` via pickle;
+        `func` deve essere importabile dai processi worker.
+        """
+        queued_at = time.monotonic()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        started_at = time.monotonic()
+        self.total_wait_seconds += started_at - queued_at
+        try:
+            result = await self._run(func, blobs, args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+        elapsed = time.monotonic() - started_at
+        self.completed += 1
+        self.total_seconds += elapsed
+        self.last_seconds = elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        return result
+
+    async def _run(self, func: Callable, blobs: Sequence[bytes], args: tuple) -> bytes:
+        if self.mode == 'inline':
+            return func(*blobs, *args)
+
+        loop = asyncio.get_running_loop()
+        if self.mode == 'thread':
+            return await loop.run_in_executor(self._get_executor(), func, *blobs, *args)
+
+        # Tutti i blocchi (es. init e segmento) in un unico blocco condiviso: il worker li legge senza passare dalla pipe
+        sizes = [len(blob) for blob in blobs]
+        shm = shared_memory.SharedMemory(create=True, size=max(sum(sizes), 1))
+        try:
+            offset = 0
+            for blob, size in zip(blobs, sizes):
+                shm.buf[offset:offset + size] = blob
+                offset += size
+            future = self._get_executor().submit(_decrypt_in_worker, func, shm.name, sizes, args)
+            try:
+                out_name, out_len = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # Il worker può aver già creato il blocco di output: lo libera appena il risultato
+                # è disponibile (subito, se lo è già), altrimenti resterebbe in /dev/shm
+                future.add_done_callback(_unlink_abandoned_result)
+                raise
+            except BrokenProcessPool:
+                # Un worker è morto (es. OOM): ricrea il pool alla prossima richiesta
+                self._executor = None
+                raise
+            return _read_shared(out_name, out_len, unlink=True)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_decrypt_ms": round(self.total_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+            "last_decrypt_ms": round(self.last_seconds * 1000, 1),
+            "max_decrypt_ms": round(self.max_seconds * 1000, 1),
+            "avg_queue_wait_ms": round(self.total_wait_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+        }
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DomainHealthProber:
+    """
+    Controllo periodico in background di un insieme di domini (es. domini base e host iframe DLHD).
+    Per ogni dominio tiene latenza e tasso di errore come medie mobili esponenziali; `best()` e
+    `rank()` rispondono subito con lo stato corrente, senza mai attendere una richiesta di rete.
+    `probe(url)` restituisce l'URL effettivo (es. dopo i redirect) oppure solleva un'eccezione.
+    """
+
+    def __init__(self, probe: Callable[[str], Awaitable[Optional[str]]], targets: Iterable[str] = (),
+                 interval: float = 300, alpha: float = 0.3, name: str = 'domini'):
+        self.probe = probe
+        self.interval = interval
+        self.alpha = alpha
+        self.name = name
+
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._first_round = asyncio.Event()
+        for target in targets:
+            self.add(target)
+
+    def add(self, target: str):
+        """Aggiunge un dominio da controllare (dal prossimo giro)."""
+        if target and target not in self._stats:
+            self._stats[target] = {
+                'resolved': None, 'latency_ms': None, 'failure_rate': 0.0,
+                'checks': 0, 'failures': 0, 'healthy': None, 'last_error': None, 'last_check': None,
+            }
+
+    def start(self):
+        """Avvia i controlli periodici (con interval <= 0 viene eseguito un solo giro)."""
+        if self._task is None or (self._task.done() and self.interval > 0):
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def ready(self, timeout: float):
+        """Attende (al massimo `timeout` secondi) la fine del primo giro di controlli."""
+        self.start()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._first_round.wait()), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _loop(self):
+        while True:
+            await self.probe_all()
+            self._first_round.set()
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self):
+        targets = list(self._stats)
+        results = await asyncio.gather(*(self._probe_one(t) for t in targets), return_exceptions=True)
+        healthy = sum(1 for r in results if r is True)
+        logger.info(f"🩺 Controllo {self.name}: {healthy}/{len(targets)} raggiungibili, migliore: {self.best()}")
+
+    async def _probe_one(self, target: str) -> bool:
+        stats = self._stats[target]
+        started_at = time.monotonic()
+        try:
+            resolved = await self.probe(target)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record(stats, None, str(e) or type(e).__name__)
+            return False
+        self._record(stats, (time.monotonic() - started_at) * 1000, None, resolved or target)
+        return True
+
+    def _record(self, stats: Dict[str, Any], latency_ms: Optional[float], error: Optional[str], resolved: Optional[str] = None):
+        stats['checks'] += 1
+        stats['last_check'] = time.time()
+        stats['healthy'] = error is None
+        stats['last_error'] = error
+        failed = 1.0 if error else 0.0
+        stats['failure_rate'] = failed if stats['checks'] == 1 else (1 - self.alpha) * stats['failure_rate'] + self.alpha * failed
+        if error:
+            stats['failures'] += 1
+            return
+        stats['resolved'] = resolved
+        previous = stats['latency_ms']
+        stats['latency_ms'] = latency_ms if previous is None else (1 - self.alpha) * previous + self.alpha * latency_ms
+
+    def _score(self, target: str):
+        stats = self._stats.get(target)
+        if not stats or stats['healthy'] is None:
+            return (1, 0.0)  # mai controllato
+        if not stats['healthy']:
+            return (2, stats['failure_rate'])
+        # Latenza penalizzata dagli errori recenti
+        return (0, stats['latency_ms'] * (1 + 4 * stats['failure_rate']))
+
+    def rank(self, targets: Iterable[str]) -> List[str]:
+        """Ordina i domini: raggiungibili per latenza, poi mai controllati, infine quelli in errore (ordine stabile)."""
+        return sorted(targets, key=self._score)
+
+    def health(self, target: str) -> Optional[bool]:
+        stats = self._stats.get(target)
+        return stats['healthy'] if stats else None
+
+    def best(self) -> Optional[str]:
+        """URL effettivo del dominio raggiungibile migliore, None se nessuno lo è (o non ancora controllato)."""
+        ranked = self.rank(self._stats)
+        if ranked and self._stats[ranked[0]]['healthy']:
+            return self._stats[ranked[0]]['resolved']
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "best": self.best(),
+            "targets": {
+                target: {
+                    "healthy": stats['healthy'],
+                    "latency_ms": round(stats['latency_ms'], 1) if stats['latency_ms'] is not None else None,
+                    "failure_rate": round(stats['failure_rate'], 3),
+                    "checks": stats['checks'],
+                    "failures": stats['failures'],
+                    "last_error": stats['last_error'],
+                }
+                for target, stats in self._stats.items()
+            },
+        }
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Parametri dell'URL risolto che indicano la scadenza del token (timestamp unix)
+_EXPIRY_PARAMS = ('expires', 'expire', 'exp', 'e', 'validto', 'valid_to')
+
+# Secondi prima della scadenza del token oltre i quali un URL risolto non va più riutilizzato
+# (usato anche dalle cache interne degli estrattori, es. VixSrc)
+TOKEN_EXPIRY_MARGIN = 30
+
+
+def normalize_url(url: str) -> str:
+    """Forma canonica dell'URL di input: schema/host minuscoli, senza frammento, query ordinata."""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """Timestamp unix di scadenza indicato nell'URL risolto (es. VixSrc `expires`, Mixdrop `e`), se presente."""
+    try:
+        params = dict(parse_qsl(urlsplit(url).query))
+    except ValueError:
+        return None
+    for name in _EXPIRY_PARAMS:
+        value = params.get(name, '')
+        if value.isdigit():
+            expiry = int(value)
+            if expiry > 10 ** 12:  # millisecondi
+                expiry //= 1000
+            # Solo timestamp plausibili (dopo il 2001): evita di scambiare altri parametri numerici per scadenze
+            if expiry > 10 ** 9:
+                return float(expiry)
+    return None
+
+
+class ExtractionCache:
+    """
+    Cache dei risultati degli estrattori (destination_url + header), per estrattore e URL normalizzato.
+    Il TTL è quello configurato per l'estrattore, ridotto alla scadenza del token se l'URL
+    risolto la dichiara. Le estrazioni identiche in corso vengono eseguite una sola volta.
+    """
+
+    def __init__(self, ttls: Dict[str, float], default_ttl: float = 0, max_entries: int = 512,
+                 expiry_margin: float = TOKEN_EXPIRY_MARGIN):
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.expiry_margin = expiry_margin
+
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def ttl_for(self, name: str, result: Dict[str, Any]) -> float:
+        ttl = self.ttls.get(name, self.default_ttl)
+        if ttl <= 0:
+            return 0
+        expiry = url_expiry(result.get("destination_url") or '')
+        if expiry is not None:
+            ttl = min(ttl, expiry - time.time() - self.expiry_margin)
+        return max(ttl, 0)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry['expires_at'] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry['result']
+
+    def put(self, name: str, key: Hashable, result: Dict[str, Any]):
+        ttl = self.ttl_for(name, result)
+        if not self.enabled or ttl <= 0:
+            return
+        self._entries[key] = {'result': result, 'expires_at': time.monotonic() + ttl}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, name: str, url: str):
+        self._entries.pop((name, normalize_url(url)), None)
+
+    async def get_or_extract(self, name: str, url: str, extract: Callable[[], Awaitable[Dict[str, Any]]],
+                             force_refresh: bool = False) -> Dict[str, Any]:
+        """Risultato in cache per (estrattore, URL) oppure una nuova estrazione, condivisa con le richieste concorrenti."""
+        key = (name, normalize_url(url))
+        if not force_refresh:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return self._copy(cached)
+
+        # Le estrazioni forzate si uniscono solo ad altre estrazioni forzate
+        flight_key = key + (force_refresh,)
+        task = self._in_flight.get(flight_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # Task indipendente dal client: se chi l'ha avviata si disconnette, gli altri ricevono comunque il risultato
+            task = asyncio.ensure_future(self._run(name, key, flight_key, extract))
+            self._in_flight[flight_key] = task
+            # Se tutti i client si sono disconnessi l'eventuale errore non va segnalato come "mai letto"
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._copy(await asyncio.shield(task))
+
+    async def _run(self, name: str, key: Hashable, flight_key: Hashable, extract: Callable[[], Awaitable[Dict[str, Any]]]):
+        try:
+            result = await extract()
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._in_flight.pop(flight_key, None)
+        self.put(name, key, result)
+        return result
+
+    @staticmethod
+    def _copy(result: Dict[str, Any]) -> Dict[str, Any]:
+        # I chiamanti modificano gli header (parametri h_): ognuno riceve la sua copia
+        result = dict(result)
+        if isinstance(result.get("request_headers"), dict):
+            result["request_headers"] = dict(result["request_headers"])
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        per_extractor: Dict[str, int] = {}
+        for name, _ in self._entries:
+            per_extractor[name] = per_extractor.get(name, 0) + 1
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "entries_per_extractor": per_extractor,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "ttls": self.ttls,
+        }
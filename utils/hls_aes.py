@@ -0,0 +1,25 @@
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+
+
+def media_sequence_iv(sequence: int) -> bytes:
+    """IV implicito HLS: numero di sequenza del segmento come intero big-endian a 128 bit."""
+    return sequence.to_bytes(16, 'big')
+
+
+def parse_iv(value: str) -> bytes:
+    """Converte l'attributo IV di #EXT-X-KEY (es. '0x1A2B...') in 16 byte."""
+    value = value.strip()
+    if value[:2].lower() == '0x':
+        value = value[2:]
+    return bytes.fromhex(value.rjust(32, '0'))
+
+
+def decrypt_aes128_segment(segment_content: bytes, key: bytes, iv: bytes) -> bytes:
+    """Decritta un segmento HLS AES-128 (CBC + padding PKCS#7) con la chiave e l'IV da 16 byte."""
+    decrypted = AES.new(key, AES.MODE_CBC, iv).decrypt(segment_content)
+    try:
+        return unpad(decrypted, AES.block_size)
+    except ValueError:
+        # Alcune sorgenti non applicano il padding: restituisci i byte così come sono
+        return decrypted
@@ -0,0 +1,89 @@
+import logging
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_ISO_DURATION_RE = re.compile(
+    r'^P(?:(?P<years>[\d.]+)Y)?(?:(?P<months>[\d.]+)M)?(?:(?P<weeks>[\d.]+)W)?(?:(?P<days>[\d.]+)D)?'
+    r'(?:T(?:(?P<hours>[\d.]+)H)?(?:(?P<minutes>[\d.]+)M)?(?:(?P<seconds>[\d.]+)S)?)?$'
+)
+_DURATION_SECONDS = {
+    'years': 365 * 86400, 'months': 30 * 86400, 'weeks': 7 * 86400, 'days': 86400,
+    'hours': 3600, 'minutes': 60, 'seconds': 1,
+}
+
+
+def parse_iso_duration(value: Optional[str]) -> Optional[float]:
+    """Converte una durata ISO 8601 (es. 'PT2S', 'PT0H0M1.920S') in secondi."""
+    if not value:
+        return None
+    match = _ISO_DURATION_RE.match(value.strip())
+    if not match:
+        return None
+    return sum(float(v) * _DURATION_SECONDS[k] for k, v in match.groupdict().items() if v)
+
+
+class MPDCache:
+    """
+    Cache dei manifest MPD già parsati (ElementTree), condivisa dalla master playlist HLS
+    e da tutte le media playlist per Representation generate dallo stesso MPD.
+    Le dirette (type="dynamic") scadono dopo `minimumUpdatePeriod`; i manifest statici
+    restano in cache finché non vengono scartati dall'LRU.
+    """
+
+    def __init__(self, max_entries: int = 64, default_live_ttl: float = 2):
+        self.max_entries = max_entries
+        self.default_live_ttl = default_live_ttl
+
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def ttl_for(self, root: ET.Element) -> Optional[float]:
+        """TTL del manifest: None (nessuna scadenza) per gli MPD statici."""
+        if root.get('type', 'static').lower() != 'dynamic':
+            return None
+        ttl = parse_iso_duration(root.get('minimumUpdatePeriod'))
+        return ttl if ttl and ttl > 0 else self.default_live_ttl
+
+    def get(self, key: Hashable) -> Optional[ET.Element]:
+        entry = self._entries.get(key)
+        if entry is None or (entry['expires_at'] is not None and entry['expires_at'] <= time.monotonic()):
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry['root']
+
+    def put(self, key: Hashable, root: ET.Element):
+        if not self.enabled:
+            return
+        ttl = self.ttl_for(root)
+        self._entries[key] = {
+            'root': root,
+            'expires_at': time.monotonic() + ttl if ttl is not None else None,
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
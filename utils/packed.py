@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import List, Tuple
+from urllib.parse import urljoin, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class UnpackingError(Exception):
+    pass
+
+
+# Argomenti di }('p', a, c, 'k'.split('|'), e, d)): stringhe JS con escape, niente eval
+_JS_STRING = r"""(?:'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")"""
+_PACKED_ARGS_RE = re.compile(
+    r"\}\s*\(\s*(?P<p>" + _JS_STRING + r")\s*,\s*(?P<a>\d+|\[\])\s*,\s*(?P<c>\d+)\s*,\s*"
+    r"(?P<k>" + _JS_STRING + r")\s*\.split\(\s*(?P<sep>" + _JS_STRING + r")\s*\)",
+    re.DOTALL
+)
+_PACKED_DETECT_RE = re.compile(r"eval\s*\(\s*function\s*\(\s*p\s*,\s*a\s*,\s*c\s*,\s*k\s*,\s*e\s*,\s*(?:r|d)")
+_JS_ESCAPE_RE = re.compile(r"\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)", re.DOTALL)
+_JS_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+# Parole come le cerca il packer JS (\b\w+\b, solo ASCII)
+_WORD_RE = re.compile(r"\b\w+\b", re.ASCII)
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Codice già spacchettato, per hash del payload
+_CACHE_SIZE = 128
+_unpack_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+
+def _js_unescape(match) -> str:
+    escape = match.group(1)
+    if escape[0] in 'ux' and len(escape) > 1:
+        return chr(int(escape[1:], 16))
+    return _JS_ESCAPES.get(escape, escape)
+
+
+def _parse_js_string(literal: str) -> str:
+    """Valore di un letterale stringa JS ('...' o "...")."""
+    return _JS_ESCAPE_RE.sub(_js_unescape, literal[1:-1])
+
+
+def encode_base(value: int, base: int) -> str:
+    """Codifica del packer JS: cifre 0-9a-z, poi String.fromCharCode(c + 29) oltre la base 36."""
+    digits = []
+    while True:
+        value, digit = divmod(value, base)
+        digits.append(_DIGITS[digit] if digit < 36 or base <= 62 else chr(digit + 29))
+        if not value:
+            break
+    return ''.join(reversed(digits))
+
+
+def detect(source: str) -> bool:
+    """True se il sorgente contiene un blocco eval(function(p,a,c,k,e,d)...)."""
+    return bool(_PACKED_DETECT_RE.search(source))
+
+
+def parse_packed_args(source: str) -> Tuple[str, int, int, List[str]]:
+    """Estrae (p, a, c, k) dagli argomenti del packer senza eseguire codice."""
+    match = _PACKED_ARGS_RE.search(source)
+    if not match:
+        raise UnpackingError("Argomenti p,a,c,k,e,d non trovati")
+    payload = _parse_js_string(match.group('p'))
+    radix = 62 if match.group('a') == '[]' else int(match.group('a'))
+    count = int(match.group('c'))
+    symbols = _parse_js_string(match.group('k')).split(_parse_js_string(match.group('sep')))
+    if not 2 <= radix <= 95:
+        raise UnpackingError(f"Base non valida: {radix}")
+    return payload, radix, count, symbols
+
+
+def unpack(source: str) -> str:
+    """
+    Spacchetta codice P.A.C.K.E.R.: tabella simbolo -> parola e una sola sostituzione regex
+    su tutto il payload (come la variante veloce del packer JS). Il risultato resta in cache
+    per hash del sorgente.
+    """
+    digest = hashlib.sha1(source.encode('utf-8', 'surrogatepass')).digest()
+    cached = _unpack_cache.get(digest)
+    if cached is not None:
+        _unpack_cache.move_to_end(digest)
+        return cached
+
+    payload, radix, count, symbols = parse_packed_args(source)
+    table = {}
+    for index in range(min(count, len(symbols))):
+        if symbols[index]:
+            table[encode_base(index, radix)] = symbols[index]
+    unpacked = _WORD_RE.sub(lambda m: table.get(m.group(0), m.group(0)), payload)
+
+    _unpack_cache[digest] = unpacked
+    if len(_unpack_cache) > _CACHE_SIZE:
+        _unpack_cache.popitem(last=False)
+    return unpacked
+
+
+def find_packed_blocks(html: str) -> List[str]:
+    """Blocchi eval(function(p,a,c,k,e,d)...) presenti nell'HTML (fino alla fine dello <script>)."""
+    blocks = re.findall(r"(eval\s*\(\s*function\s*\(\s*p\s*,\s*a\s*,\s*c\s*,\s*k\s*,\s*e\s*,.*?)\s*</script>", html, re.DOTALL)
+    if not blocks:
+        blocks = re.findall(r"(eval\(function\(p,a,c,k,e,.*?\)\))", html, re.DOTALL)
+    return blocks
+
+
+async def eval_solver(session, url: str, headers: dict, patterns: List[str]) -> str:
+    """
+    Scarica la pagina, spacchetta i blocchi P.A.C.K.E.R. e restituisce il primo URL che corrisponde
+    a uno dei `patterns` (gruppo 1 se presente, altrimenti l'intera corrispondenza).
+    """
+    async with session.get(url, headers=headers) as response:
+        response.raise_for_status()
+        html = await response.text()
+
+    for block in find_packed_blocks(html):
+        try:
+            unpacked_code = unpack(block)
+        except UnpackingError as e:
+            logger.debug(f"Blocco packed non valido su {url}: {e}")
+            continue
+        for pattern in patterns:
+            match = re.search(pattern, unpacked_code)
+            if match:
+                extracted_url = match.group(1) if match.groups() else match.group(0)
+                if extracted_url.startswith('//'):
+                    extracted_url = 'https:' + extracted_url
+                elif not urlparse(extracted_url).scheme:
+                    extracted_url = urljoin(url, extracted_url)
+                return extracted_url
+    raise UnpackingError("Nessun codice p.a.c.k.e.d trovato o nessun pattern corrispondente")
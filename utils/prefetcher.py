@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentPrefetcher:
+    """
+    Prefetch predittivo dei segmenti live.
+    Quando una playlist live viene servita, i segmenti più recenti (e le relative chiavi/init)
+    vengono scaricati in anticipo nella cache, con un limite di concorrenza per canale.
+    Se un canale non riceve più richieste di playlist per `idle_timeout` secondi
+    (nessuno spettatore), i prefetch ancora in sospeso vengono annullati.
+    """
+
+    def __init__(self, segments: int = 0, concurrency: int = 2, idle_timeout: float = 30):
+        self.segments = segments
+        self.concurrency = concurrency
+        self.idle_timeout = idle_timeout
+
+        self._channels: Dict[Hashable, Dict[str, Any]] = {}
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.segments > 0
+
+    def touch(self, channel: Hashable):
+        """Segnala che il canale ha ancora spettatori (richiesta playlist ricevuta)."""
+        state = self._channels.get(channel)
+        if state:
+            state['last_seen'] = time.monotonic()
+
+    def schedule(self, channel: Hashable, jobs: Iterable[Tuple[Hashable, Callable[[], Awaitable[Any]]]]):
+        """Avvia in background i job `(chiave, factory)` non già in corso per il canale."""
+        self._cancel_idle_channels()
+
+        state = self._channels.get(channel)
+        if state is None:
+            state = {
+                'semaphore': asyncio.Semaphore(self.concurrency),
+                'tasks': {},
+                'last_seen': time.monotonic(),
+            }
+            self._channels[channel] = state
+        state['last_seen'] = time.monotonic()
+
+        for job_key, factory in jobs:
+            if job_key in state['tasks']:
+                continue
+            task = asyncio.create_task(self._run(channel, state, job_key, factory))
+            state['tasks'][job_key] = task
+            self.scheduled += 1
+
+    async def _run(self, channel: Hashable, state: Dict[str, Any], job_key: Hashable, factory: Callable[[], Awaitable[Any]]):
+        try:
+            async with state['semaphore']:
+                if time.monotonic() - state['last_seen'] > self.idle_timeout:
+                    self.cancelled += 1
+                    return
+                await factory()
+                self.completed += 1
+        except asyncio.CancelledError:
+            self.cancelled += 1
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"Prefetch fallito per {job_key}: {e}")
+        finally:
+            state['tasks'].pop(job_key, None)
+
+    def _cancel_idle_channels(self):
+        now = time.monotonic()
+        for channel in list(self._channels.keys()):
+            state = self._channels[channel]
+            if now - state['last_seen'] <= self.idle_timeout:
+                continue
+            for task in list(state['tasks'].values()):
+                task.cancel()
+            del self._channels[channel]
+            logger.info(f"⏹️ Prefetch annullato per canale senza spettatori: {channel}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "segments": self.segments,
+            "concurrency_per_channel": self.concurrency,
+            "channels": len(self._channels),
+            "pending": sum(len(s['tasks']) for s in self._channels.values()),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
+
+    async def close(self):
+        for state in self._channels.values():
+            for task in list(state['tasks'].values()):
+                task.cancel()
+        self._channels.clear()
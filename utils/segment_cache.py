@@ -0,0 +1,125 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Header che non influenzano il contenuto del segmento e quindi restano fuori dalla chiave
+_IGNORED_KEY_HEADERS = {'user-agent', 'range', 'if-none-match', 'if-modified-since', 'accept-encoding'}
+
+
+class CachedSegment:
+    """Segmento memorizzato in cache (corpo + header da restituire al client)."""
+    __slots__ = ('body', 'headers', 'status', 'expires_at')
+
+    def __init__(self, body: bytes, headers: Dict[str, str], status: int, expires_at: float):
+        self.body = body
+        self.headers = headers
+        self.status = status
+        self.expires_at = expires_at
+
+
+class SegmentCache:
+    """
+    Cache LRU in memoria con TTL e budget in byte, condivisa da tutti i client del worker.
+    Pensata per i segmenti live: vivono pochi secondi nella playlist, quindi il TTL è breve
+    e quando il budget si esaurisce vengono scartati per primi i segmenti meno usati.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = 60, max_entry_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+
+        self._entries: "OrderedDict[Tuple, CachedSegment]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(url: str, headers: Dict[str, str]) -> Tuple:
+        """Chiave = URL upstream + header rilevanti (es. Authorization, Referer, Cookie)."""
+        relevant = tuple(sorted(
+            (k.lower(), v) for k, v in headers.items() if k.lower() not in _IGNORED_KEY_HEADERS
+        ))
+        return (url, relevant)
+
+    def get(self, key: Tuple) -> Optional[CachedSegment]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def contains(self, key: Tuple) -> bool:
+        """True se la chiave è presente e non scaduta (senza aggiornare statistiche né ordine LRU)."""
+        entry = self._entries.get(key)
+        return entry is not None and entry.expires_at > time.monotonic()
+
+    def put(self, key: Tuple, body: bytes, headers: Dict[str, str], status: int = 200, ttl: Optional[float] = None) -> bool:
+        """Memorizza un segmento. Restituisce False se è troppo grande per la cache."""
+        if not self.enabled or len(body) > self.max_entry_bytes:
+            return False
+
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        self._entries[key] = CachedSegment(body, headers, status, expires_at)
+        self.current_bytes += len(body)
+        self._evict()
+        return True
+
+    def invalidate(self, key: Tuple):
+        if key in self._entries:
+            self._remove(key)
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key)
+        self.current_bytes -= len(entry.body)
+
+    def _evict(self):
+        """Scarta prima gli elementi scaduti, poi i meno usati finché si rientra nel budget."""
+        if self.current_bytes <= self.max_bytes:
+            return
+
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            self._remove(key)
+            self.expirations += 1
+
+        while self.current_bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self.current_bytes -= len(entry.body)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
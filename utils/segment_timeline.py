@@ -0,0 +1,94 @@
+import math
+from bisect import bisect_left, bisect_right
+from typing import Iterator, Tuple
+
+
+class SegmentTimeline:
+    """
+    Modello compatto di un <SegmentTimeline> DASH.
+    Ogni elemento <S t d r> resta una "run" (inizio, durata, ripetizioni) invece di essere
+    espanso in un oggetto per segmento: la finestra live si trova con una ricerca binaria
+    sulla durata cumulativa e i segmenti vengono generati solo per la finestra richiesta.
+    """
+
+    __slots__ = ('timescale', 'start_number', '_times', '_durations', '_counts', '_first_index', '_offsets', 'length', 'total_ticks')
+
+    def __init__(self, timescale: int = 1, start_number: int = 1):
+        self.timescale = timescale
+        self.start_number = start_number
+        self._times = []        # tempo ($Time$) del primo segmento della run
+        self._durations = []    # durata di ogni segmento della run (in unità timescale)
+        self._counts = []       # numero di segmenti della run (r + 1)
+        self._first_index = []  # indice assoluto del primo segmento della run
+        self._offsets = []      # durata cumulativa prima della run (in unità timescale)
+        self.length = 0
+        self.total_ticks = 0
+
+    @classmethod
+    def from_element(cls, segment_timeline, ns: dict, timescale: int = 1, start_number: int = 1) -> "SegmentTimeline":
+        timeline = cls(timescale, start_number)
+        current_time = 0
+        for s in segment_timeline.findall('mpd:S', ns):
+            t = s.get('t')
+            if t: current_time = int(t)
+            d = int(s.get('d'))
+            count = int(s.get('r', '0')) + 1
+            current_time = timeline.append(current_time, d, count)
+        return timeline
+
+    def append(self, time: int, duration: int, count: int) -> int:
+        """Aggiunge una run e restituisce il tempo di fine (inizio della run successiva)."""
+        if count <= 0:
+            return time
+        self._times.append(time)
+        self._durations.append(duration)
+        self._counts.append(count)
+        self._first_index.append(self.length)
+        self._offsets.append(self.total_ticks)
+        self.length += count
+        self.total_ticks += duration * count
+        return time + duration * count
+
+    def __len__(self) -> int:
+        return self.length
+
+    def live_window_start(self, seconds: float) -> int:
+        """
+        Indice del primo segmento della finestra live: l'ultimo segmento da cui la durata
+        fino alla fine supera `seconds` (tutta la timeline se è più corta).
+        """
+        threshold = self.total_ticks - seconds * self.timescale
+        if threshold <= 0 or not self.length:
+            return 0
+
+        # Ultima run che inizia prima della soglia, poi il segmento corrispondente al suo interno
+        run = bisect_left(self._offsets, threshold) - 1
+        duration = self._durations[run]
+        if duration <= 0:
+            k = self._counts[run] - 1
+        else:
+            k = min(self._counts[run] - 1, math.ceil((threshold - self._offsets[run]) / duration) - 1)
+        return self._first_index[run] + k
+
+    def max_duration(self, start: int = 0) -> int:
+        """Durata massima (unità timescale) dei segmenti da `start` in poi."""
+        if start >= self.length:
+            return 0
+        run = bisect_right(self._first_index, start) - 1
+        return max(self._durations[run:])
+
+    def iter_segments(self, start: int = 0) -> Iterator[Tuple[int, int, int]]:
+        """Genera (numero, tempo, durata) dei segmenti da `start` in poi, senza espandere l'intera timeline."""
+        if start >= self.length:
+            return
+        run = bisect_right(self._first_index, start) - 1
+        k = start - self._first_index[run]
+        number = self.start_number + start
+        for i in range(run, len(self._counts)):
+            duration = self._durations[i]
+            time = self._times[i] + k * duration
+            for _ in range(self._counts[i] - k):
+                yield number, time, duration
+                number += 1
+                time += duration
+            k = 0
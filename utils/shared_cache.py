@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """
+    Cache chiave -> JSON condivisa tra i worker gunicorn, su SQLite in modalità WAL.
+    Ogni chiave è una riga (upsert atomico, nessuna riscrittura dell'intero file) con scadenza
+    opzionale in tempo assoluto, così vale per tutti i processi. Le query girano su un thread
+    dedicato per non bloccare l'event loop; `namespace` permette di condividere lo stesso file.
+    """
+
+    def __init__(self, path: str, namespace: str = 'default'):
+        self.path = path
+        self.namespace = namespace
+        self._conn: Optional[sqlite3.Connection] = None
+        # Un solo thread: la connessione SQLite non va usata da thread diversi contemporaneamente
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shared-cache')
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,'
+                ' expires_at REAL, updated_at REAL NOT NULL,'
+                ' PRIMARY KEY (namespace, key))'
+            )
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # --- Operazioni sincrone (thread dedicato) ---
+
+    def _get(self, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self._delete(key)
+            return None
+        return json.loads(value)
+
+    def _set(self, key: str, value: Any, ttl: Optional[float], only_if_missing: bool = False):
+        expires_at = time.time() + ttl if ttl else None
+        conflict = 'NOTHING' if only_if_missing else (
+            'UPDATE SET value = excluded.value, expires_at = excluded.expires_at, updated_at = excluded.updated_at'
+        )
+        self._connect().execute(
+            'INSERT INTO cache (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+            f'ON CONFLICT (namespace, key) DO {conflict}',
+            (self.namespace, key, json.dumps(value), expires_at, time.time())
+        )
+
+    def _delete(self, key: str):
+        self._connect().execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+    def _acquire(self, key: str, owner: str, ttl: float) -> bool:
+        # Inserisce la chiave se manca, oppure la prende se la precedente è scaduta (proprietario morto o bloccato)
+        now = time.time()
+        cursor = self._connect().execute(
+            'INSERT INTO cache (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, '
+            'updated_at = excluded.updated_at WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= ?',
+            (self.namespace, key, json.dumps(owner), now + ttl, now, now)
+        )
+        return cursor.rowcount > 0
+
+    def _release(self, key: str, owner: str):
+        self._connect().execute(
+            'DELETE FROM cache WHERE namespace = ? AND key = ? AND value = ?', (self.namespace, key, json.dumps(owner))
+        )
+
+    def _items(self) -> Dict[str, Any]:
+        rows = self._connect().execute(
+            'SELECT key, value FROM cache WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (self.namespace, time.time())
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _purge_expired(self) -> int:
+        return self._connect().execute(
+            'DELETE FROM cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?',
+            (self.namespace, time.time())
+        ).rowcount
+
+    # --- Interfaccia asincrona ---
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Inserisce o aggiorna la chiave; `ttl` in secondi (None = nessuna scadenza)."""
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Come set() ma non sovrascrive una chiave già presente."""
+        await self._run(self._set, key, value, ttl, True)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    async def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        """Lock tra processi: True se `owner` ha ottenuto la chiave (scade dopo `ttl` secondi se non rilasciata)."""
+        return await self._run(self._acquire, key, owner, ttl)
+
+    async def release(self, key: str, owner: str):
+        """Rilascia il lock solo se appartiene ancora a `owner`."""
+        await self._run(self._release, key, owner)
+
+    async def items(self) -> Dict[str, Any]:
+        return await self._run(self._items)
+
+    async def purge_expired(self) -> int:
+        return await self._run(self._purge_expired)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamFlight:
+    """
+    Download upstream in corso, condiviso da uno o più client.
+    Il produttore (task in background) riceve status, header e chunk dalla sorgente;
+    ogni client legge tramite una FlightSubscription che riparte dal primo chunk,
+    quindi chi arriva in ritardo riceve subito i byte già scaricati e poi quelli nuovi.
+    """
+
+    def __init__(self, registry: "SingleFlight", key: Optional[Hashable]):
+        self.registry = registry
+        self.key = key
+        # Un download privato (senza chiave) non accetta altri client: il buffer può essere svuotato
+        self.detached = key is None
+
+        self.status: Optional[int] = None
+        self.headers = None
+        self.charset: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.total_bytes = 0
+        self.task: Optional[asyncio.Task] = None
+
+        self._chunks = []
+        self._offset = 0  # Indice assoluto del primo chunk ancora in memoria
+        self._buffered_bytes = 0
+        self._subscriptions = set()
+        self._response_ready = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+    # --- Lato produttore ---
+
+    def set_response(self, status: int, headers, charset: Optional[str] = None):
+        self.status = status
+        self.headers = headers
+        self.charset = charset
+        self._response_ready.set()
+
+    async def feed(self, chunk: bytes):
+        """Aggiunge un chunk; sui download non condivisi applica backpressure verso la sorgente."""
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        self._buffered_bytes += len(chunk)
+        self.total_bytes += len(chunk)
+        self._notify()
+
+        if not self.detached and self.total_bytes > self.registry.max_buffer_bytes:
+            # Troppo grande per essere condiviso (es. MP4 progressivo): nessun nuovo client può agganciarsi
+            self.registry._release(self)
+            self.detached = True
+            if not self._subscriptions and self.task and not self.task.done():
+                # Tutti i client se ne sono già andati: il download non servirebbe più a nessuno
+                # (il task è quello del produttore, l'annullamento arriva al prossimo await)
+                self.task.cancel()
+
+        if self.detached:
+            self._trim()
+            while self._subscriptions and self._buffered_bytes > self.registry.high_watermark:
+                self._drained.clear()
+                await self._drained.wait()
+
+    def finish(self):
+        self.done = True
+        self._response_ready.set()
+        self._notify()
+
+    def fail(self, error: BaseException):
+        self.error = error
+        self.done = True
+        self._response_ready.set()
+        self._notify()
+
+    def body(self) -> Optional[bytes]:
+        """Corpo completo, disponibile solo se nessun chunk è stato scartato."""
+        if self._offset:
+            return None
+        return b''.join(self._chunks)
+
+    # --- Lato consumatore ---
+
+    def subscribe(self) -> "FlightSubscription":
+        subscription = FlightSubscription(self)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: "FlightSubscription"):
+        self._subscriptions.discard(subscription)
+        if self.detached:
+            if not self._subscriptions and self.task and not self.task.done():
+                # Nessuno sta più ascoltando un download privato: inutile continuare
+                self.task.cancel()
+            else:
+                self._trim()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _trim(self):
+        """Scarta i chunk già consegnati a tutti i client (solo per download non condivisi)."""
+        if self._subscriptions:
+            min_position = min(s.position for s in self._subscriptions)
+        else:
+            min_position = self._offset + len(self._chunks)
+
+        drop = min_position - self._offset
+        if drop > 0:
+            self._buffered_bytes -= sum(len(c) for c in self._chunks[:drop])
+            del self._chunks[:drop]
+            self._offset = min_position
+
+        if self._buffered_bytes <= self.registry.high_watermark // 2:
+            self._drained.set()
+
+
+class FlightSubscription:
+    """Vista di un singolo client su un UpstreamFlight."""
+
+    def __init__(self, flight: UpstreamFlight):
+        self.flight = flight
+        self.position = flight._offset
+        self.closed = False
+
+    async def wait_response(self):
+        """Attende status e header upstream. Rilancia l'errore se la richiesta è fallita prima."""
+        flight = self.flight
+        await flight._response_ready.wait()
+        if flight.status is None:
+            raise flight.error or ConnectionError("Upstream fetch terminato senza risposta")
+        return flight.status, flight.headers
+
+    async def iter_chunks(self):
+        """Restituisce i chunk man mano che arrivano, partendo da quelli già scaricati."""
+        flight = self.flight
+        while True:
+            index = self.position - flight._offset
+            if index < len(flight._chunks):
+                chunk = flight._chunks[index]
+                self.position += 1
+                if flight.detached:
+                    flight._trim()
+                yield chunk
+                continue
+            if flight.error:
+                raise flight.error
+            if flight.done:
+                return
+            await flight._changed.wait()
+
+    async def iter_batches(self, min_bytes: int = 64 * 1024, max_bytes: int = 512 * 1024):
+        """
+        Come iter_chunks, ma accorpa i chunk già disponibili in scritture più grandi.
+        Il limite del batch si adatta: raddoppia se la sorgente è più veloce del client
+        (resta altro in coda), si dimezza quando il client deve attendere nuovi dati.
+        Un batch di un solo chunk viene restituito così com'è, senza copie.
+        """
+        flight = self.flight
+        limit = min_bytes
+        while True:
+            index = self.position - flight._offset
+            chunks = flight._chunks
+            if index < len(chunks):
+                batch = [chunks[index]]
+                size = len(chunks[index])
+                index += 1
+                while index < len(chunks) and size + len(chunks[index]) <= limit:
+                    batch.append(chunks[index])
+                    size += len(chunks[index])
+                    index += 1
+                if index < len(chunks):
+                    limit = min(limit * 2, max_bytes)
+                self.position += len(batch)
+                if flight.detached:
+                    flight._trim()
+                yield batch[0] if len(batch) == 1 else b''.join(batch)
+                continue
+            if flight.error:
+                raise flight.error
+            if flight.done:
+                return
+            limit = max(limit // 2, min_bytes)
+            await flight._changed.wait()
+
+    async def read(self) -> bytes:
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+
+    async def text(self) -> str:
+        return (await self.read()).decode(self.flight.charset or 'utf-8', errors='replace')
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.flight._unsubscribe(self)
+
+
+class SingleFlight:
+    """
+    Coalescenza delle richieste upstream identiche in corso (single-flight).
+    La prima richiesta per una chiave avvia il download, le successive si agganciano
+    allo stesso download e ricevono gli stessi byte mentre arrivano.
+    """
+
+    def __init__(self, max_buffer_bytes: int = 32 * 1024 * 1024, high_watermark: int = 4 * 1024 * 1024):
+        self.max_buffer_bytes = max_buffer_bytes
+        self.high_watermark = high_watermark
+        self._flights: Dict[Hashable, UpstreamFlight] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def join(self, key: Optional[Hashable], fetcher: Callable[[UpstreamFlight], Awaitable[Any]]) -> FlightSubscription:
+        """
+        Si aggancia al download in corso per `key` o ne avvia uno nuovo eseguendo `fetcher(flight)`.
+        Con `key=None` il download è privato (nessuna coalescenza).
+        """
+        flight = self._flights.get(key) if key is not None else None
+        if flight is not None:
+            self.coalesced += 1
+            return flight.subscribe()
+
+        flight = UpstreamFlight(self, key)
+        if key is not None:
+            self._flights[key] = flight
+        subscription = flight.subscribe()
+        flight.task = asyncio.create_task(self._run(flight, fetcher))
+        self.started += 1
+        return subscription
+
+    async def _run(self, flight: UpstreamFlight, fetcher: Callable[[UpstreamFlight], Awaitable[Any]]):
+        try:
+            await fetcher(flight)
+            flight.finish()
+        except asyncio.CancelledError:
+            flight.fail(ConnectionError("Upstream fetch annullato"))
+        except Exception as e:
+            self.failed += 1
+            flight.fail(e)
+        finally:
+            self._release(flight)
+
+    def _release(self, flight: UpstreamFlight):
+        if flight.key is not None and self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }